@@ -0,0 +1,83 @@
+#BENCHMARK OF THE PANDAS AND ARROW CLEANING ENGINES
+#
+# Reads a staged Parquet file, cleans it with table_specs.clean_dataframe (pandas) or
+# table_specs.clean_table (pyarrow.compute) and encodes the result back to Parquet, as the
+# processing handlers do. Each run happens in a fresh child process so the peak RSS of the
+# two engines can be compared.
+#
+# Usage: python benchmarks/bench_clean_engines.py --scale-factor 10 --tables customers employees suppliers
+
+#import library
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+FUNCTIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'functions')
+
+
+#function run in the child process: clean one file with one engine and report time and memory
+
+def run_child(engine, table_name, path):
+    sys.path.insert(0, FUNCTIONS_DIR)
+    from io import BytesIO
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    from table_specs import TABLE_SPECS
+    from table_specs import clean_dataframe
+    from table_specs import clean_table
+
+    baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start_time = time.perf_counter()
+    with open(path, 'rb') as parquet_file:
+        data = parquet_file.read()
+    columns = TABLE_SPECS[table_name]['columns']
+    if engine == 'arrow':
+        table = clean_table(pq.read_table(BytesIO(data)), table_name).select(columns)
+    else:
+        df = clean_dataframe(pd.read_parquet(BytesIO(data)), table_name)
+        table = pa.Table.from_pandas(df[columns], preserve_index=False)
+    buffer = BytesIO()
+    pq.write_table(table, buffer)
+    seconds = time.perf_counter() - start_time
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({'seconds': seconds, 'peak_rss_mb': (peak_kb - baseline_kb) / 1024, 'rows': table.num_rows}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--scale-factor', type=float, default=10)
+    parser.add_argument('--tables', nargs='+', default=['customers', 'employees', 'suppliers'])
+    parser.add_argument('--child', nargs=3, metavar=('ENGINE', 'TABLE', 'PATH'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(*args.child)
+        return
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    from synthetic_data import generate_table
+
+    print(f"{'table':<16}{'rows':>10}{'engine':>8}{'seconds':>10}{'peak RSS (MB)':>15}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for table_name in args.tables:
+            path = os.path.join(tmp_dir, f"{table_name}.parquet")
+            pq.write_table(pa.Table.from_pandas(generate_table(table_name, args.scale_factor), preserve_index=False), path)
+            for engine in ('pandas', 'arrow'):
+                output = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), '--child', engine, table_name, path],
+                    check=True, capture_output=True, text=True
+                ).stdout
+                result = json.loads(output.strip().splitlines()[-1])
+                print(f"{table_name:<16}{result['rows']:>10}{engine:>8}{result['seconds']:>10.3f}{result['peak_rss_mb']:>15.1f}")
+
+
+if __name__ == '__main__':
+    main()
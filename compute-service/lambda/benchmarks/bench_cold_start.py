@@ -0,0 +1,121 @@
+#BENCHMARK OF THE HANDLER IMPORT (COLD START INIT) TIME
+#
+# Every handler is looked up on lambda_functions in a fresh interpreter started with
+# `python -X importtime`, the same thing the Lambda runtime does during the init phase.
+# The report shows the wall time of the lookup, the total import time reported by
+# -X importtime, whether pandas got loaded and the most expensive packages. The "eager imports"
+# row imports every library lambda_functions.py used to import at module top, for comparison.
+#
+# Usage: python benchmarks/bench_cold_start.py --repeat 5 --budget-ms 600
+
+#import library
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+FUNCTIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'functions')
+
+# Lambda entry points deployed in terraform-setup/compute-service/lambda/main.tf
+HANDLERS = [
+    'upload_src_data_to_s3',
+    's3raw_to_s3staging',
+    'google_form_to_s3',
+    'main_processing_customers',
+    'main_processing_departments',
+    'main_processing_employees',
+    'main_processing_inventory',
+    'main_processing_orders',
+    'main_processing_products',
+    'main_processing_purchase_order',
+    'main_processing_suppliers',
+]
+
+# Entry points of the backfill and orchestration flows, invoked directly
+HANDLERS += ['extract_tables_to_s3', 'process_staged_table', 'orchestrate_loads']
+
+# Module top imports of lambda_functions.py before the handlers were split
+EAGER_IMPORTS = ['pandas', 'numpy', 'psycopg2', 'sqlalchemy', 'boto3', 'dotenv', 'pyarrow', 'pyarrow.parquet',
+                 'google.oauth2.service_account', 'gspread']
+
+CHILD_CODE = """
+import sys
+import time
+start_time = time.perf_counter()
+{statement}
+print((time.perf_counter() - start_time) * 1000, 'pandas' in sys.modules)
+"""
+
+
+#function to parse the stderr of python -X importtime
+
+def parse_importtime(stderr):
+    """
+    Returns (total self time in ms, {package: cumulative ms}) from -X importtime output.
+
+    Lines look like 'import time:  self [us] | cumulative | <indent>package'. A package is
+    reported the first time it is imported, at any nesting depth, so its cumulative time
+    includes everything it pulled in. Modules of the functions folder are skipped.
+    """
+    local_modules = {file_name[:-3] for file_name in os.listdir(FUNCTIONS_DIR) if file_name.endswith('.py')}
+    total_us = 0
+    packages = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        total_us += int(self_us)
+        name = name.strip()
+        if '.' not in name and not name.startswith('_') and name not in local_modules:
+            packages[name] = int(cumulative_us) / 1000
+    return total_us / 1000, packages
+
+
+#function to measure one import statement in a fresh interpreter
+
+def measure(statement, repeat):
+    wall_times, import_times, packages, pandas_loaded = [], [], {}, False
+    for _ in range(repeat):
+        completed = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', CHILD_CODE.format(statement=statement)],
+            cwd=FUNCTIONS_DIR, capture_output=True, text=True, check=True,
+            env=dict(os.environ, PYTHONPATH=FUNCTIONS_DIR, AWS_DEFAULT_REGION=os.environ.get('AWS_DEFAULT_REGION', 'eu-north-1')),
+        )
+        wall_ms, pandas_loaded = completed.stdout.strip().splitlines()[-1].split()
+        wall_times.append(float(wall_ms))
+        import_ms, packages = parse_importtime(completed.stderr)
+        import_times.append(import_ms)
+    return statistics.median(wall_times), statistics.median(import_times), packages, pandas_loaded == 'True'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cold start import time of every Lambda handler.')
+    parser.add_argument('--repeat', type=int, default=3, help='fresh interpreters per handler, the median is reported')
+    parser.add_argument('--top', type=int, default=3, help='most expensive packages to show')
+    parser.add_argument('--budget-ms', type=float, help='exit with status 1 when a handler init takes longer')
+    args = parser.parse_args()
+
+    available = []
+    for module_name in EAGER_IMPORTS:
+        if subprocess.run([sys.executable, '-c', f"import {module_name}"], capture_output=True).returncode == 0:
+            available.append(module_name)
+    rows = [('eager imports', f"import {', '.join(available)}")]
+    rows += [(handler, f"import lambda_functions; lambda_functions.{handler}") for handler in HANDLERS]
+
+    print(f"{'handler':<32}{'init (ms)':>11}{'imports (ms)':>14}{'pandas':>8}  top packages (cumulative ms)")
+    over_budget = []
+    for name, statement in rows:
+        wall_ms, import_ms, packages, pandas_loaded = measure(statement, args.repeat)
+        top = sorted(packages.items(), key=lambda item: -item[1])[:args.top]
+        print(f"{name:<32}{wall_ms:>11.0f}{import_ms:>14.0f}{'yes' if pandas_loaded else 'no':>8}  " + ', '.join(f"{package} {ms:.0f}" for package, ms in top))
+        if args.budget_ms and name != 'eager imports' and wall_ms > args.budget_ms:
+            over_budget.append(name)
+
+    if over_budget:
+        print(f"Over the {args.budget_ms:.0f} ms budget: {', '.join(over_budget)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
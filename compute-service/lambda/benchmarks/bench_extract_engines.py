@@ -0,0 +1,124 @@
+#BENCHMARK OF THE EXTRACTION ENGINES
+#
+# Loads synthetic Greeny tables into a PostgreSQL source schema and fetches each table into
+# Arrow with every extraction path of upload_src_data_to_s3, on the same table and connection:
+#
+# - fetchall: cursor.execute + fetchall + pandas DataFrame + pa.Table.from_pandas (default mode)
+# - cursor:   server-side cursor, row tuples converted to typed Arrow batches (stream mode)
+# - copy:     COPY ... TO STDOUT parsed by pyarrow's CSV reader ('extract_engine': 'copy')
+#
+# and reports seconds, rows/s and peak memory of each, the best of --repeat runs. S3 and the
+# Parquet encoding are left out, they are the same for every engine.
+#
+# The source schema is dropped and recreated, point the DSN at a scratch database.
+#
+# Usage: BENCH_PG_DSN="dbname=bench user=postgres host=localhost" \
+#        python benchmarks/bench_extract_engines.py --scale-factor 1 --tables orders customers
+
+#import library
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'functions'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pandas as pd
+import psycopg2
+import pyarrow as pa
+from bench_pipeline import copy_dataframe
+from extract_functions import query_to_table
+from metrics_functions import peak_memory_mb
+from metrics_functions import reset_peak_memory
+from synthetic_data import BASE_ROWS
+from synthetic_data import create_table_sql
+from synthetic_data import generate_all
+
+DATE_SUFFIX = '2024-10-01'
+
+
+#function to fetch a table like the default mode of upload_src_data_to_s3
+
+def fetch_with_fetchall(cnxn, sql_query, batch_size):
+    with cnxn.cursor() as cursor:
+        cursor.execute(sql_query)
+        data = cursor.fetchall()
+        column_names = [desc[0] for desc in cursor.description]
+    return pa.Table.from_pandas(pd.DataFrame(data, columns=column_names))
+
+
+def fetch_with_cursor(cnxn, sql_query, batch_size):
+    return query_to_table(cnxn, sql_query, None, batch_size=batch_size, engine='cursor')
+
+
+def fetch_with_copy(cnxn, sql_query, batch_size):
+    return query_to_table(cnxn, sql_query, None, batch_size=batch_size, engine='copy')
+
+
+ENGINES = {'fetchall': fetch_with_fetchall, 'cursor': fetch_with_cursor, 'copy': fetch_with_copy}
+
+
+#function to time one engine on one table, returns the best run
+
+def run_engine(dsn, fetch, sql_query, batch_size, repeat):
+    best = None
+    for _ in range(repeat):
+        cnxn = psycopg2.connect(dsn)
+        try:
+            peak_reset = reset_peak_memory()
+            memory_before = peak_memory_mb()
+            start_time = time.perf_counter()
+            table = fetch(cnxn, sql_query, batch_size)
+            seconds = time.perf_counter() - start_time
+            run = {'seconds': seconds, 'rows': table.num_rows if table is not None else 0,
+                   'peak_mb': round(peak_memory_mb() - memory_before, 1) if peak_reset else None,
+                   'schema': table.schema if table is not None else None}
+        finally:
+            cnxn.rollback()
+            cnxn.close()
+        del table
+        if best is None or run['seconds'] < best['seconds']:
+            best = run
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the extraction engines on synthetic Greeny tables.')
+    parser.add_argument('--dsn', default=os.environ.get('BENCH_PG_DSN'), help='PostgreSQL DSN (default: $BENCH_PG_DSN)')
+    parser.add_argument('--scale-factor', type=float, default=1, help='orders rows = 100,000 * scale factor')
+    parser.add_argument('--tables', nargs='+', default=list(BASE_ROWS), choices=list(BASE_ROWS))
+    parser.add_argument('--engines', nargs='+', default=list(ENGINES), choices=list(ENGINES))
+    parser.add_argument('--batch-size', type=int, default=65536, help='rows per batch of the cursor and copy engines')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per engine and table, the fastest is reported')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--source-schema', default='bench_source')
+    args = parser.parse_args()
+    if not args.dsn:
+        parser.error('a PostgreSQL DSN is required (--dsn or BENCH_PG_DSN)')
+
+    tables = {table_name: df for table_name, df in generate_all(args.scale_factor, args.seed, DATE_SUFFIX).items()
+              if table_name in args.tables}
+    with psycopg2.connect(args.dsn) as cnxn, cnxn.cursor() as cursor:
+        cursor.execute(f"DROP SCHEMA IF EXISTS {args.source_schema} CASCADE; CREATE SCHEMA {args.source_schema};")
+        for table_name, df in tables.items():
+            cursor.execute(create_table_sql(args.source_schema, table_name))
+            copy_dataframe(cursor, args.source_schema, table_name, df)
+    cnxn.close()
+
+    print(f"{'table':<16}{'engine':<10}{'rows':>10}{'seconds':>10}{'rows/s':>12}{'peak MB':>10}{'vs fetchall':>13}")
+    for table_name in tables:
+        sql_query = f"SELECT * FROM {args.source_schema}.{table_name} ;"
+        runs = {engine: run_engine(args.dsn, ENGINES[engine], sql_query, args.batch_size, args.repeat) for engine in args.engines}
+        baseline = runs.get('fetchall')
+        for engine, run in runs.items():
+            rows_per_second = run['rows'] / run['seconds'] if run['seconds'] > 0 else float('inf')
+            speedup = f"{baseline['seconds'] / run['seconds']:.2f}x" if baseline and run['seconds'] > 0 else '-'
+            peak = f"{run['peak_mb']:.1f}" if run['peak_mb'] is not None else '-'
+            print(f"{table_name:<16}{engine:<10}{run['rows']:>10}{run['seconds']:>10.3f}{rows_per_second:>12,.0f}{peak:>10}{speedup:>13}")
+        if 'cursor' in runs and 'copy' in runs and runs['cursor']['schema'] != runs['copy']['schema']:
+            print(f"  schemas of the cursor and copy engines differ for {table_name}")
+
+
+if __name__ == '__main__':
+    main()
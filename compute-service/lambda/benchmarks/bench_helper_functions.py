@@ -0,0 +1,87 @@
+#MICRO-BENCHMARK FOR THE VECTORIZED helper_functions
+#
+# Compares check_and_replace_regex and values_checker against the original row-by-row
+# implementations on synthetic customer columns, and checks both produce the same values.
+#
+# Usage: python benchmarks/bench_helper_functions.py --rows 1000000
+
+#import library
+import argparse
+import os
+import re
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'functions'))
+from helper_functions import check_and_replace_regex
+from helper_functions import values_checker
+
+EMAIL_PATTERN = r'^[\w\.-]+@[a-zA-Z\d\.-]+\.[a-zA-Z]{2,}$'
+GENDERS = ['Male', 'Female', 'Binary', 'Non-binary', 'Preferred to not say']
+
+
+#original row-by-row implementations
+
+def legacy_check_and_replace_regex(df, column_name, regex_pattern, replacement_value):
+    def match_regex(value):
+        if re.fullmatch(regex_pattern, str(value)):
+            return value
+        else:
+            return replacement_value
+    df[column_name] = df[column_name].apply(match_regex)
+    return df
+
+
+def legacy_values_checker(df, column_name, allowed_values, replacement_value):
+    df[column_name] = df[column_name].apply(lambda x: x if x in allowed_values else replacement_value)
+    return df
+
+
+#function to build a customers-like DataFrame with valid and dirty values
+
+def make_customers(rows, seed=42):
+    rng = np.random.default_rng(seed)
+    ids = np.arange(rows)
+    emails = np.array([f"customer{i}@greeny-mail.com" for i in ids], dtype=object)
+    dirty = rng.random(rows)
+    emails[dirty < 0.05] = [f"customer{i}.greeny-mail.com" for i in ids[dirty < 0.05]]
+    emails[(dirty >= 0.05) & (dirty < 0.06)] = None
+    emails[(dirty >= 0.06) & (dirty < 0.07)] = [f"clément{i}@mail.fr" for i in ids[(dirty >= 0.06) & (dirty < 0.07)]]
+    genders = rng.choice(GENDERS + ['male', 'Unknown', None], size=rows)
+    return pd.DataFrame({'customer_email': emails, 'customer_gender': genders})
+
+
+#function to time a cleaning function on a fresh copy of the DataFrame
+
+def timed(function, df, *args):
+    frame = df.copy()
+    start_time = time.perf_counter()
+    function(frame, *args)
+    return time.perf_counter() - start_time, frame
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1000000)
+    args = parser.parse_args()
+
+    df = make_customers(args.rows)
+    cases = [
+        ('check_and_replace_regex', legacy_check_and_replace_regex, check_and_replace_regex,
+         ('customer_email', EMAIL_PATTERN, 'invalid'), 'customer_email'),
+        ('values_checker', legacy_values_checker, values_checker,
+         ('customer_gender', GENDERS, 'Invalid'), 'customer_gender'),
+    ]
+    print(f"{'function':<26}{'rows':>10}{'legacy (s)':>12}{'vectorized (s)':>16}{'speedup':>10}")
+    for name, legacy_function, function, function_args, column in cases:
+        legacy_seconds, legacy_frame = timed(legacy_function, df, *function_args)
+        seconds, frame = timed(function, df, *function_args)
+        if legacy_frame[column].tolist() != frame[column].tolist():
+            raise AssertionError(f"{name} output differs from the row-by-row implementation")
+        print(f"{name:<26}{args.rows:>10}{legacy_seconds:>12.3f}{seconds:>16.3f}{legacy_seconds / seconds:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,281 @@
+#BENCHMARK OF THE PIPELINE HANDLERS ON SYNTHETIC DATA
+#
+# Runs the handlers of the daily pipeline end to end on the synthetic Greeny tables, for each
+# scale factor: the eight tables are written to a PostgreSQL source schema, extracted to a
+# moto S3 bucket with upload_src_data_to_s3, promoted with s3raw_to_s3staging and loaded into
+# a warehouse schema of the same database with the main_processing_* handlers.
+#
+# Every handler runs with stage metrics enabled (see metrics_functions), the report shows
+# rows/s and peak memory per handler and table, and seconds, rows, bytes and peak memory per
+# stage. --output saves the results as JSON and --baseline compares a run with a saved one,
+# flagging the handlers that got slower or use more memory than --tolerance allows.
+#
+# The source and warehouse schemas are dropped and recreated, point the DSN at a scratch
+# database. Needs moto (pip install moto) besides the Lambda requirements.
+#
+# Usage: BENCH_PG_DSN="dbname=bench user=postgres host=localhost" \
+#        python benchmarks/bench_pipeline.py --scale-factors 0.1 1 --output bench.json [--baseline old.json]
+
+#import library
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'functions'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# moto needs credentials and a region, never use real ones here
+for variable, value in (('AWS_ACCESS_KEY_ID', 'testing'), ('AWS_SECRET_ACCESS_KEY', 'testing'), ('AWS_DEFAULT_REGION', 'us-east-1')):
+    os.environ[variable] = value
+
+import numpy as np
+import psycopg2
+from psycopg2.extensions import parse_dsn
+from moto import mock_aws
+from synthetic_data import BASE_ROWS
+from synthetic_data import DIRTY_RATE
+from synthetic_data import create_table_sql
+from synthetic_data import generate_all
+
+BUCKET = 'greeny-bench'
+DATE_SUFFIX = '2024-10-01'
+
+
+#function to write a DataFrame to a PostgreSQL table with COPY
+
+def copy_dataframe(cursor, schema, table_name, df):
+    df = df.copy()
+    for column in df.columns:
+        if df[column].map(lambda value: isinstance(value, (list, np.ndarray))).any():
+            # PostgreSQL array literal, e.g. {"Paracetamol","Ibuprofen"}
+            df[column] = df[column].map(lambda values: None if values is None else
+                                        '{' + ','.join('"' + str(value).replace('"', '\\"') + '"' for value in values) + '}')
+    buffer = io.StringIO()
+    df.to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY {schema}.{table_name} ({', '.join(df.columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+
+#function to create the source tables with the synthetic data and empty warehouse tables
+
+def prepare_database(dsn, source_schema, target_schema, tables):
+    with psycopg2.connect(dsn) as cnxn, cnxn.cursor() as cursor:
+        for schema in (source_schema, target_schema):
+            cursor.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE; CREATE SCHEMA {schema};")
+        for table_name, df in tables.items():
+            cursor.execute(create_table_sql(source_schema, table_name))
+            copy_dataframe(cursor, source_schema, table_name, df)
+            cursor.execute(create_table_sql(target_schema, table_name, target=True))
+    cnxn.close()
+
+
+#function to empty a warehouse table before a processing run
+
+def truncate_table(dsn, schema, table_name):
+    with psycopg2.connect(dsn) as cnxn, cnxn.cursor() as cursor:
+        cursor.execute(f"TRUNCATE {schema}.{table_name};")
+    cnxn.close()
+
+
+#function to run a handler with stage metrics and return its result and run record
+
+def run_handler(handler, event, table_name, rows=None, verbose=False):
+    output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    start_time = time.perf_counter()
+    with output:
+        result = handler(dict(event, metrics=True), None)
+    seconds = time.perf_counter() - start_time
+    metrics = (result or {}).get('metrics') or {}
+    if rows is None:
+        rows = (result or {}).get('rows_loaded', (result or {}).get('rows', 0))
+    return result, {
+        'handler': handler.__name__,
+        'table': table_name,
+        'rows': rows,
+        'seconds': round(seconds, 3),
+        'rows_per_second': round(rows / seconds, 1) if seconds > 0 else None,
+        'peak_rss_mb': metrics.get('peak_rss_mb'),
+        'stages': metrics.get('stages', {}),
+    }
+
+
+#function to run the pipeline once for a scale factor
+
+def run_pipeline(args, db_params, scale_factor, tables):
+    from upload_functions import upload_src_data_to_s3
+    from staging_functions import s3raw_to_s3staging
+    import processing_functions
+
+    prefix = f"sf{scale_factor:g}"
+    hive_layout = args.layout == 'hive'
+    layout = {'layout': 'hive'} if hive_layout else {}
+    runs = []
+
+    extract_event = dict(layout, db_name=db_params['dbname'], db_user=db_params.get('user'), db_password=db_params.get('password'),
+                         db_host=db_params.get('host'), db_port=db_params.get('port'), schema=args.source_schema,
+                         s3_bucket=BUCKET, s3_prefix=f"{prefix}/raw", date_suffix=DATE_SUFFIX)
+    if args.extract_mode == 'stream':
+        extract_event.update(extract_mode='stream', batch_size=args.batch_size)
+    elif args.extract_mode == 'parallel':
+        extract_event.update(extract_mode='parallel', parallel_workers=args.parallel_workers, batch_size=args.batch_size)
+    if args.extract_engine:
+        extract_event['extract_engine'] = args.extract_engine
+    if args.writer_profile:
+        extract_event['writer_profile'] = args.writer_profile
+    for table_name in tables:
+        _, run = run_handler(upload_src_data_to_s3, dict(extract_event, tablename=table_name), table_name, verbose=args.verbose)
+        runs.append(run)
+
+    for table_name in tables:
+        # Flat layout: one staging folder per table, so the processing handler finds the table's file of the day
+        category = 'Business' if hive_layout else table_name
+        staging_event = dict(layout, s3_bucket=BUCKET, s3_raw_prefix=f"{prefix}/raw", s3_staging_prefix=f"{prefix}/staging",
+                             filename_filters={table_name: [category]}, date_suffix=DATE_SUFFIX)
+        if args.writer_profile:
+            staging_event['writer_profile'] = args.writer_profile
+        _, run = run_handler(s3raw_to_s3staging, staging_event, table_name, rows=len(tables[table_name]), verbose=args.verbose)
+        runs.append(run)
+
+    for table_name in tables:
+        truncate_table(args.dsn, args.target_schema, table_name)
+        processing_event = dict(layout, s3_bucket=BUCKET, date_suffix=DATE_SUFFIX, engine=args.engine,
+                                prefix=f"{prefix}/staging/Business" if hive_layout else f"{prefix}/staging/{table_name}/",
+                                db_params=dict(db_params, schema=args.target_schema, table_name=table_name))
+        if args.processing_mode == 'chunked':
+            processing_event.update(processing_mode='chunked', batch_size=args.batch_size)
+        handler = getattr(processing_functions, f"main_processing_{table_name}")
+        _, run = run_handler(handler, processing_event, table_name, verbose=args.verbose)
+        runs.append(run)
+    return runs
+
+
+#function to keep the fastest run of every handler and table over the repeats
+
+def best_runs(repeats):
+    best = {}
+    for runs in repeats:
+        for run in runs:
+            key = (run['handler'], run['table'])
+            if key not in best or run['seconds'] < best[key]['seconds']:
+                best[key] = run
+    return list(best.values())
+
+
+#function to sum the stages of the runs per handler kind (extract, staging, processing)
+
+def stage_totals(runs):
+    totals = {}
+    for run in runs:
+        kind = 'main_processing_*' if run['handler'].startswith('main_processing_') else run['handler']
+        for name, stage in run['stages'].items():
+            total = totals.setdefault((kind, name), {'calls': 0, 'seconds': 0.0, 'rows': 0, 'bytes': 0, 'peak_rss_mb': 0.0})
+            for field in ('calls', 'seconds', 'rows', 'bytes'):
+                total[field] += stage[field]
+            total['peak_rss_mb'] = max(total['peak_rss_mb'], stage['peak_rss_mb'])
+    return totals
+
+
+#function to print the report of a scale factor
+
+def print_report(result):
+    print(f"\nScale factor {result['scale_factor']:g}: {result['source_rows']} source rows")
+    print(f"{'handler':<32}{'table':<16}{'rows':>10}{'seconds':>10}{'rows/s':>12}{'peak MB':>10}")
+    for run in result['runs']:
+        print(f"{run['handler']:<32}{run['table']:<16}{run['rows']:>10}{run['seconds']:>10.3f}"
+              f"{run['rows_per_second'] or 0:>12.0f}{run['peak_rss_mb'] or 0:>10.1f}")
+    print(f"\n{'handler':<32}{'stage':<14}{'calls':>8}{'seconds':>10}{'rows':>12}{'MB':>10}{'peak MB':>10}")
+    for (kind, name), total in sorted(stage_totals(result['runs']).items(), key=lambda item: (item[0][0], -item[1]['seconds'])):
+        print(f"{kind:<32}{name:<14}{total['calls']:>8}{total['seconds']:>10.3f}{total['rows']:>12}"
+              f"{total['bytes'] / 1e6:>10.2f}{total['peak_rss_mb']:>10.1f}")
+
+
+#function to compare the results with a baseline and list the regressions
+
+def compare_with_baseline(results, baseline, tolerance):
+    baseline_runs = {(result['scale_factor'], run['handler'], run['table']): run for result in baseline['results'] for run in result['runs']}
+    regressions = []
+    print(f"\n{'scale':>6} {'handler':<32}{'table':<16}{'rows/s':>12}{'baseline':>12}{'change':>9}{'peak MB':>9}{'baseline':>10}")
+    for result in results:
+        for run in result['runs']:
+            old = baseline_runs.get((result['scale_factor'], run['handler'], run['table']))
+            if not old or not old['rows_per_second'] or not run['rows_per_second']:
+                continue
+            change = run['rows_per_second'] / old['rows_per_second'] - 1
+            slower = change < -tolerance
+            # Memory is only compared when both runs could reset the peak (see metrics_functions)
+            more_memory = bool(old['peak_rss_mb'] and run['peak_rss_mb'] and run['peak_rss_mb'] > old['peak_rss_mb'] * (1 + tolerance))
+            flag = ' <-- regression' if slower or more_memory else ''
+            print(f"{result['scale_factor']:>6g} {run['handler']:<32}{run['table']:<16}{run['rows_per_second']:>12.0f}"
+                  f"{old['rows_per_second']:>12.0f}{change:>+9.0%}{run['peak_rss_mb'] or 0:>9.1f}{old['peak_rss_mb'] or 0:>10.1f}{flag}")
+            if flag:
+                regressions.append((result['scale_factor'], run['handler'], run['table']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the pipeline handlers on synthetic Greeny data.')
+    parser.add_argument('--dsn', default=os.environ.get('BENCH_PG_DSN'), help='PostgreSQL DSN (default: $BENCH_PG_DSN)')
+    parser.add_argument('--scale-factors', type=float, nargs='+', default=[0.1, 1], help='orders rows = 100,000 * scale factor')
+    parser.add_argument('--tables', nargs='+', default=list(BASE_ROWS), choices=list(BASE_ROWS))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--dirty-rate', type=float, default=DIRTY_RATE, help='share of dirty values in the cleaned columns')
+    parser.add_argument('--repeat', type=int, default=1, help='pipeline runs per scale factor, the fastest run of each handler is kept')
+    parser.add_argument('--layout', choices=['flat', 'hive'], default='flat')
+    parser.add_argument('--extract-mode', choices=['full', 'stream', 'parallel'], default='full')
+    parser.add_argument('--parallel-workers', type=int, default=4, help='connections of the parallel extract mode')
+    parser.add_argument('--extract-engine', choices=['cursor', 'copy'], help='extraction engine of every table (default: per table spec)')
+    parser.add_argument('--processing-mode', choices=['full', 'chunked'], default='full')
+    parser.add_argument('--engine', choices=['pandas', 'arrow'], default='pandas')
+    parser.add_argument('--batch-size', type=int, default=65536, help='rows per batch of the stream and chunked modes')
+    parser.add_argument('--writer-profile', help='Parquet writer profile of the extract and staging files')
+    parser.add_argument('--source-schema', default='bench_source')
+    parser.add_argument('--target-schema', default='bench_warehouse')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='JSON results of an earlier run to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='slowdown or memory growth reported as a regression')
+    parser.add_argument('--emf', action='store_true', help='also print the EMF metric lines of the handlers')
+    parser.add_argument('--verbose', action='store_true', help='show the output of the handlers')
+    args = parser.parse_args()
+    if not args.dsn:
+        parser.error('a PostgreSQL DSN is required (--dsn or BENCH_PG_DSN)')
+
+    from metrics_functions import metrics_logger
+    metrics_logger.disabled = not args.emf
+    db_params = {key: value for key, value in parse_dsn(args.dsn).items() if key in ('dbname', 'user', 'password', 'host', 'port')}
+
+    results = []
+    with mock_aws():
+        import boto3
+        boto3.client('s3').create_bucket(Bucket=BUCKET)
+        for scale_factor in args.scale_factors:
+            tables = {table_name: df for table_name, df in generate_all(scale_factor, args.seed, DATE_SUFFIX, args.dirty_rate).items()
+                      if table_name in args.tables}
+            prepare_database(args.dsn, args.source_schema, args.target_schema, tables)
+            repeats = [run_pipeline(args, db_params, scale_factor, tables) for _ in range(args.repeat)]
+            result = {'scale_factor': scale_factor, 'source_rows': sum(len(df) for df in tables.values()), 'runs': best_runs(repeats)}
+            print_report(result)
+            results.append(result)
+
+    settings = {name: getattr(args, name) for name in ('seed', 'dirty_rate', 'repeat', 'layout', 'extract_mode', 'processing_mode',
+                                                        'engine', 'batch_size', 'writer_profile', 'parallel_workers', 'extract_engine')}
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump({'settings': settings, 'results': results}, output_file, indent=2)
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        changed = {name: (baseline['settings'].get(name), value) for name, value in settings.items() if baseline['settings'].get(name) != value}
+        if changed:
+            print(f"\nSettings differ from the baseline (baseline, this run): {changed}")
+        regressions = compare_with_baseline(results, baseline, args.tolerance)
+        print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}.")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
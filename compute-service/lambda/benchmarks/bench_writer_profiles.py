@@ -0,0 +1,89 @@
+#BENCHMARK OF THE PARQUET WRITER PROFILES
+#
+# Writes a week of synthetic orders with every profile of parquet_functions.WRITER_PROFILES
+# (plus the orders table spec profile, sorted on order_date) and reports file size, write time,
+# full scan time and the time and bytes read by a one-day scan with a pushed down filter,
+# which is what the processing handlers and Redshift Spectrum do.
+#
+# Usage: python benchmarks/bench_writer_profiles.py --scale-factor 10 --days 7
+
+#import library
+import argparse
+import datetime
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'functions'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from parquet_functions import WRITER_PROFILES
+from parquet_functions import resolve_writer_profile
+from parquet_functions import write_parquet
+from synthetic_data import generate_table
+
+
+#file object counting the bytes pyarrow reads from it
+
+class CountingFile(io.BytesIO):
+    bytes_read = 0
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.bytes_read += len(data)
+        return data
+
+
+#function to build a week of orders, shuffled so the unsorted profiles see no date order
+
+def week_of_orders(scale_factor, days):
+    first_day = datetime.date(2024, 10, 1)
+    frames = [generate_table('orders', scale_factor / days, seed=day, order_date=str(first_day + datetime.timedelta(days=day)))
+              for day in range(days)]
+    orders = pd.concat(frames, ignore_index=True).sample(frac=1, random_state=0).reset_index(drop=True)
+    return pa.Table.from_pandas(orders, preserve_index=False), first_day + datetime.timedelta(days=days // 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare Parquet writer profiles on synthetic orders.')
+    parser.add_argument('--scale-factor', type=float, default=10, help='orders rows = 100,000 * scale factor')
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--repeat', type=int, default=3, help='scans per profile, the best time is reported')
+    args = parser.parse_args()
+
+    table, scan_day = week_of_orders(args.scale_factor, args.days)
+    profiles = [(name, resolve_writer_profile({'writer_profile': name})) for name in WRITER_PROFILES]
+    profiles.append(('orders spec', resolve_writer_profile({}, 'orders')))
+    print(f"{table.num_rows} orders over {args.days} days, filtered scan of {scan_day}\n")
+    print(f"{'profile':<14}{'size (MB)':>11}{'row groups':>12}{'write (s)':>11}{'scan (s)':>10}"
+          f"{'day scan (s)':>14}{'day read (MB)':>15}{'day rows':>10}")
+
+    for name, options in profiles:
+        buffer = io.BytesIO()
+        start_time = time.perf_counter()
+        write_parquet(table, buffer, options)
+        write_seconds = time.perf_counter() - start_time
+        data = buffer.getvalue()
+
+        scan_seconds = day_seconds = float('inf')
+        for _ in range(args.repeat):
+            start_time = time.perf_counter()
+            pq.read_table(io.BytesIO(data))
+            scan_seconds = min(scan_seconds, time.perf_counter() - start_time)
+
+            source = CountingFile(data)
+            start_time = time.perf_counter()
+            day = pq.read_table(source, columns=['order_date', 'order_id', 'selling_price', 'payment_methods'],
+                                filters=[('order_date', '=', scan_day)])
+            day_seconds = min(day_seconds, time.perf_counter() - start_time)
+
+        print(f"{name:<14}{len(data) / 1e6:>11.2f}{pq.ParquetFile(io.BytesIO(data)).num_row_groups:>12}{write_seconds:>11.3f}"
+              f"{scan_seconds:>10.3f}{day_seconds:>14.3f}{source.bytes_read / 1e6:>15.2f}{day.num_rows:>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,209 @@
+#SYNTHETIC GREENY DATASETS
+#
+# Generates the eight source tables (customers, departments, employees, inventory, orders,
+# products, purchase_order, suppliers) with the column layout the main_processing_* handlers
+# expect. A share of the values is dirty on purpose (wrong case, values outside the allowed
+# sets, malformed or non-ASCII emails, NULLs) so values_checker and check_and_replace_regex
+# style rules have real work to do. POSTGRES_TYPES describes the tables for a PostgreSQL
+# source database and the warehouse tables the handlers load.
+
+#import library
+import numpy as np
+import pandas as pd
+
+# Rows per table at scale factor 1
+BASE_ROWS = {
+    'customers': 10000,
+    'departments': 50,
+    'employees': 1000,
+    'inventory': 5000,
+    'orders': 100000,
+    'products': 2000,
+    'purchase_order': 20000,
+    'suppliers': 500,
+}
+
+# Share of dirty values in the cleaned columns
+DIRTY_RATE = 0.05
+
+# PostgreSQL column types of the source tables
+POSTGRES_TYPES = {
+    'customers': {'customer_id': 'integer', 'customer_name': 'text', 'customer_gender': 'text', 'customer_birth': 'date',
+                  'customer_type': 'text', 'customer_location': 'text', 'customer_email': 'text'},
+    'departments': {'department_id': 'integer', 'department_name': 'text', 'position': 'text', 'salary': 'bigint'},
+    'employees': {'employee_id': 'integer', 'employee_department_id': 'integer', 'employee_name': 'text', 'employee_gender': 'text',
+                  'employee_birth': 'date', 'employee_position': 'text', 'employee_location': 'text', 'employee_email': 'text',
+                  'employee_hire_date': 'date', 'status': 'text', 'resignation_date': 'date'},
+    'inventory': {'product_id': 'integer', 'product_name': 'text', 'category': 'text', 'batch': 'text', 'expiration_date': 'date',
+                  'depot_1': 'integer', 'depot_2': 'integer', 'depot_3': 'integer', 're_order_level': 'integer'},
+    'orders': {'order_date': 'date', 'order_id': 'integer', 'customer_id': 'integer', 'product_id': 'integer', 'quantity': 'integer',
+               'selling_price': 'numeric(12,2)', 'employee_id': 'integer', 'payment_methods': 'text'},
+    'products': {'product_id': 'integer', 'product_name': 'text', 'category': 'text', 'cost_price': 'numeric(12,2)',
+                 'selling_price': 'numeric(12,2)', 'batch': 'text', 'expiring_date': 'date'},
+    'purchase_order': {'purchase_order_date': 'date', 'purchase_order_id': 'integer', 'supplier_id': 'integer', 'product_id': 'integer',
+                       'quantity': 'integer', 'cost_price': 'numeric(12,2)', 'total_price': 'numeric(14,2)', 'delivery_date': 'date',
+                       'status': 'text'},
+    'suppliers': {'supplier_id': 'integer', 'supplier_name': 'text', 'supplier_email': 'text', 'supplier_location': 'text',
+                  'product_class': 'text', 'product_name': 'text[]'},
+}
+
+# Warehouse column types that differ from the source (the cleaning flattens the product list of suppliers)
+TARGET_TYPE_OVERRIDES = {'suppliers': {'product_name': 'text'}}
+
+FIRST_NAMES = ['adaeze', 'CHIDI', 'Ngozi', 'emeka', 'Clément', 'fatima', 'TUNDE', 'amaka']
+LOCATIONS = ['lagos', 'Abuja', 'KANO', 'enugu', 'port harcourt', 'Ibadan']
+GENDERS = ['male', 'Female', 'FEMALE', 'binary', 'non-binary', 'preferred to not say']
+DIRTY_GENDERS = ['m', 'unknown', '', None]
+POSITIONS = ['inventory_manager', 'Inventory_staff', 'admin', 'HR', 'sales_rep', 'accountant', 'business_manager']
+DEPARTMENTS = ['inventory', 'Administration', 'human_resource', 'BUSINESS', 'accounts']
+PAYMENT_METHODS = ['transfer', 'Cash', 'CARD']
+CATEGORIES = ['tablets', 'Syrup', 'INJECTION', 'capsules']
+
+
+#function to choose values, replacing a DIRTY_RATE share with dirty ones
+
+def _choose(rng, rows, clean_values, dirty_values=None, dirty_rate=DIRTY_RATE):
+    values = rng.choice(np.array(clean_values, dtype=object), size=rows)
+    if dirty_values:
+        dirty = rng.random(rows) < dirty_rate
+        values[dirty] = rng.choice(np.array(dirty_values, dtype=object), size=int(dirty.sum()))
+    return values
+
+
+def _emails(rng, rows, prefix, dirty_rate=DIRTY_RATE):
+    emails = np.array([f"{prefix}{i}@greeny-mail.com" for i in range(rows)], dtype=object)
+    dirty = np.flatnonzero(rng.random(rows) < dirty_rate)
+    for position in dirty:
+        emails[position] = rng.choice([f"{prefix}{position}.greeny-mail.com", f"{prefix}{position}@", f"clément{position}@mail.fr",
+                                       f" {prefix}{position}@greeny-mail.com", f"{prefix}{position}@greeny-mail", None])
+    return emails
+
+
+def _dates(rng, rows, start, days):
+    return pd.Timestamp(start) + pd.to_timedelta(rng.integers(0, days, size=rows), unit='D')
+
+
+#function to generate one table
+
+def generate_table(table_name, scale_factor=1.0, seed=0, order_date='2024-10-01', dirty_rate=DIRTY_RATE):
+    """
+    Returns a DataFrame for table_name with BASE_ROWS[table_name] * scale_factor rows.
+
+    Generation is deterministic for a given (table_name, scale_factor, seed, dirty_rate).
+    Orders and purchase orders are dated order_date, as a daily extract would be.
+    """
+    rng = np.random.default_rng([seed, sorted(BASE_ROWS).index(table_name)])
+    rows = max(1, int(BASE_ROWS[table_name] * scale_factor))
+    ids = np.arange(1, rows + 1)
+
+    def choose(clean_values, dirty_values=None):
+        return _choose(rng, rows, clean_values, dirty_values, dirty_rate)
+
+    def emails(prefix):
+        return _emails(rng, rows, prefix, dirty_rate)
+
+    if table_name == 'customers':
+        return pd.DataFrame({
+            'customer_id': ids,
+            'customer_name': choose(FIRST_NAMES, [None]),
+            'customer_gender': choose(GENDERS, DIRTY_GENDERS),
+            'customer_birth': _dates(rng, rows, '1950-01-01', 20000).date,
+            'customer_type': choose(['wholesaler', 'Retailer', 'NGO'], ['distributor', None]),
+            'customer_location': choose(LOCATIONS, [None]),
+            'customer_email': emails('customer'),
+        })
+    if table_name == 'departments':
+        return pd.DataFrame({
+            'department_id': ids,
+            'department_name': choose(DEPARTMENTS, ['marketing', None]),
+            'position': choose(POSITIONS, ['intern', None]),
+            'salary': rng.integers(100000, 2000000, size=rows),
+        })
+    if table_name == 'employees':
+        return pd.DataFrame({
+            'employee_id': ids,
+            'employee_department_id': rng.integers(1, 51, size=rows),
+            'employee_name': choose(FIRST_NAMES, [None]),
+            'employee_gender': choose(GENDERS, DIRTY_GENDERS),
+            'employee_birth': _dates(rng, rows, '1960-01-01', 15000).date,
+            'employee_position': choose(POSITIONS, ['intern', None]),
+            'employee_location': choose(LOCATIONS, [None]),
+            'employee_email': emails('employee'),
+            'employee_hire_date': _dates(rng, rows, '2010-01-01', 5000).date,
+            'status': choose(['active', 'Active', 'not active'], ['on leave', None]),
+            'resignation_date': np.where(rng.random(rows) < 0.1, _dates(rng, rows, '2020-01-01', 1500).date, None),
+        })
+    if table_name == 'inventory':
+        return pd.DataFrame({
+            'product_id': ids,
+            'product_name': choose(['paracetamol', 'AMOXICILLIN', 'Ibuprofen', 'vitamin c'], [None]),
+            'category': choose(CATEGORIES, [None]),
+            'batch': np.array([f"B{i % 97:03d}" for i in ids], dtype=object),
+            'expiration_date': _dates(rng, rows, '2025-01-01', 1000).date,
+            'depot_1': rng.integers(0, 1000, size=rows),
+            'depot_2': rng.integers(0, 1000, size=rows),
+            'depot_3': rng.integers(0, 1000, size=rows),
+            're_order_level': rng.integers(10, 100, size=rows),
+        })
+    if table_name == 'orders':
+        return pd.DataFrame({
+            'order_date': np.full(rows, pd.Timestamp(order_date).date(), dtype=object),
+            'order_id': (ids + 1) // 2,
+            'customer_id': rng.integers(1, BASE_ROWS['customers'] + 1, size=rows),
+            'product_id': rng.integers(1, BASE_ROWS['products'] + 1, size=rows),
+            'quantity': rng.integers(1, 500, size=rows),
+            'selling_price': np.round(rng.random(rows) * 5000, 2),
+            'employee_id': rng.integers(1, BASE_ROWS['employees'] + 1, size=rows),
+            'payment_methods': choose(PAYMENT_METHODS, ['cheque', 'crypto', None]),
+        })
+    if table_name == 'products':
+        return pd.DataFrame({
+            'product_id': ids,
+            'product_name': choose(['Paracetamol', 'Amoxicillin', 'Ibuprofen', 'Vitamin C']),
+            'category': choose(CATEGORIES),
+            'cost_price': np.round(rng.random(rows) * 3000, 2),
+            'selling_price': np.round(rng.random(rows) * 5000, 2),
+            'batch': np.array([f"B{i % 97:03d}" for i in ids], dtype=object),
+            'expiring_date': _dates(rng, rows, '2025-01-01', 1000).date,
+        })
+    if table_name == 'purchase_order':
+        quantity = rng.integers(1, 1000, size=rows)
+        cost_price = np.round(rng.random(rows) * 3000, 2)
+        return pd.DataFrame({
+            'purchase_order_date': np.full(rows, pd.Timestamp(order_date).date(), dtype=object),
+            'purchase_order_id': ids,
+            'supplier_id': rng.integers(1, BASE_ROWS['suppliers'] + 1, size=rows),
+            'product_id': rng.integers(1, BASE_ROWS['products'] + 1, size=rows),
+            'quantity': quantity,
+            'cost_price': cost_price,
+            'total_price': np.round(quantity * cost_price, 2),
+            'delivery_date': (pd.Timestamp(order_date) + pd.to_timedelta(rng.integers(1, 30, size=rows), unit='D')).date,
+            'status': choose(['delivered', 'Not delivered', 'NOT DELIVERED'], ['lost', None]),
+        })
+    if table_name == 'suppliers':
+        product_names = np.empty(rows, dtype=object)
+        for position in range(rows):
+            product_names[position] = list(rng.choice(['Paracetamol', 'Amoxicillin', 'Ibuprofen', 'Vitamin C'], size=int(rng.integers(1, 4))))
+        return pd.DataFrame({
+            'supplier_id': ids,
+            'supplier_name': np.array([f"Supplier {i}" for i in ids], dtype=object),
+            'supplier_email': emails('supplier'),
+            'supplier_location': choose(LOCATIONS, [None]),
+            'product_class': choose(['raw_materials', 'Finished products', 'FINISHED PRODUCTS'], ['samples', None]),
+            'product_name': product_names,
+        })
+    raise KeyError(f"Unknown table '{table_name}'")
+
+
+#function to generate all eight tables
+
+def generate_all(scale_factor=1.0, seed=0, order_date='2024-10-01', dirty_rate=DIRTY_RATE):
+    return {table_name: generate_table(table_name, scale_factor, seed, order_date, dirty_rate) for table_name in BASE_ROWS}
+
+
+#function to build the CREATE TABLE statement of a source table, or of its warehouse table with target=True
+
+def create_table_sql(schema, table_name, target=False):
+    types = dict(POSTGRES_TYPES[table_name], **(TARGET_TYPE_OVERRIDES.get(table_name, {}) if target else {}))
+    columns = ', '.join(f"{column} {column_type}" for column, column_type in types.items())
+    return f"CREATE TABLE {schema}.{table_name} ({columns});"
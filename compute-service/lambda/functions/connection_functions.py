@@ -0,0 +1,269 @@
+#import library
+import threading
+import weakref
+from contextlib import contextmanager
+import boto3
+import psycopg2
+from psycopg2.pool import ThreadedConnectionPool
+from botocore.config import Config
+
+# Keys of a db_params / database_params dict passed to psycopg2.connect, the rest (schema, table_name) is ignored
+CONNECT_KEYS = ('dbname', 'user', 'password', 'host', 'port', 'sslmode', 'connect_timeout')
+
+# Clients, connections and pools cached at module level, so they survive warm Lambda invocations.
+# Connections are cached per thread (see get_connection), the caches of live threads are tracked
+# in _CONNECTION_CACHES for close_connections and connection_stats
+_S3_CLIENTS = {}
+_THREAD_CONNECTIONS = threading.local()
+_CONNECTION_CACHES = weakref.WeakSet()
+_POOLS = {}
+_LOCK = threading.Lock()
+
+# Connections a pool keeps open once they are put back, the others are closed
+POOL_IDLE_CONNECTIONS = 1
+
+# Reuse counters, reported by connection_stats()
+_STATS = {'s3_clients_new': 0, 's3_clients_reused': 0, 'connections_new': 0, 'connections_reused': 0, 'connections_replaced': 0,
+          'pools_new': 0, 'pools_reused': 0, 'pools_closed': 0}
+
+
+#function to build the cache key of a set of connection parameters
+
+def connection_key(params):
+    return tuple((key, str(params[key])) for key in CONNECT_KEYS if params.get(key) is not None)
+
+
+#function to get a cached boto3 S3 client
+
+def get_s3_client(max_pool_connections=None):
+    """
+    Returns the S3 client of this process for the given connection pool size, creating it on first use.
+
+    boto3 clients are thread safe, so one client is shared by every handler and worker thread.
+    """
+    with _LOCK:
+        s3_client = _S3_CLIENTS.get(max_pool_connections)
+        if s3_client is not None:
+            _STATS['s3_clients_reused'] += 1
+            return s3_client
+        if max_pool_connections:
+            s3_client = boto3.client('s3', config=Config(max_pool_connections=max_pool_connections))
+        else:
+            s3_client = boto3.client('s3')
+        _S3_CLIENTS[max_pool_connections] = s3_client
+        _STATS['s3_clients_new'] += 1
+        return s3_client
+
+
+#CONNECTIONS CACHED PER THREAD
+
+class _ThreadConnections:
+    """Connections cached by one thread, closed when the thread ends and its thread-local storage is freed."""
+
+    def __init__(self):
+        self.connections = {}
+
+    def __del__(self):
+        for cnxn in self.connections.values():
+            try:
+                cnxn.close()
+            except Exception:
+                pass
+
+
+#function to get the connection cache of the current thread
+
+def _thread_connections():
+    cache = getattr(_THREAD_CONNECTIONS, 'cache', None)
+    if cache is None:
+        cache = _THREAD_CONNECTIONS.cache = _ThreadConnections()
+        with _LOCK:
+            _CONNECTION_CACHES.add(cache)
+    return cache.connections
+
+
+#function to check that a cached connection is still usable
+
+def is_healthy(cnxn):
+    if cnxn.closed:
+        return False
+    try:
+        with cnxn.cursor() as cursor:
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+        # End the transaction opened by the health check (or left open by a failed invocation)
+        cnxn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+
+#function to get a cached database connection
+
+def get_connection(params):
+    """
+    Returns an open psycopg2 connection for the given parameters.
+
+    Connections are cached per thread and (dbname, user, host, port, ...) and health checked
+    with SELECT 1 before they are reused, so a warm Lambda skips the TLS and authentication
+    handshake. A connection that fails the check is closed and replaced. Caching per thread
+    keeps the transactions of concurrent loads (see orchestrator_functions) apart; the cache
+    lives in thread-local storage, so the connections of a worker thread are closed when the
+    thread ends (e.g. with its ThreadPoolExecutor) instead of piling up in a warm container.
+
+    Parameters:
+    - params (dict): psycopg2.connect keyword arguments; keys outside CONNECT_KEYS are ignored.
+
+    Returns:
+    - connection: An open psycopg2 connection with no transaction in progress.
+    """
+    connections = _thread_connections()
+    key = connection_key(params)
+    cnxn = connections.pop(key, None)
+    if cnxn is not None:
+        if is_healthy(cnxn):
+            connections[key] = cnxn
+            with _LOCK:
+                _STATS['connections_reused'] += 1
+            return cnxn
+        print(f"Cached connection to {params.get('host')}/{params.get('dbname')} is no longer usable, reconnecting...")
+        close_quietly(cnxn)
+        with _LOCK:
+            _STATS['connections_replaced'] += 1
+
+    cnxn = psycopg2.connect(**dict((name, params[name]) for name, _ in key))
+    connections[key] = cnxn
+    with _LOCK:
+        _STATS['connections_new'] += 1
+    return cnxn
+
+
+#function to close a connection, ignoring errors of an already broken connection
+
+def close_quietly(cnxn):
+    try:
+        cnxn.close()
+    except psycopg2.Error:
+        pass
+
+
+#function to run a unit of work in a transaction on a cached connection
+
+@contextmanager
+def db_transaction(params, keep_alive=True):
+    """
+    Yields a cached connection and ends its transaction deterministically.
+
+    The transaction is committed when the block exits normally and rolled back when it
+    raises. With keep_alive=False, or when the connection broke during the block, the
+    connection is closed and dropped from the cache.
+    """
+    cnxn = get_connection(params)
+    try:
+        yield cnxn
+        cnxn.commit()
+    except Exception:
+        if not cnxn.closed:
+            try:
+                cnxn.rollback()
+            except psycopg2.Error:
+                keep_alive = False
+        raise
+    finally:
+        if not keep_alive or cnxn.closed:
+            connections = _thread_connections()
+            key = connection_key(params)
+            if connections.get(key) is cnxn:
+                del connections[key]
+            close_quietly(cnxn)
+
+
+#function to get a cached pool of database connections for worker threads
+
+def get_connection_pool(params, size, name=None):
+    """
+    Returns a ThreadedConnectionPool lending up to `size` connections for the given parameters.
+
+    Pools are cached like single connections, one per connection parameters and name, and
+    grow to the largest size asked for. Only POOL_IDLE_CONNECTIONS connections stay open once
+    they are put back, so a warm Lambda keeps a connection for the next invocation without
+    holding one per worker. Use pooled_transaction to borrow a connection. name keeps pools
+    used at the same time apart (e.g. the key range workers of one table inside a batch
+    extraction), close_connection_pool closes a pool that is not reused.
+    """
+    key = (connection_key(params), name)
+    with _LOCK:
+        pool = _POOLS.get(key)
+        if pool is not None and not pool.closed:
+            pool.maxconn = max(pool.maxconn, size)
+            _STATS['pools_reused'] += 1
+            return pool
+        pool = ThreadedConnectionPool(min(POOL_IDLE_CONNECTIONS, size), size, **dict((name, params[name]) for name, _ in key[0]))
+        _POOLS[key] = pool
+        _STATS['pools_new'] += 1
+        return pool
+
+
+#function to close a cached pool of database connections
+
+def close_connection_pool(params, name=None):
+    with _LOCK:
+        pool = _POOLS.pop((connection_key(params), name), None)
+        if pool is not None:
+            _STATS['pools_closed'] += 1
+    if pool is not None and not pool.closed:
+        pool.closeall()
+
+
+#function to run a unit of work in a transaction on a connection borrowed from a pool
+
+@contextmanager
+def pooled_transaction(pool):
+    """
+    Borrows a health checked connection from the pool, commits on success, rolls back on
+    error and always returns the connection (closing it if it broke).
+    """
+    cnxn = pool.getconn()
+    if not is_healthy(cnxn):
+        pool.putconn(cnxn, close=True)
+        cnxn = pool.getconn()
+        with _LOCK:
+            _STATS['connections_replaced'] += 1
+    try:
+        yield cnxn
+        cnxn.commit()
+    except Exception:
+        if not cnxn.closed:
+            try:
+                cnxn.rollback()
+            except psycopg2.Error:
+                pass
+        raise
+    finally:
+        pool.putconn(cnxn, close=bool(cnxn.closed))
+
+
+#function to close every cached connection and connection pool
+
+def close_connections():
+    with _LOCK:
+        connections = []
+        for cache in list(_CONNECTION_CACHES):
+            connections.extend(cache.connections.values())
+            cache.connections.clear()
+        pools = list(_POOLS.values())
+        _POOLS.clear()
+    for cnxn in connections:
+        close_quietly(cnxn)
+    for pool in pools:
+        if not pool.closed:
+            pool.closeall()
+
+
+#function to report how many clients and connections were created or reused by this process
+
+def connection_stats():
+    with _LOCK:
+        stats = dict(_STATS)
+        stats['connections_open'] = sum(len(cache.connections) for cache in _CONNECTION_CACHES)
+    return stats
@@ -0,0 +1,436 @@
+#import library
+import os
+import threading
+import uuid
+from contextlib import closing
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+from psycopg2.extensions import encodings as pg_encodings
+from s3_functions import read_json_object
+from s3_functions import write_json_object
+from parquet_functions import parquet_writer_kwargs
+from parquet_functions import sort_for_writing
+from metrics_functions import stage
+from table_specs import TABLE_SPECS
+
+# Arrow types for the PostgreSQL type OIDs reported in cursor.description
+PG_TYPE_OIDS = {
+    16: pa.bool_(),                       # bool
+    20: pa.int64(),                       # int8
+    21: pa.int16(),                       # int2
+    23: pa.int32(),                       # int4
+    25: pa.string(),                      # text
+    700: pa.float32(),                    # float4
+    701: pa.float64(),                    # float8
+    1042: pa.string(),                    # bpchar
+    1043: pa.string(),                    # varchar
+    1082: pa.date32(),                    # date
+    1114: pa.timestamp('us'),             # timestamp
+    1184: pa.timestamp('us', tz='UTC'),   # timestamptz
+}
+NUMERIC_OID = 1700
+# Numeric columns without a declared precision: their scale is only known once every row is
+# read, so they get a fixed one and every batch has the same type. Values with more than 9
+# digits after the point (or 29 before it) do not fit, declare the column numeric(p, s).
+UNCONSTRAINED_NUMERIC_TYPE = pa.decimal128(38, 9)
+
+# Engines fetching the rows of a query: 'cursor' (psycopg2 row tuples) or 'copy' (COPY ... TO STDOUT as CSV)
+EXTRACT_ENGINES = ('cursor', 'copy')
+
+
+#function to choose the extraction engine of a table
+
+def resolve_extract_engine(event, table_name):
+    # The event's 'extract_engine' overrides the table's TABLE_SPECS 'extract_engine'
+    engine = event.get('extract_engine') or TABLE_SPECS.get(table_name, {}).get('extract_engine', 'cursor')
+    if engine not in EXTRACT_ENGINES:
+        raise ValueError(f"Unknown extract engine '{engine}' for {table_name}, expected one of {EXTRACT_ENGINES}")
+    return engine
+
+
+#function to build the Arrow schema of a query result from the cursor description
+
+def arrow_schema_from_description(description, sample_rows):
+    """
+    Builds an Arrow schema for a query result.
+
+    Known PostgreSQL types are mapped through PG_TYPE_OIDS and numeric columns with a declared
+    precision (up to 38 digits) become decimals of that precision, other numeric columns
+    UNCONSTRAINED_NUMERIC_TYPE. Anything else is inferred from the sample rows, falling back to
+    string when the sample only holds NULLs.
+    """
+    fields = []
+    for position, column in enumerate(description):
+        if column.type_code in PG_TYPE_OIDS:
+            arrow_type = PG_TYPE_OIDS[column.type_code]
+        elif column.type_code == NUMERIC_OID and column.precision and 0 < column.precision <= 38:
+            arrow_type = pa.decimal128(column.precision, column.scale or 0)
+        elif column.type_code == NUMERIC_OID:
+            arrow_type = UNCONSTRAINED_NUMERIC_TYPE
+        else:
+            arrow_type = pa.array([row[position] for row in sample_rows]).type
+            if pa.types.is_null(arrow_type):
+                arrow_type = pa.string()
+        fields.append(pa.field(column.name, arrow_type))
+    return pa.schema(fields)
+
+
+#function to convert a list of row tuples to an Arrow RecordBatch
+
+def rows_to_record_batch(rows, schema):
+    columns = list(zip(*rows))
+    arrays = [pa.array(values, type=field.type) for values, field in zip(columns, schema)]
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+#function to stream a query result into a Parquet file batch by batch
+
+def stream_query_to_parquet(cnxn, sql_query, query_params, sink, batch_size=10000, watermark_column=None, writer_options=None,
+                            engine='cursor'):
+    """
+    Streams the result of sql_query into a Parquet sink through a server-side cursor.
+
+    Rows are fetched batch_size at a time from a named (server-side) cursor, or parsed from
+    COPY ... TO STDOUT with engine='copy' (see copy_query_batches), and each batch is
+    written as its own row group, so memory is bounded by the batch size rather than the
+    table size. With writer_options (see parquet_functions.resolve_writer_profile) the codec,
+    dictionary and statistics settings apply and every row group is sorted on the sort keys;
+    row groups still follow batch_size.
+
+    Parameters:
+    - cnxn: Open psycopg2 connection to the source database.
+    - sql_query (str): The query to run.
+    - query_params (tuple or None): Parameters for the query.
+    - sink (str or file-like): Path or writable file object the Parquet file is written to.
+    - batch_size (int): Number of rows fetched and written per batch.
+    - watermark_column (str): Optional column whose maximum value is tracked across batches.
+    - writer_options (dict): Optional resolved Parquet writer options.
+    - engine (str): 'cursor' or 'copy', see EXTRACT_ENGINES.
+
+    Returns:
+    - tuple: (rows written, maximum of watermark_column or None). Nothing is written to the
+      sink when the query returns no rows.
+    """
+    rows_written = 0
+    high_water_mark = None
+    writer = None
+    try:
+        with closing(query_batches(cnxn, sql_query, query_params, batch_size, engine=engine)) as batches:
+            for batch in batches:
+                with stage('encode') as record:
+                    if writer is None:
+                        writer = pq.ParquetWriter(sink, batch.schema, **(parquet_writer_kwargs(writer_options, batch.schema) if writer_options else {}))
+                    if writer_options:
+                        writer.write_table(sort_for_writing(pa.Table.from_batches([batch]), writer_options))
+                    else:
+                        writer.write_batch(batch)
+                    record.rows = batch.num_rows
+                rows_written += batch.num_rows
+                if watermark_column:
+                    batch_max = pc.max(batch.column(watermark_column)).as_py()
+                    if batch_max is not None and (high_water_mark is None or batch_max > high_water_mark):
+                        high_water_mark = batch_max
+    finally:
+        if writer is not None:
+            with stage('encode'):
+                writer.close()
+    return rows_written, high_water_mark
+
+
+#function to fetch a query result as an Arrow table through a server-side cursor
+
+def query_to_table(cnxn, sql_query, query_params, schema=None, batch_size=10000, engine='cursor'):
+    """
+    Runs sql_query on a named (server-side) cursor, or through COPY with engine='copy', and
+    converts every batch of batch_size rows to Arrow as it arrives, so the rows are never
+    held as Python tuples all at once.
+
+    Returns:
+    - pa.Table: The result with schema (built from the column types and the first batch
+      when omitted), or None when the query returns no rows and no schema was given.
+    """
+    with closing(query_batches(cnxn, sql_query, query_params, batch_size, schema, engine)) as batches:
+        batches = list(batches)
+    if schema is None:
+        if not batches:
+            return None
+        schema = batches[0].schema
+    return pa.Table.from_batches(batches, schema=schema)
+
+
+#function to fetch a query result as Arrow RecordBatches with the chosen engine
+
+def query_batches(cnxn, sql_query, query_params, batch_size=10000, schema=None, engine='cursor'):
+    if engine == 'copy':
+        return copy_query_batches(cnxn, sql_query, query_params, batch_size, schema)
+    return cursor_query_batches(cnxn, sql_query, query_params, batch_size, schema)
+
+
+#function to fetch a query result through a server-side cursor as Arrow RecordBatches of batch_size rows
+
+def cursor_query_batches(cnxn, sql_query, query_params, batch_size=10000, schema=None):
+    with cnxn.cursor(name=f"extract_{uuid.uuid4().hex}") as cursor:
+        cursor.itersize = batch_size
+        with stage('query'):
+            cursor.execute(sql_query, query_params)
+        while True:
+            with stage('query') as record:
+                rows = cursor.fetchmany(batch_size)
+                record.rows = len(rows)
+            if not rows:
+                break
+            with stage('transform') as record:
+                if schema is None:
+                    # The description of a named cursor is only available after the first fetch
+                    schema = arrow_schema_from_description(cursor.description, rows)
+                batch = rows_to_record_batch(rows, schema)
+                record.rows = len(rows)
+            yield batch
+
+
+#COPY TO STDOUT EXTRACTION ENGINE
+
+#function to map the columns of a query to the Arrow types the CSV reader converts them to
+
+def copy_column_types(description):
+    """
+    Returns {column: Arrow type} for the CSV output of a query, or None when a column has no
+    CSV conversion (arrays, json, uuid, ...) or two columns share a name.
+
+    Known PostgreSQL types are mapped through PG_TYPE_OIDS and numeric columns with a declared
+    precision (up to 38 digits) become decimals of that precision, other numeric columns
+    UNCONSTRAINED_NUMERIC_TYPE, like arrow_schema_from_description.
+    """
+    column_types = {}
+    for column in description:
+        if column.name in column_types:
+            return None
+        if column.type_code in PG_TYPE_OIDS:
+            column_types[column.name] = PG_TYPE_OIDS[column.type_code]
+        elif column.type_code == NUMERIC_OID and column.precision and 0 < column.precision <= 38:
+            column_types[column.name] = pa.decimal128(column.precision, column.scale or 0)
+        elif column.type_code == NUMERIC_OID:
+            column_types[column.name] = UNCONSTRAINED_NUMERIC_TYPE
+        else:
+            return None
+    return column_types
+
+
+#function to regroup Arrow batches into batches of batch_size rows
+
+def _rebatch(batches, batch_size):
+    pending = []
+    pending_rows = 0
+    for batch in batches:
+        pending.append(batch)
+        pending_rows += batch.num_rows
+        while pending_rows >= batch_size:
+            table = pa.Table.from_batches(pending)
+            yield table.slice(0, batch_size).combine_chunks().to_batches()[0]
+            rest = table.slice(batch_size)
+            pending = rest.to_batches()
+            pending_rows = rest.num_rows
+    if pending_rows:
+        yield pa.Table.from_batches(pending).combine_chunks().to_batches()[0]
+
+
+#function to stream a query result as Arrow RecordBatches through COPY ... TO STDOUT
+
+def copy_query_batches(cnxn, sql_query, query_params, batch_size=10000, schema=None, block_size=1024 * 1024):
+    """
+    Runs sql_query as COPY (sql_query) TO STDOUT WITH (FORMAT csv) and parses the CSV stream
+    with pyarrow's streaming CSV reader, so no Python object is built per value: psycopg2
+    writes the COPY data into a pipe from a thread while the reader converts blocks of
+    block_size bytes to typed Arrow batches, regrouped into batches of batch_size rows.
+
+    The column types come from a zero-row run of the query (see copy_column_types). Queries
+    with a column the CSV reader cannot type fall back to cursor_query_batches, so the
+    result has the same schema whatever the engine. Timestamps are parsed from the ISO
+    DateStyle, the PostgreSQL default.
+
+    Yields:
+    - pa.RecordBatch: Batches of the result, cast to schema when given.
+    """
+    # The query is inlined in COPY, which takes no parameters and no trailing semicolon
+    sql_query = sql_query.strip().rstrip(';').strip()
+    with cnxn.cursor() as cursor:
+        with stage('query'):
+            cursor.execute(f"SELECT * FROM ({sql_query}) AS copy_source LIMIT 0", query_params)
+        description = cursor.description
+        column_types = copy_column_types(description)
+        if column_types is None:
+            print("Columns without a CSV conversion, the query is extracted with the cursor engine")
+            yield from cursor_query_batches(cnxn, sql_query, query_params, batch_size, schema)
+            return
+        copy_sql = f"COPY ({cursor.mogrify(sql_query, query_params).decode(pg_encodings[cnxn.encoding])}) TO STDOUT WITH (FORMAT csv)"
+
+        read_fd, write_fd = os.pipe()
+        copy_errors = []
+
+        def copy_out():
+            try:
+                with open(write_fd, 'wb', buffering=block_size) as pipe_writer:
+                    cursor.copy_expert(copy_sql, pipe_writer)
+            except Exception as error:
+                copy_errors.append(error)
+
+        copy_thread = threading.Thread(target=copy_out, name='copy-to-stdout', daemon=True)
+        reader_done = False
+        try:
+            with open(read_fd, 'rb') as pipe_reader:
+                copy_thread.start()
+                # No rows (or a failed COPY): the CSV reader rejects an empty stream
+                if not pipe_reader.peek(1):
+                    reader_done = True
+                    return
+                # Opening the reader already reads and converts the first block
+                with stage('query'):
+                    reader = pa_csv.open_csv(
+                        pipe_reader,
+                        read_options=pa_csv.ReadOptions(column_names=list(column_types), block_size=block_size, use_threads=False),
+                        # Quoted text values may hold line breaks, the slower chunking is only needed with text columns
+                        parse_options=pa_csv.ParseOptions(newlines_in_values=any(pa.types.is_string(arrow_type) for arrow_type in column_types.values())),
+                        # NULL is an unquoted empty field, an empty string a quoted one
+                        convert_options=pa_csv.ConvertOptions(column_types=column_types, true_values=['t'], false_values=['f'],
+                                                              null_values=[''], strings_can_be_null=True,
+                                                              quoted_strings_can_be_null=False),
+                    )
+
+                def blocks():
+                    while True:
+                        with stage('query') as record:
+                            try:
+                                block = reader.read_next_batch()
+                            except StopIteration:
+                                return
+                            record.rows = block.num_rows
+                        yield block
+
+                for block in _rebatch(blocks(), batch_size):
+                    with stage('transform') as record:
+                        if schema is not None and block.schema != schema:
+                            block = pa.Table.from_batches([block]).cast(schema).combine_chunks().to_batches()[0]
+                        record.rows = block.num_rows
+                    yield block
+                reader_done = True
+        finally:
+            # Closing the read end stops a COPY still writing (early exit or error of the reader)
+            if copy_thread.ident is not None:
+                copy_thread.join()
+            else:
+                os.close(write_fd)
+            if copy_errors and (reader_done or not isinstance(copy_errors[0], BrokenPipeError)):
+                raise copy_errors[0]
+
+
+#KEY RANGE SPLITTING FOR PARALLEL EXTRACTION
+
+#function to build the WHERE clause of a list of conditions
+
+def where_clause(conditions):
+    return f" WHERE {' AND '.join(f'({condition})' for condition in conditions)}" if conditions else ''
+
+
+#function to compute the i-th of n equal-width split points between low and high
+
+def _split_point(low, high, position, ranges):
+    span = high - low
+    if isinstance(span, (int, timedelta)):
+        return low + span * position // ranges
+    return low + span * position / ranges
+
+
+#function to choose the boundaries splitting a table into key ranges
+
+def key_range_bounds(cnxn, table, column, ranges, method='minmax', conditions=None, query_params=None):
+    """
+    Returns the sorted upper bounds splitting table on column into at most `ranges` ranges
+    (see key_range_predicates), an empty list when the table has fewer distinct values.
+
+    - method='minmax': one min/max query, the ranges have equal widths. Cheap (an index scan
+      on a key column), but skewed keys give ranges of uneven size. Works on numeric, date
+      and timestamp columns.
+    - method='ntile': the ranges hold the same number of rows, at the cost of a sort of the
+      column by the database.
+
+    conditions and query_params (e.g. the watermark filter) restrict the rows considered.
+    """
+    conditions = list(conditions or [])
+    query_params = tuple(query_params or ())
+    with cnxn.cursor() as cursor:
+        if method == 'ntile':
+            cursor.execute(
+                f"SELECT max({column}) FROM (SELECT {column}, ntile(%s) OVER (ORDER BY {column}) AS tile FROM {table}"
+                f"{where_clause(conditions + [f'{column} IS NOT NULL'])}) AS tiles GROUP BY tile ORDER BY tile ;",
+                (ranges,) + query_params
+            )
+            # The largest value closes the last range
+            bounds = [row[0] for row in cursor.fetchall()][:-1]
+        elif method == 'minmax':
+            cursor.execute(f"SELECT min({column}), max({column}) FROM {table}{where_clause(conditions)} ;", query_params or None)
+            low, high = cursor.fetchone()
+            if low is None or low == high:
+                return []
+            try:
+                bounds = [_split_point(low, high, position, ranges) for position in range(1, ranges)]
+            except TypeError:
+                raise ValueError(f"Cannot split {column} ({type(low).__name__}) into equal-width ranges, use the ntile split method")
+            bounds = [bound for bound in bounds if bound < high]
+        else:
+            raise ValueError(f"Unknown split method '{method}', expected 'minmax' or 'ntile'")
+    return sorted(set(bounds))
+
+
+#function to turn the upper bounds of key ranges into WHERE conditions
+
+def key_range_predicates(column, bounds):
+    """
+    Returns one (condition, params) per range: column <= b1 (plus the NULL keys), then
+    b1 < column <= b2, ..., column > bn. A table without bounds is a single range.
+    """
+    if not bounds:
+        return [('TRUE', ())]
+    predicates = [(f"{column} <= %s OR {column} IS NULL", (bounds[0],))]
+    for lower, upper in zip(bounds, bounds[1:]):
+        predicates.append((f"{column} > %s AND {column} <= %s", (lower, upper)))
+    predicates.append((f"{column} > %s", (bounds[-1],)))
+    return predicates
+
+
+#WATERMARK STATE FOR INCREMENTAL EXTRACTION
+
+#function to build the S3 key holding the watermark of a table
+
+def watermark_state_key(state_prefix, schema, tablename):
+    return f"{state_prefix}/{schema}.{tablename}.json"
+
+
+#function to read the last high-water mark of a table, returns None on the first run
+
+def read_watermark(s3_client, s3_bucket, state_key):
+    state = read_json_object(s3_client, s3_bucket, state_key)
+    if not state:
+        return None
+    return state.get('watermark')
+
+
+#function to persist the new high-water mark of a table after a successful upload
+
+def write_watermark(s3_client, s3_bucket, state_key, watermark_column, watermark, rows):
+    # Dates and timestamps are stored as ISO strings, PostgreSQL casts them back when compared
+    if isinstance(watermark, (date, datetime)):
+        watermark = watermark.isoformat()
+    elif isinstance(watermark, Decimal):
+        watermark = str(watermark)
+    elif hasattr(watermark, 'item'):
+        watermark = watermark.item()
+    write_json_object(s3_client, s3_bucket, state_key, {
+        'watermark_column': watermark_column,
+        'watermark': watermark,
+        'rows': rows,
+        'updated_at': datetime.now(timezone.utc).isoformat(),
+    })
@@ -0,0 +1,318 @@
+#import library
+import io
+import json
+import re
+from datetime import datetime
+from datetime import timezone
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as csv
+from s3_functions import read_json_object
+from s3_functions import write_json_object
+from parquet_functions import resolve_writer_profile
+from parquet_functions import write_parquet
+from connection_functions import get_s3_client
+from metrics_functions import instrumented
+from metrics_functions import stage
+
+# Timestamp format of the 'Timestamp' column Google Forms writes to its response sheets
+FORM_TIMESTAMP_FORMAT = '%m/%d/%Y %H:%M:%S'
+
+# Types tried, in order, for a sheet column whose type is not known yet (first match wins)
+INFERRED_TYPES = ['int64', 'double', 'timestamp[ms]', 'bool']
+
+
+#function to convert a 1-based column number to its A1 letters (1 -> A, 27 -> AA)
+
+def column_letter(number):
+    letters = ''
+    while number > 0:
+        number, remainder = divmod(number - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return letters
+
+
+#LOCAL WORKSHEET
+
+class InMemoryWorksheet:
+    """
+    Local stand-in for a gspread Worksheet, for tests and benchmarks of google_form_to_s3
+    without the Google API (pass it as the handler's worksheet argument).
+
+    values is the sheet as a list of rows, the header first. Like gspread, get_values
+    returns the formatted cell values as strings, rows padded to the same width and
+    trailing empty rows dropped. ranges holds every A1 range requested.
+    """
+
+    def __init__(self, values):
+        self.values = [['' if value is None else str(value) for value in row] for row in values]
+        self.ranges = []
+
+    def append_rows(self, rows):
+        self.values.extend(['' if value is None else str(value) for value in row] for row in rows)
+
+    def get_values(self, range_name=None):
+        self.ranges.append(range_name)
+        # 'A2:F100', 'A2:F' (to the last row), '1:1' (a whole row) or 'B2' (one cell)
+        match = re.fullmatch(r'([A-Z]*)(\d*)(?::([A-Z]*)(\d*))?', (range_name or ':').upper())
+        if not match:
+            raise ValueError(f"Unsupported A1 range '{range_name}'")
+        start_letters, start_row, end_letters, end_row = match.groups()
+        if end_letters is None:
+            end_letters, end_row = start_letters, start_row
+        first_column = _column_number(start_letters) or 1
+        last_column = _column_number(end_letters) or None
+        first_row = int(start_row) if start_row else 1
+        last_row = int(end_row) if end_row else len(self.values)
+        rows = [row[first_column - 1:last_column] for row in self.values[first_row - 1:last_row]]
+        while rows and not any(rows[-1]):
+            rows.pop()
+        width = max((len(row) for row in rows), default=0)
+        return [row + [''] * (width - len(row)) for row in rows]
+
+
+#function to convert A1 column letters to a 1-based column number
+
+def _column_number(letters):
+    number = 0
+    for letter in letters or '':
+        number = number * 26 + ord(letter) - ord('A') + 1
+    return number
+
+
+#function to open the worksheet of the event with the service account credentials stored in S3
+
+def open_worksheet(s3, event):
+    # gspread and google-auth are only imported when the real Google API is used
+    import gspread
+    from google.oauth2.service_account import Credentials
+
+    # Download the credentials JSON from S3
+    credentials_object = s3.get_object(Bucket=event['bucket_name'], Key=event['credentials_key'])
+    credentials_data = credentials_object['Body'].read().decode('utf-8')  # Read and decode the JSON
+
+    # Setup Google Sheets API authorization
+    scopes = ["https://www.googleapis.com/auth/spreadsheets.readonly"]
+    credentials = Credentials.from_service_account_info(
+        json.loads(credentials_data), scopes=scopes
+    )
+
+    gc = gspread.authorize(credentials)
+    return gc.open_by_url(event['sheet_url']).worksheet(event['sheet_name'])
+
+
+#function to fetch the rows of a sheet after a row number, fetch_size rows per request
+
+def fetch_rows_after(worksheet, last_row, width, fetch_size=5000):
+    """
+    Returns the rows below last_row (1-based sheet row number), read with bounded A1 range
+    requests (e.g. 'A1201:F6200') until a request returns fewer rows than asked for.
+    """
+    rows = []
+    last_column = column_letter(max(width, 1))
+    start_row = last_row + 1
+    while True:
+        chunk = worksheet.get_values(f"A{start_row}:{last_column}{start_row + fetch_size - 1}")
+        rows.extend(chunk)
+        if len(chunk) < fetch_size:
+            return rows
+        start_row += fetch_size
+
+
+#function to make the header of a sheet usable as column names
+
+def sheet_column_names(header):
+    names = []
+    for position, name in enumerate(header, start=1):
+        name = name.strip() or f"column_{position}"
+        # Questions asked twice in a form give duplicate headers
+        base_name, suffix = name, 2
+        while name in names:
+            name, suffix = f"{base_name}_{suffix}", suffix + 1
+        names.append(name)
+    return names
+
+
+#function to convert a column of sheet strings to an Arrow type alias
+
+def _convert(values, type_alias, timestamp_format):
+    if type_alias.startswith('timestamp'):
+        return pc.strptime(values, format=timestamp_format, unit=pa.type_for_alias(type_alias).unit)
+    return pc.cast(values, pa.type_for_alias(type_alias))
+
+
+#function to convert sheet rows to a typed Arrow table
+
+def sheet_rows_to_table(header, rows, column_types=None, timestamp_format=FORM_TIMESTAMP_FORMAT):
+    """
+    Builds a pa.Table from sheet rows (lists of strings, empty cells as '').
+
+    Empty cells become NULL. A column listed in column_types ({column: Arrow type alias}) is
+    converted to that type, other columns get the first of INFERRED_TYPES all their values
+    convert to, or string. A column whose values no longer fit its type is kept as string.
+
+    Returns:
+    - tuple: The table and the column types used, to be reused by the next incremental run
+      so every file of the sheet has the same schema.
+    """
+    names = sheet_column_names(header)
+    column_types = dict(column_types or {})
+    arrays = []
+    for position, name in enumerate(names):
+        values = pa.array([row[position] if position < len(row) and row[position] != '' else None for row in rows], pa.string())
+        candidates = [column_types[name]] if name in column_types else INFERRED_TYPES
+        converted = None
+        if values.null_count < len(values) or name in column_types:
+            for type_alias in candidates:
+                if type_alias == 'string':
+                    break
+                try:
+                    converted = _convert(values, type_alias, timestamp_format)
+                    column_types[name] = type_alias
+                    break
+                except (pa.ArrowInvalid, pa.ArrowNotImplementedError, ValueError):
+                    continue
+        if converted is None:
+            if name in column_types and column_types[name] != 'string':
+                print(f"Column '{name}' no longer converts to {column_types[name]}, it is kept as string")
+            converted = values
+            # A column with no value yet is typed by the first run that has one
+            if values.null_count < len(values) or name in column_types:
+                column_types[name] = 'string'
+        arrays.append(converted)
+    return pa.Table.from_arrays(arrays, names=names), column_types
+
+
+#function to build the S3 state key of a sheet
+
+def sheet_state_key(state_prefix, sheet_url, sheet_name):
+    # The spreadsheet id of https://docs.google.com/spreadsheets/d/<id>/edit
+    match = re.search(r'/d/([A-Za-z0-9_-]+)', sheet_url)
+    sheet_id = match.group(1) if match else re.sub(r'[^A-Za-z0-9_-]+', '_', sheet_url)
+    return f"{state_prefix.rstrip('/')}/{sheet_id}_{re.sub(r'[^A-Za-z0-9_-]+', '_', sheet_name)}.json"
+
+
+#EXTRACT GOOGLE FORM RESPONSES TO S3
+@instrumented
+def google_form_to_s3(event, context, worksheet=None):
+    """
+    Extracts the responses sheet of a Google Form to S3 as typed Parquet ('output_format':
+    'csv' for CSV), under '{s3_prefix}{file_name}_{date}.parquet' (file_name defaults to
+    'feedback_data').
+
+    With 'incremental': True only the rows added since the last run are fetched: the last
+    ingested sheet row, the column types and the last 'watermark_column' value (e.g.
+    'Timestamp') are kept in an S3 state object ('s3_state_prefix', default
+    'state/google_sheets'), the header is read with one '1:1' request and new rows with
+    bounded A1 range requests ('fetch_size' rows each, default 5000). Each run writes
+    '{file_name}_rows_{first}-{last}_{date}.parquet'; a run without new rows writes nothing.
+    With a watermark_column, rows not after the stored value are dropped, so rows re-read
+    after a sheet edit are not ingested twice.
+
+    worksheet replaces the Google API, e.g. with an InMemoryWorksheet in tests.
+
+    Returns:
+    - dict: Rows fetched and written, sheet rows covered and the S3 key (None when nothing was written).
+    """
+    # Validate input parameters
+    required_keys = ['sheet_url', 'sheet_name', 'bucket_name'] + ([] if worksheet is not None else ['credentials_key'])
+    if not all(key in event for key in required_keys):
+        raise ValueError("Missing required parameters in event.")
+    sheet_url = event.get('sheet_url')
+    sheet_name = event.get('sheet_name')
+    bucket_name = event.get('bucket_name')
+    s3_prefix = event.get('s3_prefix', '')
+    file_name = event.get('file_name', 'feedback_data')
+    output_format = event.get('output_format', 'parquet')
+    watermark_column = event.get('watermark_column')
+    timestamp_format = event.get('timestamp_format', FORM_TIMESTAMP_FORMAT)
+    incremental = event.get('incremental', False)
+
+    # Prepare AWS S3 client
+    s3 = get_s3_client()
+
+    # Open the worksheet through the Google Sheets API unless a worksheet was injected
+    if worksheet is None:
+        worksheet = open_worksheet(s3, event)
+
+    state_key = sheet_state_key(event.get('s3_state_prefix', 'state/google_sheets'), sheet_url, sheet_name)
+    state = (read_json_object(s3, bucket_name, state_key) or {}) if incremental else {}
+    last_row = state.get('last_row', 1)
+
+    # Extract data from Google Sheet: the whole sheet, or the header and the rows after the last run
+    with stage('fetch') as record:
+        if incremental:
+            header_rows = worksheet.get_values('1:1')
+            header = header_rows[0] if header_rows else []
+            rows = fetch_rows_after(worksheet, last_row, len(header), int(event.get('fetch_size', 5000))) if header else []
+        else:
+            values = worksheet.get_values()
+            header, rows = (values[0], values[1:]) if values else ([], [])
+        record.rows = len(rows)
+    first_row, end_row = last_row + 1, last_row + len(rows)
+    # Fully empty rows are counted as read but not written
+    rows = [row for row in rows if any(row)]
+
+    if not rows:
+        print(f"No new rows in {sheet_name} after row {last_row}.")
+        return {'rows_fetched': 0, 'rows_written': 0, 'sheet_rows': None, 'key': None}
+
+    # Types of the earlier runs, then the types set in the event
+    column_types = dict(state.get('column_types') or {}, **(event.get('column_types') or {}))
+    with stage('transform') as record:
+        table, column_types = sheet_rows_to_table(header, rows, column_types, timestamp_format)
+        record.rows = table.num_rows
+    rows_fetched = table.num_rows
+
+    # Drop the rows at or before the last ingested watermark
+    last_watermark = state.get('last_watermark')
+    if watermark_column and watermark_column in table.column_names:
+        watermark_values = table[watermark_column]
+        if last_watermark is not None:
+            if pa.types.is_timestamp(watermark_values.type):
+                last_value = pa.scalar(datetime.fromisoformat(last_watermark), watermark_values.type)
+            else:
+                last_value = pa.scalar(last_watermark).cast(watermark_values.type)
+            table = table.filter(pc.fill_null(pc.greater(watermark_values, last_value), False))
+        if table.num_rows:
+            last_watermark = pc.max(table[watermark_column]).as_py()
+            last_watermark = last_watermark.isoformat() if isinstance(last_watermark, datetime) else last_watermark
+
+    # Generate the file name with the date of the run
+    current_date = datetime.now().strftime("%Y-%m-%d")
+    extension = 'csv' if output_format == 'csv' else 'parquet'
+    if incremental:
+        object_key = f"{s3_prefix}{file_name}_rows_{first_row}-{end_row}_{current_date}.{extension}"
+    else:
+        object_key = f"{s3_prefix}{file_name}_{current_date}.{extension}"
+
+    # Upload the typed file to the S3 bucket
+    if table.num_rows:
+        buffer = io.BytesIO()
+        if output_format == 'csv':
+            with stage('encode') as record:
+                csv.write_csv(table, buffer)
+                record.rows = table.num_rows
+        else:
+            write_parquet(table, buffer, resolve_writer_profile(event))
+        with stage('upload') as record:
+            s3.put_object(Bucket=bucket_name, Key=object_key, Body=buffer.getvalue())
+            record.bytes = buffer.tell()
+        print(f"Data uploaded to {bucket_name}/{object_key}")
+    else:
+        print(f"Rows {first_row}-{end_row} of {sheet_name} were already ingested.")
+        object_key = None
+
+    # Record progress only after the file is uploaded
+    if incremental:
+        write_json_object(s3, bucket_name, state_key, {
+            'sheet_url': sheet_url,
+            'sheet_name': sheet_name,
+            'last_row': end_row,
+            'column_types': column_types,
+            'last_watermark': last_watermark,
+            'rows_ingested': state.get('rows_ingested', 0) + table.num_rows,
+            'last_key': object_key or state.get('last_key'),
+            'updated_at': datetime.now(timezone.utc).isoformat(),
+        })
+    return {'rows_fetched': rows_fetched, 'rows_written': table.num_rows, 'sheet_rows': [first_row, end_row], 'key': object_key}
@@ -1,38 +1,94 @@
 #import library
 import re
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Characters python's re treats as whitespace (\s) but RE2 (Arrow) does not
+RE2_WHITESPACE_GAPS = r'[\x0b\x1c-\x1f]'
+
+
+#function to convert a column to an Arrow string array
+
+def column_to_arrow_strings(values):
+    if isinstance(values, (pa.Array, pa.ChunkedArray)):
+        return values if pa.types.is_string(values.type) else pc.cast(values, pa.string())
+    try:
+        # Zero-copy for Arrow-backed string columns, one pass for object columns of str
+        return pa.array(values, type=pa.string(), from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return pa.array(values.astype(str), type=pa.string(), from_pandas=True)
+
+
+#function to compute which values fully match a regex pattern
+
+def regex_fullmatch_mask(values, regex_pattern):
+    """
+    Returns a boolean numpy array, True where re.fullmatch(regex_pattern, str(value)) matches.
+
+    values can be a pandas Series or an Arrow array. The pattern is evaluated for the whole
+    column at once with Arrow's RE2 engine. Values where RE2 and python's re could disagree
+    (missing values, non-ASCII text, whitespace characters RE2 does not match) and patterns
+    RE2 cannot compile are re-checked with the precompiled python regex, so the result is
+    identical to matching every value with re.fullmatch.
+    """
+    compiled = re.compile(regex_pattern)
+    is_arrow = isinstance(values, (pa.Array, pa.ChunkedArray))
+    mask = np.zeros(len(values), dtype=bool)
+    recheck = np.ones(len(values), dtype=bool)
+
+    # POSIX classes such as [[:alpha:]] mean different things in RE2 and python's re
+    if '[:' not in regex_pattern:
+        strings = column_to_arrow_strings(values)
+        try:
+            matches = pc.match_substring_regex(strings, f"^(?:{regex_pattern})$")
+        except pa.ArrowInvalid:
+            # Look-arounds, back-references and other syntax RE2 does not support
+            matches = None
+        if matches is not None:
+            missing = values.is_null().to_numpy(zero_copy_only=False) if is_arrow else values.isna().to_numpy()
+            mask = np.array(matches.fill_null(False).to_numpy(zero_copy_only=False), dtype=bool)
+            recheck = missing | ~pc.string_is_ascii(strings).fill_null(False).to_numpy(zero_copy_only=False)
+            if '\\s' in regex_pattern or '\\S' in regex_pattern:
+                recheck |= pc.match_substring_regex(strings, RE2_WHITESPACE_GAPS).fill_null(False).to_numpy(zero_copy_only=False)
+
+    positions = np.flatnonzero(recheck)
+    if is_arrow:
+        python_values = values.take(pa.array(positions, type=pa.int64())).to_pylist()
+    else:
+        python_values = values.iloc[positions].to_numpy(dtype=object)
+    for position, value in zip(positions, python_values):
+        mask[position] = compiled.fullmatch(str(value)) is not None
+    return mask
+
 
 #function to check regex pattern
 
 def check_and_replace_regex(df, column_name, regex_pattern, replacement_value):
     """
     Checks if values in a DataFrame column match a regex pattern. Replaces non-matching values.
-    
+
     Parameters:
     - df (pd.DataFrame): The DataFrame to process.
     - column_name (str): The name of the column to check.
     - regex_pattern (str): The regex pattern to match values against.
     - replacement_value (str or int): The value to replace non-matching entries with.
-    
+
     Returns:
     - pd.DataFrame: The DataFrame with non-matching values replaced.
     """
-    
-    # Define a function to check if a value matches the regex pattern
-    def match_regex(value):
-        if re.fullmatch(regex_pattern, str(value)):
-            return value
-        else:
-            return replacement_value
-    
-    # Apply the match_regex function to the specified column
-    df[column_name] = df[column_name].apply(match_regex)
-    
+
+    # Match the whole column at once and keep the values that match the regex pattern
+    matches = regex_fullmatch_mask(df[column_name], regex_pattern)
+    df[column_name] = df[column_name].where(matches, replacement_value)
+
     return df
 
 
 #function for ensuring values are in list, if not replace with default value specified
 
 def values_checker(df, column_name, allowed_values, replacement_value):
-    df[column_name] = df[column_name].apply(lambda x: x if x in allowed_values else replacement_value)
+    # Set based membership test over the whole column instead of a list scan per row
+    allowed = df[column_name].isin(set(allowed_values))
+    df[column_name] = df[column_name].where(allowed, replacement_value)
     return df
-
@@ -0,0 +1,339 @@
+#import library
+import posixpath
+import threading
+import weakref
+from urllib.parse import quote
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+from botocore.exceptions import ClientError
+from s3_functions import S3MultipartWriter
+from s3_functions import S3RangeFile
+from s3_functions import list_objects
+from s3_functions import delete_s3_objects
+from s3_functions import hive_day_prefix
+from s3_functions import delete_stale_parts
+from s3_functions import DATE_PARTITION_PATTERN
+from parquet_functions import write_parquet
+from parquet_functions import parquet_writer_kwargs
+from parquet_functions import WRITER_PROFILES
+from metrics_functions import stage
+from table_specs import TABLE_SPECS
+
+# Hive-partitioned layout of the raw and staging zones (event 'layout': 'hive'):
+#
+#   {prefix}/table=<name>/dt=YYYY-MM-DD/[<partition column>=<value>/...]/part-N.parquet
+#
+# Secondary partition columns (TABLE_SPECS 'partition_by', e.g. payment_methods for orders) are
+# not stored in the files, pyarrow.dataset reads them back from the path.
+
+# Directory name of a NULL partition value, the pyarrow / Hive default
+HIVE_NULL_PARTITION = '__HIVE_DEFAULT_PARTITION__'
+
+
+#function to select the secondary partition columns of a table
+
+def resolve_partition_by(event, table_name):
+    # The event's 'partition_by' (a list, [] for none) overrides the table's TABLE_SPECS 'partition_by'
+    if 'partition_by' in event:
+        return event['partition_by'] or []
+    return TABLE_SPECS.get(table_name, {}).get('partition_by', [])
+
+
+#function to build the directory of a partition value, encoded like pyarrow's hive partitioning
+
+def _partition_segment(column, value):
+    if value is None:
+        return f"{column}={HIVE_NULL_PARTITION}"
+    return f"{column}={quote(str(value), safe='')}"
+
+
+#function to write a table as the Parquet files of a day partition
+
+def write_partitioned(s3_client, s3_bucket, table, table_prefix, date_suffix, partition_by=None, writer_options=None,
+                      part_number=0, file_prefix='part', replace=True, part_size=8 * 1024 * 1024, upload_concurrency=4):
+    """
+    Writes table under {table_prefix}dt={date_suffix}/, one file per value of the partition_by
+    columns (e.g. .../dt=2024-10-01/payment_methods=Card/part-0.parquet), or a single file when
+    partition_by is empty.
+
+    Parameters:
+    - s3_client: boto3 S3 client.
+    - s3_bucket (str): Bucket of the lake.
+    - table (pa.Table): Rows of the day.
+    - table_prefix (str): Prefix of the table (see hive_table_prefix).
+    - date_suffix (str): Day of the partition (YYYY-MM-DD).
+    - partition_by (list): Secondary partition columns, dropped from the files.
+    - writer_options (dict): Parquet writer options (see parquet_functions.resolve_writer_profile).
+    - part_number (int): N of the part-N.parquet files, so several writers can share a day.
+    - file_prefix (str): Name of the files before -N ('part', or 'delta' for incremental extracts).
+    - replace (bool): Delete the {file_prefix}-*.parquet files of the day left by a previous run.
+
+    Returns:
+    - list: Keys of the files written.
+    """
+    day_prefix = hive_day_prefix(table_prefix, date_suffix)
+    partition_by = [column for column in partition_by or [] if column in table.schema.names]
+    file_name = f"{file_prefix}-{part_number}.parquet"
+
+    if partition_by:
+        groups = []
+        # One file per combination of partition values present in the table
+        values = table.select(partition_by).group_by(partition_by).aggregate([]).to_pylist()
+        for row in values:
+            mask = None
+            for column in partition_by:
+                condition = pc.is_null(table[column]) if row[column] is None else pc.equal(table[column], row[column])
+                mask = condition if mask is None else pc.and_(mask, condition)
+            segments = '/'.join(_partition_segment(column, row[column]) for column in partition_by)
+            groups.append((f"{day_prefix}{segments}/{file_name}", table.filter(mask).drop_columns(partition_by)))
+    else:
+        groups = [(f"{day_prefix}{file_name}", table)]
+
+    keys = []
+    for key, part in groups:
+        with S3MultipartWriter(s3_client, s3_bucket, key, part_size, upload_concurrency) as sink:
+            write_parquet(part, sink, writer_options)
+        keys.append(key)
+
+    if replace:
+        delete_stale_parts(s3_client, s3_bucket, day_prefix, keys, file_prefix)
+    return keys
+
+
+#function to merge Parquet parts into one file, row group by row group
+
+def merge_parquet_parts(s3_client, s3_bucket, part_keys, destination_key, writer_options=None, part_size=8 * 1024 * 1024,
+                        upload_concurrency=4):
+    """
+    Concatenates the Parquet files part_keys into destination_key. Every row group of the parts
+    is read with ranged GETs and written as a row group of the merged file, so memory is
+    bounded by a row group, not by a part. The destination may be one of the parts: S3 only
+    replaces it when the merged upload completes, after every part has been read.
+
+    The parts are each sorted on the sort keys of writer_options but the merged file is not,
+    so its sorting_columns are left out.
+
+    Returns:
+    - int: Rows written.
+    """
+    sources = [S3RangeFile(s3_client, s3_bucket, key) for key in part_keys]
+    schema = pa.unify_schemas([pq.read_schema(source) for source in sources])
+    options = dict(writer_options or WRITER_PROFILES['default'], sort_by=None)
+    rows_written = 0
+    with S3MultipartWriter(s3_client, s3_bucket, destination_key, part_size, upload_concurrency) as sink:
+        with pq.ParquetWriter(sink, schema, **parquet_writer_kwargs(options, schema)) as writer:
+            for source in sources:
+                parquet_file = pq.ParquetFile(source)
+                for index in range(parquet_file.num_row_groups):
+                    with stage('decode') as record:
+                        row_group = parquet_file.read_row_group(index)
+                        record.rows = row_group.num_rows
+                    with stage('encode'):
+                        writer.write_table(row_group if row_group.schema == schema else row_group.cast(schema))
+                    rows_written += row_group.num_rows
+    return rows_written
+
+
+#function to resolve the Parquet files of a table between two dates in the hive layout
+
+def resolve_partition_keys(s3_client, s3_bucket, table_prefix, start_date, end_date, handler=None):
+    """
+    Returns {date: [keys]} for the dt= partitions between start_date and end_date (inclusive).
+
+    The listing starts after the dt= partitions before start_date and stops at the first key
+    after end_date, so a day or a week is resolved without listing the rest of the table's
+    history. The sizes of the listed files are handed to handler (S3FileSystemHandler),
+    so opening them needs no HEAD request.
+    """
+    keys_by_date = {}
+    for obj in list_objects(s3_client, s3_bucket, table_prefix, start_after=f"{table_prefix}dt={start_date}"):
+        match = DATE_PARTITION_PATTERN.search(obj['Key'][len(table_prefix) - 1:])
+        if not match:
+            continue
+        if match.group(1) > end_date:
+            break
+        if obj['Key'].endswith('.parquet'):
+            keys_by_date.setdefault(match.group(1), []).append(obj['Key'])
+            if handler is not None:
+                handler.remember(obj['Key'], obj['Size'])
+    return {date: sorted(keys) for date, keys in sorted(keys_by_date.items())}
+
+
+#PYARROW FILESYSTEM OVER BOTO3
+
+class S3FileSystemHandler(pafs.FileSystemHandler):
+    """
+    pyarrow filesystem handler over a boto3 S3 client, so pyarrow.dataset reads the lake with
+    the same client (credentials, endpoint, connection pool) as the rest of the functions.
+
+    Paths are the keys of one bucket. Files are opened as S3RangeFile, so a scan only
+    downloads the footers and the column chunks it needs. Sizes passed to remember() (from
+    a listing) save the HEAD request of get_file_info and open_input_file. bytes_fetched,
+    requests and bytes_total add up the downloads and sizes of every file opened; a file is
+    only referenced while it is open, so its downloaded bytes are released when pyarrow closes it.
+
+    Use it through pyarrow.fs.PyFileSystem(S3FileSystemHandler(...)).
+    """
+
+    def __init__(self, s3_client, s3_bucket, prefetch_size=0):
+        self.s3_client = s3_client
+        self.s3_bucket = s3_bucket
+        self.prefetch_size = prefetch_size
+        self._sizes = {}
+        # Files still open, and the counters of the closed ones
+        self._open_files = weakref.WeakSet()
+        self._closed_totals = {'bytes_fetched': 0, 'requests': 0, 'size': 0}
+        # Reentrant: the garbage collector may close a file while the totals are being read
+        self._lock = threading.RLock()
+
+    def remember(self, key, size):
+        self._sizes[key] = size
+
+    def _file_closed(self, source):
+        with self._lock:
+            self._open_files.discard(source)
+            self._closed_totals['bytes_fetched'] += source.bytes_fetched
+            self._closed_totals['requests'] += source.requests
+            self._closed_totals['size'] += source.size
+
+    def _total(self, name):
+        with self._lock:
+            return self._closed_totals[name] + sum(getattr(source, name) for source in list(self._open_files))
+
+    @property
+    def bytes_fetched(self):
+        return self._total('bytes_fetched')
+
+    @property
+    def requests(self):
+        return self._total('requests')
+
+    @property
+    def bytes_total(self):
+        return self._total('size')
+
+    def __eq__(self, other):
+        return isinstance(other, S3FileSystemHandler) and (self.s3_client, self.s3_bucket) == (other.s3_client, other.s3_bucket)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def get_type_name(self):
+        return 's3-boto3'
+
+    def normalize_path(self, path):
+        return path.lstrip('/')
+
+    def _info(self, path):
+        path = path.lstrip('/').rstrip('/')
+        if not path:
+            return pafs.FileInfo('', pafs.FileType.Directory)
+        if path in self._sizes:
+            return pafs.FileInfo(path, pafs.FileType.File, size=self._sizes[path])
+        try:
+            size = self.s3_client.head_object(Bucket=self.s3_bucket, Key=path)['ContentLength']
+            self._sizes[path] = size
+            return pafs.FileInfo(path, pafs.FileType.File, size=size)
+        except ClientError as ex:
+            if ex.response.get('Error', {}).get('Code') not in ('NoSuchKey', '404', 'NotFound'):
+                raise
+        # S3 has no directories, a prefix with at least one key is one
+        response = self.s3_client.list_objects_v2(Bucket=self.s3_bucket, Prefix=f"{path}/", MaxKeys=1)
+        file_type = pafs.FileType.Directory if response.get('KeyCount') else pafs.FileType.NotFound
+        return pafs.FileInfo(path, file_type)
+
+    def get_file_info(self, paths):
+        return [self._info(path) for path in paths]
+
+    def get_file_info_selector(self, selector):
+        base_dir = selector.base_dir.strip('/')
+        prefix = f"{base_dir}/" if base_dir else ''
+        infos = []
+        directories = set()
+        if selector.recursive:
+            for obj in list_objects(self.s3_client, self.s3_bucket, prefix):
+                self._sizes[obj['Key']] = obj['Size']
+                infos.append(pafs.FileInfo(obj['Key'], pafs.FileType.File, size=obj['Size']))
+                # Directories implied by the key, below the base directory
+                parent = posixpath.dirname(obj['Key'])
+                while len(parent) > len(base_dir) and parent not in directories:
+                    directories.add(parent)
+                    parent = posixpath.dirname(parent)
+        else:
+            paginator = self.s3_client.get_paginator('list_objects_v2')
+            for page in paginator.paginate(Bucket=self.s3_bucket, Prefix=prefix, Delimiter='/'):
+                for obj in page.get('Contents', []):
+                    self._sizes[obj['Key']] = obj['Size']
+                    infos.append(pafs.FileInfo(obj['Key'], pafs.FileType.File, size=obj['Size']))
+                directories.update(common['Prefix'].rstrip('/') for common in page.get('CommonPrefixes', []))
+        if not infos and not directories and not selector.allow_not_found:
+            raise FileNotFoundError(f"s3://{self.s3_bucket}/{prefix}")
+        return infos + [pafs.FileInfo(directory, pafs.FileType.Directory) for directory in sorted(directories)]
+
+    def open_input_file(self, path):
+        path = path.lstrip('/')
+        source = S3RangeFile(self.s3_client, self.s3_bucket, path, size=self._sizes.get(path), prefetch_size=self.prefetch_size,
+                             on_close=self._file_closed)
+        with self._lock:
+            self._open_files.add(source)
+        return pa.PythonFile(source, mode='r')
+
+    def open_input_stream(self, path):
+        return self.open_input_file(path)
+
+    def open_output_stream(self, path, metadata):
+        return pa.PythonFile(S3MultipartWriter(self.s3_client, self.s3_bucket, path.lstrip('/')), mode='w')
+
+    def open_append_stream(self, path, metadata):
+        raise NotImplementedError("S3 objects cannot be appended to")
+
+    # S3 has no directories to create or remove
+    def create_dir(self, path, recursive):
+        pass
+
+    def delete_dir(self, path):
+        self.delete_dir_contents(path, missing_dir_ok=True)
+
+    def delete_dir_contents(self, path, missing_dir_ok=False):
+        prefix = f"{path.strip('/')}/"
+        keys = [obj['Key'] for obj in list_objects(self.s3_client, self.s3_bucket, prefix)]
+        if not keys and not missing_dir_ok:
+            raise FileNotFoundError(f"s3://{self.s3_bucket}/{prefix}")
+        delete_s3_objects(self.s3_client, self.s3_bucket, keys)
+
+    def delete_root_dir_contents(self):
+        raise NotImplementedError("Refusing to delete every object of the bucket")
+
+    def delete_file(self, path):
+        self.s3_client.delete_object(Bucket=self.s3_bucket, Key=path.lstrip('/'))
+        self._sizes.pop(path.lstrip('/'), None)
+
+    def copy_file(self, src, dest):
+        self.s3_client.copy_object(Bucket=self.s3_bucket, Key=dest.lstrip('/'), CopySource={'Bucket': self.s3_bucket, 'Key': src.lstrip('/')})
+
+    def move(self, src, dest):
+        self.copy_file(src, dest)
+        self.delete_file(src)
+
+
+#function to open the files of a hive-partitioned table as one pyarrow dataset
+
+def partitioned_dataset(handler, table_prefix, keys):
+    """
+    Returns a pyarrow dataset over keys (files of one table, see resolve_partition_keys).
+
+    The hive partitioning under table_prefix is discovered from the paths, so dt and the
+    secondary partition columns are columns of the dataset. A filter on them skips whole
+    files without opening them, other filters are pruned by row group statistics.
+
+    Parameters:
+    - handler (S3FileSystemHandler): Filesystem the keys are read through.
+    - table_prefix (str): Prefix of the table (see hive_table_prefix).
+    - keys (list): Parquet files of the dataset.
+    """
+    # pyarrow.dataset imports pandas, so only the hive layout pays for it
+    import pyarrow.dataset as ds
+    return ds.dataset(keys, filesystem=pafs.PyFileSystem(handler), format='parquet',
+                      partitioning=ds.HivePartitioning.discover(), partition_base_dir=table_prefix.rstrip('/'))
@@ -0,0 +1,183 @@
+#import library
+import gzip
+import time
+import uuid
+from io import BytesIO
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as csv
+import pyarrow.parquet as pq
+from psycopg2.extras import execute_values
+from metrics_functions import stage
+
+
+#function to convert DataFrame or Arrow table rows to plain python tuples the database driver can adapt
+
+def data_rows(data, columns):
+    """
+    Converts the selected columns of a DataFrame or pa.Table to a list of tuples of python objects.
+
+    numpy scalars are converted to their python equivalents and missing values
+    (NaN, NaT, None) are converted to None so they are loaded as NULL.
+    """
+    if isinstance(data, pa.Table):
+        return list(zip(*[data.column(column).to_pylist() for column in columns]))
+    # A DataFrame was passed, so pandas is already loaded
+    import pandas as pd
+    frame = data[columns].astype(object)
+    frame = frame.where(pd.notna(frame), None)
+    return list(frame.itertuples(index=False, name=None))
+
+
+#function to write the DataFrame or Arrow table to a staging key in S3 for the COPY command
+
+def stage_data_to_s3(s3_client, data, columns, s3_bucket, staging_key, file_format='csv'):
+    buffer = BytesIO()
+    with stage('encode') as record:
+        record.rows = len(data)
+        if isinstance(data, pa.Table):
+            table = data.select(columns)
+            if file_format == 'parquet':
+                pq.write_table(table, buffer)
+            else:
+                # GzipFile leaves the buffer open, pa.CompressedOutputStream would close it with the stream
+                with gzip.GzipFile(fileobj=buffer, mode='wb') as stream:
+                    csv.write_csv(table, stream)
+        elif file_format == 'parquet':
+            table = pa.Table.from_pandas(data[columns], preserve_index=False)
+            pq.write_table(table, buffer)
+        else:
+            data[columns].to_csv(buffer, index=False, compression={'method': 'gzip'})
+    with stage('upload') as record:
+        record.bytes = buffer.tell()
+        s3_client.put_object(Body=buffer.getvalue(), Bucket=s3_bucket, Key=staging_key)
+    return f"s3://{s3_bucket}/{staging_key}"
+
+
+#function to build the COPY statement for the staged file
+
+def build_copy_statement(target_table, columns, s3_uri, iam_role, file_format='csv', region=None):
+    if file_format == 'parquet':
+        # Parquet columns are matched to the table columns by position
+        copy_query = f"COPY {target_table} FROM '{s3_uri}' IAM_ROLE '{iam_role}' FORMAT AS PARQUET"
+    else:
+        copy_query = (
+            f"COPY {target_table} ({', '.join(columns)}) FROM '{s3_uri}' IAM_ROLE '{iam_role}' "
+            f"FORMAT AS CSV GZIP IGNOREHEADER 1 EMPTYASNULL DATEFORMAT 'auto' TIMEFORMAT 'auto'"
+        )
+    if region:
+        copy_query += f" REGION '{region}'"
+    return copy_query + ";"
+
+
+#function to send the rows to a table with COPY (staged in S3) or batched multi-row INSERTs
+
+def load_rows(cursor, load_table, data, columns, s3_client=None, s3_bucket=None, copy_options=None, page_size=1000, target_table=None):
+    """
+    Loads data into load_table and returns the method used ('copy' or 'execute_values').
+
+    target_table names the COPY staging folder when load_table is a temporary table. The
+    staged file is deleted once the COPY statement returns.
+    """
+    copy_options = copy_options or {}
+    if copy_options.get('iam_role') and s3_client is not None and s3_bucket:
+        file_format = copy_options.get('format', 'csv')
+        extension = 'parquet' if file_format == 'parquet' else 'csv.gz'
+        staging_prefix = copy_options.get('staging_prefix', 'copy_staging')
+        staging_key = f"{staging_prefix}/{target_table or load_table}/{uuid.uuid4().hex}.{extension}"
+        s3_uri = stage_data_to_s3(s3_client, data, columns, s3_bucket, staging_key, file_format)
+        try:
+            cursor.execute(build_copy_statement(
+                load_table, columns, s3_uri, copy_options['iam_role'], file_format, copy_options.get('region')
+            ))
+        finally:
+            # COPY has read the staged file (or failed), it is not needed anymore
+            try:
+                s3_client.delete_object(Bucket=s3_bucket, Key=staging_key)
+            except Exception as ex:
+                print(f"Could not delete the COPY staging file '{s3_uri}': {ex}")
+        return 'copy'
+    insert_query = f"INSERT INTO {load_table} ({', '.join(columns)}) VALUES %s"
+    execute_values(cursor, insert_query, data_rows(data, columns), page_size=page_size)
+    return 'execute_values'
+
+
+#function to keep the last row of every key in a DataFrame or Arrow table
+
+def dedupe_on_keys(data, key_columns):
+    if isinstance(data, pa.Table):
+        row_numbers = pa.array(range(data.num_rows), type=pa.int64())
+        last_rows = (data.select(key_columns).append_column('row_number', row_numbers)
+                     .group_by(key_columns, use_threads=False).aggregate([('row_number', 'max')]))
+        # Keep the surviving rows in their original order
+        keep = last_rows.column('row_number_max')
+        return data.take(pc.take(keep, pc.sort_indices(keep)))
+    return data.drop_duplicates(subset=key_columns, keep='last')
+
+
+#function to bulk load a DataFrame or Arrow table into Redshift (COPY) or any PostgreSQL compatible target (execute_values)
+
+def bulk_load(cnxn, data, db_params, columns, s3_client=None, s3_bucket=None, copy_options=None, page_size=1000, key_columns=None):
+    """
+    Loads a cleaned DataFrame or pa.Table into {db_params['schema']}.{db_params['table_name']} in bulk.
+
+    When copy_options names an 'iam_role' the data is staged to S3 and loaded with a
+    single COPY statement, otherwise rows are sent as batched multi-row INSERTs through
+    psycopg2's execute_values. COPY is opt-in: the role must be one the Redshift namespace
+    can assume with read access to the bucket, and the state machine passes no copy_options.
+    The caller owns the transaction and must commit.
+
+    With key_columns the load is an idempotent upsert: the batch is deduplicated on the
+    keys (last row wins), loaded into a temporary table, and replaces the target rows with
+    the same keys through one set-based DELETE ... USING and one INSERT ... SELECT. Re-running
+    a load, or loading a delta, then costs the size of the batch instead of a full reload.
+
+    Parameters:
+    - cnxn: Open psycopg2 connection to the target database.
+    - data (pd.DataFrame or pa.Table): The cleaned data to load.
+    - db_params (dict): Connection parameters including 'schema' and 'table_name'.
+    - columns (list): Target columns, in the order they are loaded.
+    - s3_client: boto3 S3 client used to stage the file for COPY.
+    - s3_bucket (str): Bucket the COPY staging file is written to.
+    - copy_options (dict): Optional 'iam_role', 'staging_prefix', 'format' ('csv' or 'parquet') and 'region'.
+    - page_size (int): Rows per INSERT statement for the execute_values fallback.
+    - key_columns (list): Natural key of the table, enables the upsert mode.
+
+    Returns:
+    - dict: Rows loaded, load method, elapsed seconds and throughput for the table (plus rows
+      replaced and duplicates dropped in upsert mode).
+    """
+    target_table = f"{db_params['schema']}.{db_params['table_name']}"
+    start_time = time.perf_counter()
+    upsert_stats = {}
+
+    with stage('load') as record, cnxn.cursor() as cursor:
+        record.rows = len(data)
+        if key_columns:
+            rows_received = len(data)
+            data = dedupe_on_keys(data, key_columns)
+            stage_table = f"{db_params['table_name']}_upsert_{uuid.uuid4().hex[:8]}"
+            cursor.execute(f"CREATE TEMP TABLE {stage_table} (LIKE {target_table});")
+            load_method = load_rows(cursor, stage_table, data, columns, s3_client, s3_bucket, copy_options, page_size, target_table)
+            key_match = ' AND '.join(f"{target_table}.{key} = {stage_table}.{key}" for key in key_columns)
+            cursor.execute(f"DELETE FROM {target_table} USING {stage_table} WHERE {key_match};")
+            rows_replaced = cursor.rowcount
+            cursor.execute(f"INSERT INTO {target_table} ({', '.join(columns)}) SELECT {', '.join(columns)} FROM {stage_table};")
+            cursor.execute(f"DROP TABLE {stage_table};")
+            load_method = f"upsert/{load_method}"
+            upsert_stats = {'rows_replaced': rows_replaced, 'duplicates_dropped': rows_received - len(data)}
+        else:
+            load_method = load_rows(cursor, target_table, data, columns, s3_client, s3_bucket, copy_options, page_size)
+
+    elapsed = time.perf_counter() - start_time
+    rows_loaded = len(data)
+    load_stats = {
+        'table': target_table,
+        'method': load_method,
+        'rows_loaded': rows_loaded,
+        'seconds': round(elapsed, 3),
+        'rows_per_second': round(rows_loaded / elapsed, 1) if elapsed > 0 else None,
+    }
+    load_stats.update(upsert_stats)
+    print(f"Loaded {rows_loaded} rows into {target_table} via {load_method} in {elapsed:.2f}s ({load_stats['rows_per_second']} rows/s)")
+    return load_stats
@@ -0,0 +1,277 @@
+#import library
+import contextvars
+import functools
+import json
+import logging
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextlib import nullcontext
+
+# Stage metrics of the handlers: wall time, rows, bytes and peak RSS of every stage (list, fetch,
+# decode, transform, encode, upload, load, ...) of an invocation. Stages are opened anywhere with
+#
+#   with stage('fetch') as record:
+#       record.bytes = len(body)
+#
+# and recorded into the collector of the running handler (see instrumented). Without one, i.e.
+# when metrics are disabled, stage() is a ContextVar lookup and a shared no-op record.
+#
+# Metrics are enabled by the event's 'metrics' (True/False) or else the PIPELINE_METRICS
+# environment variable ('1'). An enabled handler logs one CloudWatch Embedded Metric Format (EMF)
+# JSON line per stage and adds a summary under 'metrics' to its (dict) return value.
+
+# CloudWatch namespace of the emitted metrics
+METRICS_NAMESPACE = os.environ.get('PIPELINE_METRICS_NAMESPACE', 'GreenyPharma/Pipeline')
+
+# EMF lines must be bare JSON log events, so they bypass the Lambda log formatter
+metrics_logger = logging.getLogger('pipeline.metrics')
+metrics_logger.setLevel(logging.INFO)
+metrics_logger.propagate = False
+if not metrics_logger.handlers:
+    _stream_handler = logging.StreamHandler(sys.stdout)
+    _stream_handler.setFormatter(logging.Formatter('%(message)s'))
+    metrics_logger.addHandler(_stream_handler)
+
+# Collector of the handler running in the current thread / context
+_CURRENT_METRICS = contextvars.ContextVar('pipeline_metrics', default=None)
+
+
+#function to reset the peak resident memory (VmHWM) of the process, so the next reading covers this run only
+
+def reset_peak_memory():
+    # Linux >= 4.0 resets VmHWM when 5 is written to clear_refs. Without it the peak covers the
+    # life of the process, e.g. every invocation of a warm Lambda
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+        return True
+    except OSError:
+        return False
+
+
+#function to read the peak resident memory of the process in MiB
+
+def peak_memory_mb():
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    # ru_maxrss is in KiB on Linux (bytes on macOS) and cannot be reset
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+#STAGE RECORDS
+
+class StageRecord:
+    """Rows and bytes a stage reports through the record yielded by stage()."""
+    __slots__ = ('rows', 'bytes')
+
+    def __init__(self):
+        self.rows = 0
+        self.bytes = 0
+
+
+class _DisabledRecord:
+    # Shared record of disabled stages, assignments are dropped
+    __slots__ = ()
+
+    def __setattr__(self, name, value):
+        pass
+
+    rows = 0
+    bytes = 0
+
+
+_DISABLED_RECORD = _DisabledRecord()
+
+# Reusable no-op stage of disabled metrics
+_DISABLED_STAGE = nullcontext(_DISABLED_RECORD)
+
+
+#STAGE METRICS COLLECTOR
+
+class StageMetrics:
+    """
+    Collects the stages of one handler invocation.
+
+    Each stage name accumulates its calls, rows, bytes, seconds and the peak RSS read when a
+    call ends. seconds is self time: a stage opened inside another (e.g. the S3 'fetch' of a
+    Parquet 'decode') is subtracted from the outer one, so the stages of a thread add up to
+    its wall time. Stages running on worker threads (multipart part uploads, concurrent
+    reads) are summed, so their seconds can exceed the handler's wall time. With reset_peak
+    False the peak RSS is not reset (another invocation runs in the same process) and covers
+    the process since its last reset.
+    """
+
+    def __init__(self, handler, dimensions=None, namespace=METRICS_NAMESPACE, reset_peak=True):
+        self.handler = handler
+        self.dimensions = dict(dimensions or {})
+        self.namespace = namespace
+        self.stages = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.peak_reset = reset_peak_memory() if reset_peak else False
+        self.start_time = time.perf_counter()
+        self.seconds = None
+
+    @contextmanager
+    def stage(self, name):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        record = StageRecord()
+        # [nested stage seconds] of the stage, subtracted from its own time
+        frame = [0.0]
+        stack.append(frame)
+        start_time = time.perf_counter()
+        try:
+            yield record
+        finally:
+            elapsed = time.perf_counter() - start_time
+            stack.pop()
+            if stack:
+                stack[-1][0] += elapsed
+            self.add(name, elapsed - frame[0], record.rows, record.bytes)
+
+    def add(self, name, seconds=0.0, rows=0, bytes=0):
+        peak_rss_mb = peak_memory_mb()
+        with self._lock:
+            totals = self.stages.get(name)
+            if totals is None:
+                totals = self.stages[name] = {'calls': 0, 'seconds': 0.0, 'rows': 0, 'bytes': 0, 'peak_rss_mb': 0.0}
+            totals['calls'] += 1
+            totals['seconds'] += seconds
+            totals['rows'] += rows or 0
+            totals['bytes'] += bytes or 0
+            totals['peak_rss_mb'] = max(totals['peak_rss_mb'], peak_rss_mb)
+
+    def finish(self):
+        self.seconds = time.perf_counter() - self.start_time
+
+    def summary(self):
+        return {
+            'handler': self.handler,
+            'seconds': round(self.seconds if self.seconds is not None else time.perf_counter() - self.start_time, 3),
+            'peak_rss_mb': peak_memory_mb(),
+            'peak_reset': self.peak_reset,
+            'stages': {
+                name: dict(totals, seconds=round(totals['seconds'], 4))
+                for name, totals in sorted(self.stages.items(), key=lambda item: -item[1]['seconds'])
+            },
+        }
+
+    def emf_lines(self):
+        """Returns one CloudWatch Embedded Metric Format document per stage, plus one 'total'."""
+        timestamp = int(time.time() * 1000)
+        dimension_names = ['Handler', 'Stage'] + sorted(self.dimensions)
+        summary = self.summary()
+        stages = dict(summary['stages'])
+        stages['total'] = {'calls': 1, 'seconds': summary['seconds'], 'rows': 0, 'bytes': 0, 'peak_rss_mb': summary['peak_rss_mb']}
+        lines = []
+        for name, totals in stages.items():
+            document = {
+                '_aws': {
+                    'Timestamp': timestamp,
+                    'CloudWatchMetrics': [{
+                        'Namespace': self.namespace,
+                        'Dimensions': [dimension_names],
+                        'Metrics': [
+                            {'Name': 'Seconds', 'Unit': 'Seconds'},
+                            {'Name': 'Calls', 'Unit': 'Count'},
+                            {'Name': 'Rows', 'Unit': 'Count'},
+                            {'Name': 'Bytes', 'Unit': 'Bytes'},
+                            {'Name': 'PeakRSS', 'Unit': 'Megabytes'},
+                        ],
+                    }],
+                },
+                'Handler': self.handler,
+                'Stage': name,
+                'Seconds': totals['seconds'],
+                'Calls': totals['calls'],
+                'Rows': totals['rows'],
+                'Bytes': totals['bytes'],
+                'PeakRSS': totals['peak_rss_mb'],
+            }
+            document.update(self.dimensions)
+            lines.append(json.dumps(document, default=str))
+        return lines
+
+    def emit(self):
+        for line in self.emf_lines():
+            metrics_logger.info(line)
+
+
+#function to open a stage in the collector of the running handler (a no-op when metrics are disabled)
+
+def stage(name):
+    metrics = _CURRENT_METRICS.get()
+    if metrics is None:
+        return _DISABLED_STAGE
+    return metrics.stage(name)
+
+
+#function to run a callable with the metrics context of the caller, e.g. on a thread pool
+
+def with_current_metrics(function):
+    metrics = _CURRENT_METRICS.get()
+    if metrics is None:
+        return function
+
+    @functools.wraps(function)
+    def run(*args, **kwargs):
+        token = _CURRENT_METRICS.set(metrics)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            _CURRENT_METRICS.reset(token)
+    return run
+
+
+#function to check whether metrics are enabled for an event
+
+def metrics_enabled(event):
+    enabled = event.get('metrics') if isinstance(event, dict) else None
+    if enabled is None:
+        return os.environ.get('PIPELINE_METRICS', '0').lower() in ('1', 'true', 'yes')
+    return bool(enabled)
+
+
+#decorator collecting the stage metrics of a handler invocation
+
+def instrumented(handler=None, name=None, dimensions=None, reset_peak=True):
+    """
+    Decorates a Lambda handler (event, context, ...) to collect its stage metrics when
+    metrics_enabled(event). The EMF lines are logged when the handler returns or raises,
+    and a dict result gets the summary under 'metrics'.
+
+    Parameters:
+    - name (str): Handler name of the metrics, defaults to the function name.
+    - dimensions (callable): Optional function of the event returning extra EMF dimensions.
+    - reset_peak (bool): Reset the peak RSS of the process, see StageMetrics.
+    """
+    if handler is None:
+        return lambda function: instrumented(function, name, dimensions, reset_peak)
+
+    @functools.wraps(handler)
+    def wrapper(event, context, *args, **kwargs):
+        if not metrics_enabled(event):
+            return handler(event, context, *args, **kwargs)
+        metrics = StageMetrics(name or handler.__name__, dimensions(event) if dimensions else None, reset_peak=reset_peak)
+        token = _CURRENT_METRICS.set(metrics)
+        try:
+            result = handler(event, context, *args, **kwargs)
+        finally:
+            _CURRENT_METRICS.reset(token)
+            metrics.finish()
+            metrics.emit()
+        if isinstance(result, dict):
+            result['metrics'] = metrics.summary()
+        return result
+    return wrapper
@@ -0,0 +1,207 @@
+#import library
+import argparse
+import copy
+import json
+import time
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+from metrics_functions import instrumented
+from metrics_functions import peak_memory_mb
+from metrics_functions import reset_peak_memory
+
+# Load order of the main_processing_* tables: a table is loaded once every table it depends on
+# loaded successfully. Dimensions have no dependencies and load first, in parallel; facts load
+# in parallel as soon as their dimensions are in.
+TABLE_DEPENDENCIES = {
+    'customers': [],
+    'departments': [],
+    'employees': [],
+    'products': [],
+    'suppliers': [],
+    'orders': ['customers', 'employees', 'products'],
+    'purchase_order': ['suppliers', 'products'],
+    'inventory': ['products'],
+}
+
+
+#function to build the process_staged_table event of one table from the orchestrator event
+
+def table_event(event, table_name):
+    """
+    Returns the event of a single table load.
+
+    The orchestrator event holds the keys shared by every load (s3_bucket, date_suffix,
+    engine, copy_options, db_params without table_name, ...), a 'prefix_template' such as
+    'staging/Business/{table}/' and optional per-table overrides in event['tables'][table_name].
+    """
+    shared = {key: value for key, value in event.items() if key not in ('tables', 'prefix_template')}
+    load_event = copy.deepcopy(shared)
+    load_event['db_params'] = dict(event.get('db_params', {}), table_name=table_name)
+    if event.get('prefix_template'):
+        load_event['prefix'] = event['prefix_template'].format(table=table_name)
+    overrides = (event.get('tables') or {}).get(table_name) or {}
+    for key, value in overrides.items():
+        if key == 'db_params':
+            load_event['db_params'].update(value)
+        else:
+            load_event[key] = value
+    return load_event
+
+
+#function run by the pool workers (module level so it can be pickled for process pools)
+
+def run_table_load(table_name, load_event, reset_peak=True):
+    from processing_functions import process_staged_table
+    # The stage metrics of a load are those of the table's main_processing_* handler, in thread and process pools
+    handler = instrumented(lambda event, context: process_staged_table(event, table_name, reset_peak),
+                           name=f"main_processing_{table_name}", reset_peak=reset_peak)
+    return handler(load_event, None)
+
+
+#function to run the table loads of a day in dependency order on a thread or process pool
+
+def run_table_loads(event, tables=None, max_workers=4, executor='thread', timeout_seconds=None, max_retries=1, retry_delay_seconds=5):
+    """
+    Runs process_staged_table for every table, following TABLE_DEPENDENCIES.
+
+    Parameters:
+    - event (dict): Orchestrator event, see table_event.
+    - tables (list): Tables to load, all of TABLE_DEPENDENCIES by default. Dependencies
+      outside this list are treated as already loaded.
+    - max_workers (int): Loads running at the same time.
+    - executor (str): 'thread' (default) or 'process', to use every CPU for the clean stage
+      (process pools need /dev/shm, so they run locally or in a container but not on Lambda).
+    - timeout_seconds (float): Time allowed for one attempt of a table. A timed out attempt
+      counts as failed, but its worker cannot be interrupted and may still commit the load.
+      It is only retried when the table's load_mode is 'upsert' (a retry replaces the rows by
+      key); otherwise the table fails and its dependents are skipped.
+    - max_retries (int): Extra attempts of a failed table.
+    - retry_delay_seconds (float): Wait before the first retry, doubled for every next one.
+
+    Returns:
+    - dict: Number of succeeded, failed and skipped tables, elapsed seconds, the peak memory of
+      the orchestrator process and the status, attempts, seconds and load stats (or error) of
+      every table. Loads on a thread pool share the process and its peak memory, which is reset
+      once here, so their own 'memory' reports peak_reset False.
+    """
+    tables = list(tables or TABLE_DEPENDENCIES)
+    dependencies = {table: [dep for dep in TABLE_DEPENDENCIES.get(table, []) if dep in tables] for table in tables}
+    results = {table: {'status': 'pending', 'attempts': 0} for table in tables}
+    not_before = {table: 0.0 for table in tables}
+    running = {}
+    abandoned = []
+    start_time = time.perf_counter()
+    pool_class = ProcessPoolExecutor if executor == 'process' else ThreadPoolExecutor
+    # Resetting the peak of the process from one load would reset it under the loads running next to it
+    peak_reset = reset_peak_memory()
+    reset_per_load = executor == 'process'
+
+    pool = pool_class(max_workers=max(1, max_workers))
+    try:
+        while True:
+            now = time.perf_counter()
+
+            # Skip the tables whose dependencies failed
+            for table in tables:
+                if results[table]['status'] == 'pending' and any(results[dep]['status'] in ('failed', 'skipped') for dep in dependencies[table]):
+                    results[table].update(status='skipped', error=f"dependency failed: {', '.join(dependencies[table])}")
+                    print(f"Skipping {table}, a dependency failed to load.")
+
+            # Submit the tables whose dependencies are loaded, up to max_workers at a time
+            for table in tables:
+                if len(running) >= max_workers:
+                    break
+                ready = all(results[dep]['status'] == 'succeeded' for dep in dependencies[table])
+                if results[table]['status'] == 'pending' and ready and now >= not_before[table]:
+                    results[table]['status'] = 'running'
+                    results[table]['attempts'] += 1
+                    future = pool.submit(run_table_load, table, table_event(event, table), reset_per_load)
+                    running[future] = (table, time.perf_counter())
+                    print(f"Loading {table} (attempt {results[table]['attempts']})")
+
+            if not running and all(result['status'] not in ('pending', 'running') for result in results.values()):
+                break
+
+            # Wake up on the first finished load, the next deadline or the next retry
+            wake_times = [started + timeout_seconds for _, started in running.values()] if timeout_seconds else []
+            wake_times += [not_before[table] for table in tables if results[table]['status'] == 'pending' and not_before[table] > now]
+            wait_seconds = max(0.0, min(wake_times) - now) if wake_times else None
+            if not running:
+                # Only retries are waiting
+                time.sleep(wait_seconds or 0)
+                continue
+            done, _ = wait(list(running), timeout=wait_seconds, return_when=FIRST_COMPLETED)
+
+            now = time.perf_counter()
+            for future, (table, started) in list(running.items()):
+                timed_out = timeout_seconds is not None and now - started >= timeout_seconds
+                if future not in done and not timed_out:
+                    continue
+                del running[future]
+                results[table]['seconds'] = round(now - started, 3)
+                retryable = True
+                try:
+                    if future not in done:
+                        error = f"load did not finish within {timeout_seconds}s"
+                        if not future.cancel():
+                            abandoned.append(future)
+                            # A second attempt next to a running one would load the rows twice, unless it replaces them by key
+                            if table_event(event, table).get('load_mode') != 'upsert':
+                                retryable = False
+                                error += ", the attempt may still commit so it is not retried"
+                        raise TimeoutError(error)
+                    results[table].update(status='succeeded', result=future.result())
+                    results[table].pop('error', None)
+                except Exception as ex:
+                    print(f"Error loading {table} (attempt {results[table]['attempts']}): {ex}")
+                    results[table]['error'] = str(ex)
+                    if retryable and results[table]['attempts'] <= max_retries:
+                        results[table]['status'] = 'pending'
+                        not_before[table] = now + retry_delay_seconds * 2 ** (results[table]['attempts'] - 1)
+                    else:
+                        results[table]['status'] = 'failed'
+    finally:
+        # Do not wait for timed out workers
+        pool.shutdown(wait=not (running or abandoned))
+
+    elapsed = time.perf_counter() - start_time
+    summary = {status: sum(1 for result in results.values() if result['status'] == status) for status in ('succeeded', 'failed', 'skipped')}
+    print(f"{summary['succeeded']} of {len(tables)} tables loaded in {elapsed:.2f}s "
+          f"({summary['failed']} failed, {summary['skipped']} skipped).")
+    return dict(summary, seconds=round(elapsed, 3), memory={'peak_rss_mb': peak_memory_mb(), 'peak_reset': peak_reset}, tables=results)
+
+
+#LOAD EVERY STAGED TABLE OF A DAY FROM ONE PROCESS
+@instrumented
+def orchestrate_loads(event, context):
+    return run_table_loads(
+        event,
+        tables=event.get('load_tables'),
+        max_workers=int(event.get('max_workers', 4)),
+        executor=event.get('executor', 'thread'),
+        timeout_seconds=event.get('timeout_seconds'),
+        max_retries=int(event.get('max_retries', 1)),
+        retry_delay_seconds=float(event.get('retry_delay_seconds', 5)),
+    )
+
+
+#run the loads of a day locally or in a container: python orchestrator_functions.py event.json
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load every staged table of a day in dependency order.')
+    parser.add_argument('event_file', help='JSON file with the orchestrator event')
+    parser.add_argument('--tables', nargs='+', help='tables to load (default: all)')
+    parser.add_argument('--max-workers', type=int, help='loads running at the same time')
+    parser.add_argument('--executor', choices=['thread', 'process'], help='pool used to run the loads')
+    parser.add_argument('--timeout-seconds', type=float, help='time allowed for one attempt of a table')
+    parser.add_argument('--max-retries', type=int, help='extra attempts of a failed table')
+    args = parser.parse_args()
+
+    with open(args.event_file) as event_file:
+        event = json.load(event_file)
+    for key, value in (('load_tables', args.tables), ('max_workers', args.max_workers), ('executor', args.executor),
+                       ('timeout_seconds', args.timeout_seconds), ('max_retries', args.max_retries)):
+        if value is not None:
+            event[key] = value
+    print(json.dumps(orchestrate_loads(event, None), indent=2, default=str))
@@ -0,0 +1,95 @@
+#import library
+import pyarrow.parquet as pq
+from metrics_functions import stage
+from table_specs import TABLE_SPECS
+
+# Named Parquet writer profiles. A profile sets:
+# - row_group_size: rows per row group (None: pyarrow default, one group of up to 1Mi rows)
+# - compression: 'snappy', 'zstd', 'gzip' or 'none', with an optional compression_level
+# - use_dictionary: True, False or the list of columns to dictionary encode
+# - sort_by: columns the rows are sorted on before writing (recorded as sorting_columns)
+# - write_statistics: True, False or the list of columns to keep min/max statistics for
+WRITER_PROFILES = {
+    # pyarrow defaults, what every writer used before profiles existed
+    'default': {'row_group_size': None, 'compression': 'snappy', 'compression_level': None,
+                'use_dictionary': True, 'sort_by': None, 'write_statistics': True},
+    # Files scanned with pushdown (processing filters, Redshift Spectrum): row groups small enough
+    # to be skipped by their min/max statistics, sorted on the table's sort keys
+    'scan': {'row_group_size': 128 * 1024, 'compression': 'zstd', 'compression_level': 3},
+    # Smallest files for archival and transfer
+    'compact': {'row_group_size': 1024 * 1024, 'compression': 'zstd', 'compression_level': 9},
+    # Fastest encode and decode, largest files
+    'fast': {'compression': 'none', 'compression_level': None, 'use_dictionary': False},
+}
+
+
+#function to merge a profile name or a dict of writer options into the options
+
+def _apply_profile(options, profile):
+    if not profile:
+        return options
+    if isinstance(profile, str):
+        profile = {'profile': profile}
+    if 'profile' in profile:
+        options.update(WRITER_PROFILES[profile['profile']])
+    options.update({key: value for key, value in profile.items() if key != 'profile'})
+    return options
+
+
+#function to resolve the Parquet writer options of a table
+
+def resolve_writer_profile(event, table_name=None):
+    """
+    Returns the writer options for a table: the 'default' profile, then the table's
+    TABLE_SPECS 'writer_profile', then the event's 'writer_profile'.
+
+    Each layer is a profile name or a dict of options with an optional 'profile' name,
+    e.g. {'profile': 'scan', 'sort_by': ['order_date']}.
+    """
+    options = dict(WRITER_PROFILES['default'])
+    _apply_profile(options, TABLE_SPECS.get(table_name, {}).get('writer_profile'))
+    _apply_profile(options, event.get('writer_profile'))
+    return options
+
+
+#function to build the pq.ParquetWriter / pq.write_table keyword arguments for a schema
+
+def parquet_writer_kwargs(options, schema):
+    names = set(schema.names)
+
+    def existing(columns):
+        return [column for column in columns if column in names] if isinstance(columns, (list, tuple)) else columns
+
+    kwargs = {
+        'compression': options.get('compression') or 'none',
+        'use_dictionary': existing(options.get('use_dictionary', True)),
+        'write_statistics': existing(options.get('write_statistics', True)),
+    }
+    # Only some codecs take a level, a leftover level from another profile is ignored
+    if options.get('compression_level') is not None and kwargs['compression'].lower() in ('zstd', 'gzip', 'brotli'):
+        kwargs['compression_level'] = options['compression_level']
+    sort_by = existing(options.get('sort_by') or [])
+    if sort_by:
+        kwargs['sorting_columns'] = pq.SortingColumn.from_ordering(schema, [(column, 'ascending') for column in sort_by])
+    return kwargs
+
+
+#function to sort a table or batch on the sort keys of the writer options
+
+def sort_for_writing(table, options):
+    sort_by = [column for column in options.get('sort_by') or [] if column in table.schema.names]
+    return table.sort_by([(column, 'ascending') for column in sort_by]) if sort_by else table
+
+
+#function to write a table to Parquet with the writer options
+
+def write_parquet(table, sink, options=None):
+    """
+    Writes table to sink (path or file object) with resolved writer options (see
+    resolve_writer_profile), sorting it first when the options have sort keys.
+    """
+    options = options or WRITER_PROFILES['default']
+    with stage('encode') as record:
+        record.rows = table.num_rows
+        table = sort_for_writing(table, options)
+        pq.write_table(table, sink, row_group_size=options.get('row_group_size'), **parquet_writer_kwargs(options, table.schema))
@@ -0,0 +1,512 @@
+#import library
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from datetime import timedelta
+import pyarrow as pa
+import pyarrow.parquet as pq
+from table_specs import TABLE_SPECS
+from table_specs import clean_dataframe
+from table_specs import clean_table
+from metrics_functions import reset_peak_memory
+from metrics_functions import peak_memory_mb
+from metrics_functions import instrumented
+from metrics_functions import stage
+from metrics_functions import with_current_metrics
+from load_functions import bulk_load
+from s3_functions import S3RangeFile
+from s3_functions import resolve_date_keys
+from s3_functions import resolve_date_range_keys
+from s3_functions import read_json_object
+from s3_functions import write_json_object
+from s3_functions import hive_table_prefix
+from lake_functions import S3FileSystemHandler
+from lake_functions import partitioned_dataset
+from lake_functions import resolve_partition_keys
+from connection_functions import get_s3_client
+from connection_functions import db_transaction
+from connection_functions import connection_stats
+
+
+#function to convert JSON row filters ([column, op, value] lists) to values typed like the file columns
+
+def typed_filters(filters, schema):
+    """
+    Returns filters in pyarrow.parquet DNF form, with every value cast to the type of its column
+    so e.g. ['order_date', '>=', '2024-10-01'] compares a date32 column with a date.
+
+    filters is a list of [column, op, value] (AND) or a list of such lists (OR of ANDs).
+    """
+    if not filters:
+        return None
+    groups = filters if isinstance(filters[0][0], (list, tuple)) else [filters]
+
+    def cast(column, value):
+        if isinstance(value, (list, tuple, set)):
+            return [cast(column, item) for item in value]
+        return pa.scalar(value).cast(schema.field(column).type)
+
+    return [[(column, op, cast(column, value)) for column, op, value in group] for group in groups]
+
+
+#function to read the read options of a processing event
+
+def read_options(event):
+    return {
+        'engine': event.get('engine'),
+        'filters': event.get('filters'),
+        # Files up to this size are fetched with one GET, larger ones with byte-range GETs. The chunked
+        # mode only ever holds the row groups it is processing, so it never downloads whole files
+        'prefetch_size': 0 if event.get('processing_mode') == 'chunked' else int(float(event.get('range_read_threshold_mb', 8)) * 1024 * 1024),
+    }
+
+
+#function to read staged Parquet files and clean them with the selected engine
+
+def read_and_clean(s3, s3_bucket, keys, table_name, engine=None, filters=None, prefetch_size=8 * 1024 * 1024,
+                   table_prefix=None, handler=None):
+    """
+    Reads the staged Parquet files and cleans them according to TABLE_SPECS[table_name].
+
+    Only the columns of the table spec are read, and filters (see typed_filters) are pushed
+    down to pyarrow.parquet, which skips row groups using their statistics. Files are opened
+    through S3RangeFile, so only the footer and the selected column chunks are downloaded.
+
+    With table_prefix (hive layout, see lake_functions) the keys are read as one pyarrow
+    dataset through handler (S3FileSystemHandler): partition columns such as payment_methods
+    come from the paths, and files whose partition values do not match filters are not opened.
+
+    Returns:
+    - tuple: The cleaned data, a pa.Table when engine is 'arrow' (pyarrow.compute clean, no
+      pandas round trip) otherwise a pd.DataFrame, and the bytes fetched, bytes stored,
+      GET requests and seconds spent reading.
+    """
+    spec_columns = TABLE_SPECS[table_name]['columns']
+    read_stats = {'bytes_fetched': 0, 'bytes_total': 0, 'requests': 0}
+    start_time = time.perf_counter()
+    parts = []
+    if engine != 'arrow':
+        # pandas is not imported by the arrow engine
+        import pandas as pd
+
+    if table_prefix is not None:
+        handler = handler or S3FileSystemHandler(s3, s3_bucket, prefetch_size)
+        fetched_before, requests_before = handler.bytes_fetched, handler.requests
+        dataset = partitioned_dataset(handler, table_prefix, keys)
+        columns = [column for column in spec_columns if column in dataset.schema.names]
+        filters = typed_filters(filters, dataset.schema)
+        with stage('decode') as record:
+            table = dataset.to_table(columns=columns, filter=pq.filters_to_expression(filters) if filters else None)
+            parts.append(table if engine == 'arrow' else table.to_pandas())
+            record.rows = table.num_rows
+        read_stats['bytes_fetched'] = handler.bytes_fetched - fetched_before
+        read_stats['bytes_total'] = sum(info.size for info in handler.get_file_info(keys))
+        read_stats['requests'] = handler.requests - requests_before
+        keys = []
+
+    for key in keys:
+        source = S3RangeFile(s3, s3_bucket, key, prefetch_size=prefetch_size)
+        with stage('decode') as record:
+            schema = pq.read_schema(source)
+            # Optional columns missing from the file are added as NULL by the clean step
+            columns = [column for column in spec_columns if column in schema.names]
+            if engine == 'arrow':
+                parts.append(pq.read_table(source, columns=columns, filters=typed_filters(filters, schema)))
+            else:
+                parts.append(pd.read_parquet(source, columns=columns, filters=typed_filters(filters, schema)))
+            record.rows = len(parts[-1])
+        read_stats['bytes_fetched'] += source.bytes_fetched
+        read_stats['bytes_total'] += source.size
+        read_stats['requests'] += source.requests
+    read_stats['seconds'] = round(time.perf_counter() - start_time, 3)
+    
+    with stage('transform') as record:
+        if engine == 'arrow':
+            # Arrow-native path: clean the pa.Table with pyarrow.compute, no pandas round trip
+            cleaned = clean_table(pa.concat_tables(parts), table_name)
+        else:
+            # Combine the DataFrames read from the Parquet files, then apply the cleaning rules declared for the table
+            cleaned = clean_dataframe(pd.concat(parts, ignore_index=True), table_name)
+        record.rows = len(cleaned)
+    return cleaned, read_stats
+
+
+#function to read staged Parquet files batch by batch and clean every batch
+
+def iter_cleaned_batches(s3, s3_bucket, keys, table_name, engine=None, filters=None, batch_size=65536,
+                         read_stats=None, table_prefix=None, handler=None):
+    """
+    Generator counterpart of read_and_clean for the chunked processing mode.
+
+    Files are read one row group at a time (ParquetFile.iter_batches over ranged GETs, or a
+    pyarrow dataset scan with one file and one batch of read-ahead in the hive layout) and
+    every batch of at most batch_size rows is cleaned on its own, so memory is bounded by the
+    batch and row group size instead of the file size. Outside the hive layout filters are
+    applied to each batch after it is read.
+
+    Yields:
+    - The cleaned batches, pa.Table when engine is 'arrow' otherwise pd.DataFrame. The bytes
+      fetched, bytes stored and GET requests are added to read_stats.
+    """
+    spec_columns = TABLE_SPECS[table_name]['columns']
+    read_stats = read_stats if read_stats is not None else {'bytes_fetched': 0, 'bytes_total': 0, 'requests': 0}
+
+    def clean(table):
+        with stage('transform') as record:
+            record.rows = table.num_rows
+            if engine == 'arrow':
+                return clean_table(table, table_name)
+            return clean_dataframe(table.to_pandas(), table_name)
+
+    if table_prefix is not None:
+        handler = handler or S3FileSystemHandler(s3, s3_bucket)
+        fetched_before, requests_before = handler.bytes_fetched, handler.requests
+        dataset = partitioned_dataset(handler, table_prefix, keys)
+        columns = [column for column in spec_columns if column in dataset.schema.names]
+        filters = typed_filters(filters, dataset.schema)
+        for batch in _decoded_batches(dataset.to_batches(columns=columns, filter=pq.filters_to_expression(filters) if filters else None,
+                                                         batch_size=batch_size, batch_readahead=1, fragment_readahead=1)):
+            if batch.num_rows:
+                yield clean(pa.Table.from_batches([batch]))
+        read_stats['bytes_fetched'] += handler.bytes_fetched - fetched_before
+        read_stats['bytes_total'] += sum(info.size for info in handler.get_file_info(keys))
+        read_stats['requests'] += handler.requests - requests_before
+        return
+
+    for key in keys:
+        # No prefetch: the file is fetched column chunk by column chunk, never whole
+        source = S3RangeFile(s3, s3_bucket, key)
+        parquet_file = pq.ParquetFile(source)
+        schema = parquet_file.schema_arrow
+        columns = [column for column in spec_columns if column in schema.names]
+        file_filters = typed_filters(filters, schema)
+        expression = pq.filters_to_expression(file_filters) if file_filters else None
+        for batch in _decoded_batches(parquet_file.iter_batches(batch_size=batch_size, columns=columns)):
+            table = pa.Table.from_batches([batch])
+            if expression is not None:
+                table = table.filter(expression)
+            if table.num_rows:
+                yield clean(table)
+        read_stats['bytes_fetched'] += source.bytes_fetched
+        read_stats['bytes_total'] += source.size
+        read_stats['requests'] += source.requests
+
+
+#function to time the reading of each batch as the decode stage, not the work done between two batches
+
+def _decoded_batches(batches):
+    batches = iter(batches)
+    while True:
+        with stage('decode') as record:
+            batch = next(batches, None)
+            record.rows = batch.num_rows if batch is not None else 0
+        if batch is None:
+            return
+        yield batch
+
+
+#function to load the cleaned batches of staged files into the target table over one connection
+
+def load_in_batches(cnxn, event, table_name, s3, keys, table_prefix=None, handler=None):
+    """
+    Chunked processing mode ('processing_mode': 'chunked'): every batch of 'batch_size' rows
+    (default 65536) read by iter_cleaned_batches is bulk loaded before the next one is read.
+    The caller owns the transaction, so the table is still loaded all or nothing. In upsert
+    mode a key repeated in a later batch replaces the row of the earlier one.
+
+    Returns:
+    - dict: The bulk_load stats summed over the batches, the number of batches and the read stats.
+    """
+    s3_bucket = event.get('s3_bucket')
+    db_params = event.get('db_params')
+    options = read_options(event)
+    read_stats = {'bytes_fetched': 0, 'bytes_total': 0, 'requests': 0}
+    start_time = time.perf_counter()
+    totals = {'rows_loaded': 0, 'batches': 0}
+    load_method = None
+
+    batches = iter_cleaned_batches(s3, s3_bucket, keys, table_name, options['engine'], options['filters'],
+                                   int(event.get('batch_size', 65536)), read_stats, table_prefix, handler)
+    for data in batches:
+        batch_stats = bulk_load(cnxn, data, db_params, TABLE_SPECS[table_name]['columns'],
+                                s3_client=s3, s3_bucket=s3_bucket, copy_options=event.get('copy_options'),
+                                key_columns=load_key_columns(event, table_name))
+        del data
+        load_method = batch_stats['method']
+        totals['batches'] += 1
+        for name in ('rows_loaded', 'rows_replaced', 'duplicates_dropped'):
+            if name in batch_stats:
+                totals[name] = totals.get(name, 0) + batch_stats[name]
+
+    elapsed = time.perf_counter() - start_time
+    read_stats['seconds'] = round(elapsed, 3)
+    load_stats = {
+        'table': f"{db_params['schema']}.{db_params['table_name']}",
+        'method': f"chunked/{load_method}" if load_method else 'chunked',
+        'seconds': round(elapsed, 3),
+        'rows_per_second': round(totals['rows_loaded'] / elapsed, 1) if elapsed > 0 else None,
+        'read': read_stats,
+    }
+    load_stats.update(totals)
+    print(f"Loaded {totals['rows_loaded']} rows into {load_stats['table']} in {totals['batches']} batches in {elapsed:.2f}s")
+    return load_stats
+
+
+#function to report the peak memory of the run
+
+def memory_stats(peak_reset):
+    # peak_reset is False when the peak could not be reset, it then includes earlier invocations
+    return {'peak_rss_mb': peak_memory_mb(), 'peak_reset': peak_reset}
+
+
+#function to merge cleaned DataFrames or Arrow tables into one bulk load
+
+def merge_cleaned(parts):
+    if isinstance(parts[0], pa.Table):
+        # A column that is all NULL in one file is typed null there, permissive promotion unifies it
+        return pa.concat_tables(parts, promote_options='permissive')
+    import pandas as pd
+    return pd.concat(parts, ignore_index=True)
+
+
+#function to select the natural key of the table when the upsert load mode is requested
+
+def load_key_columns(event, table_name):
+    return TABLE_SPECS[table_name]['key_columns'] if event.get('load_mode') == 'upsert' else None
+
+
+#LOAD A STAGED TABLE INTO REDSHIFT
+def process_staged_table(event, table_name, reset_peak=True):
+    """
+    Shared body of the main_processing_* handlers.
+
+    Resolves the staged Parquet file(s) of the day (from the dt= partition of the table with
+    'layout': 'hive', see lake_functions), cleans them according to
+    TABLE_SPECS[table_name] (with pandas, or pyarrow.compute when event['engine'] is 'arrow')
+    and bulk loads the result into the table named in db_params. 'load_mode': 'upsert' replaces
+    the rows with the same key_columns instead of appending them, and 'filters' (e.g.
+    [['order_date', '>=', '2024-10-01']]) keeps only the matching rows. With 'start_date' and
+    'end_date' in the event, every day of the range is loaded instead (see backfill_staged_table).
+    'processing_mode': 'chunked' reads, cleans and loads the files in batches of 'batch_size' rows
+    (see load_in_batches), for files larger than the Lambda memory. The peak resident memory of
+    the run is reported under 'memory'; with reset_peak False (loads sharing the process, see
+    orchestrator_functions) the peak is not reset and 'peak_reset' is False.
+    """
+    peak_reset = reset_peak_memory() if reset_peak else False
+    if event.get('start_date') and event.get('end_date'):
+        return backfill_staged_table(event, table_name, peak_reset)
+
+    s3_bucket = event.get('s3_bucket')
+    prefix = event.get('prefix')
+    date_suffix = event.get('date_suffix')
+    db_params = event.get('db_params')
+    # Extract data from S3 bucket
+    s3 = get_s3_client()
+
+    table_prefix = handler = None
+    if event.get('layout') == 'hive':
+        # Hive layout: list only the dt= partition of the day under {prefix}/table={table_name}/
+        table_prefix = hive_table_prefix(prefix, table_name)
+        handler = S3FileSystemHandler(s3, s3_bucket, read_options(event)['prefetch_size'])
+        selected_file_keys = resolve_partition_keys(s3, s3_bucket, table_prefix, date_suffix, date_suffix, handler).get(date_suffix, [])
+    else:
+        # Resolve the file(s) of the day (paginated listing, dt= partition or cached manifest)
+        selected_file_keys = resolve_date_keys(s3, s3_bucket, prefix, date_suffix,
+                                               partitioned=event.get('partitioned', False),
+                                               use_manifest=event.get('use_manifest', False), table_name=table_name)
+    
+    if not selected_file_keys:
+        raise FileNotFoundError(f"No file with date suffix {date_suffix} found in folder '{prefix}' of bucket {s3_bucket}.")
+    
+    if event.get('processing_mode') == 'chunked':
+        # Bounded memory: read, clean and load batch by batch in one transaction
+        with db_transaction(db_params, keep_alive=event.get('keep_connection', True)) as redshift_conn:
+            load_stats = load_in_batches(redshift_conn, event, table_name, s3, selected_file_keys, table_prefix, handler)
+    else:
+        df, read_stats = read_and_clean(s3, s3_bucket, selected_file_keys, table_name, **read_options(event),
+                                        table_prefix=table_prefix, handler=handler)
+
+        # Connect to Redshift (cached across warm invocations), commit on success and roll back on error
+        with db_transaction(db_params, keep_alive=event.get('keep_connection', True)) as redshift_conn:
+            # Bulk load the DataFrame into Redshift (COPY from S3, or batched multi-row INSERTs)
+            load_stats = bulk_load(redshift_conn, df, db_params, TABLE_SPECS[table_name]['columns'],
+                                   s3_client=s3, s3_bucket=s3_bucket, copy_options=event.get('copy_options'),
+                                   key_columns=load_key_columns(event, table_name))
+        load_stats['read'] = read_stats
+
+    print(f"Data loaded into {db_params['table_name']} in {db_params['schema']} successfully.")
+    load_stats['connections'] = connection_stats()
+    load_stats['memory'] = memory_stats(peak_reset)
+    return load_stats
+
+
+#BACKFILL A STAGED TABLE OVER A DATE RANGE
+def backfill_staged_table(event, table_name, peak_reset=False):
+    """
+    Loads every staged file between event['start_date'] and event['end_date'] (inclusive).
+
+    The prefix is listed once for the whole range. Days are processed in batches of
+    'dates_per_load' (default 7): the files of a batch are read and cleaned concurrently
+    ('max_concurrency' threads, default 4) and merged into one bulk load, committed on its own.
+    After each commit the last loaded date is written to a progress object in S3
+    ('s3_state_prefix', default 'state/backfill'), so a re-run of the same range resumes
+    after that date. Set 'resume' to False to start over. With 'layout': 'hive' only the dt=
+    partitions of the range are listed, and the days of a batch are read as one pyarrow dataset.
+    With 'processing_mode': 'chunked' the days of a batch are loaded in batches of rows (see
+    load_in_batches) instead of being merged in memory.
+
+    Returns:
+    - dict: Dates found, loaded, resumed (already loaded) and missing, rows loaded by all
+      runs of the range, elapsed seconds, peak memory and the stats of every bulk load of this run.
+    """
+    s3_bucket = event.get('s3_bucket')
+    prefix = event.get('prefix')
+    db_params = event.get('db_params')
+    start_date = event['start_date']
+    end_date = event['end_date']
+    dates_per_load = max(1, int(event.get('dates_per_load', 7)))
+    max_concurrency = max(1, int(event.get('max_concurrency', 4)))
+    s3 = get_s3_client(max_pool_connections=max(10, max_concurrency * 2))
+    start_time = time.perf_counter()
+
+    # Progress of this table and date range
+    state_key = (f"{event.get('s3_state_prefix', 'state/backfill')}/"
+                 f"{db_params['schema']}.{db_params['table_name']}_{start_date}_{end_date}.json")
+    state = read_json_object(s3, s3_bucket, state_key) if event.get('resume', True) else None
+    last_completed_date = (state or {}).get('last_completed_date')
+    rows_loaded = (state or {}).get('rows_loaded', 0)
+
+    # Resolve the files of every day of the range with a single listing
+    table_prefix = handler = None
+    if event.get('layout') == 'hive':
+        table_prefix = hive_table_prefix(prefix, table_name)
+        handler = S3FileSystemHandler(s3, s3_bucket, read_options(event)['prefetch_size'])
+        keys_by_date = resolve_partition_keys(s3, s3_bucket, table_prefix, start_date, end_date, handler)
+    else:
+        keys_by_date = resolve_date_range_keys(s3, s3_bucket, prefix, start_date, end_date,
+                                               partitioned=event.get('partitioned', False), table_name=table_name)
+    all_dates = [str(day.date()) for day in _date_range(start_date, end_date)]
+    missing_dates = [day for day in all_dates if day not in keys_by_date]
+    pending_dates = [day for day in keys_by_date if last_completed_date is None or day > last_completed_date]
+    resumed_dates = len(keys_by_date) - len(pending_dates)
+    if missing_dates:
+        print(f"No staged file for {len(missing_dates)} of {len(all_dates)} dates of {table_name}: {', '.join(missing_dates[:10])}"
+              + (' ...' if len(missing_dates) > 10 else ''))
+    if resumed_dates:
+        print(f"Resuming backfill of {table_name} after {last_completed_date} ({resumed_dates} dates already loaded)")
+
+    loads = []
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        for batch_start in range(0, len(pending_dates), dates_per_load):
+            batch_dates = pending_dates[batch_start:batch_start + dates_per_load]
+            if event.get('processing_mode') == 'chunked':
+                # Load the files of the batch in batches of rows instead of merging them in memory
+                batch_keys = [key for day in batch_dates for key in keys_by_date[day]]
+                with db_transaction(db_params, keep_alive=event.get('keep_connection', True)) as redshift_conn:
+                    load_stats = load_in_batches(redshift_conn, event, table_name, s3, batch_keys, table_prefix, handler)
+            else:
+                if table_prefix is not None:
+                    # Read the days of the batch as one dataset, pyarrow scans the files concurrently
+                    batch_keys = [key for day in batch_dates for key in keys_by_date[day]]
+                    parts = [read_and_clean(s3, s3_bucket, batch_keys, table_name, **read_options(event),
+                                            table_prefix=table_prefix, handler=handler)]
+                else:
+                    # Read and clean the days of the batch concurrently, then merge them into one load
+                    parts = list(executor.map(with_current_metrics(
+                        lambda day: read_and_clean(s3, s3_bucket, keys_by_date[day], table_name, **read_options(event))), batch_dates
+                    ))
+                data = merge_cleaned([part for part, _ in parts])
+                read_stats = {name: sum(stats[name] for _, stats in parts) for name in ('bytes_fetched', 'bytes_total', 'requests')}
+                del parts
+
+                with db_transaction(db_params, keep_alive=event.get('keep_connection', True)) as redshift_conn:
+                    load_stats = bulk_load(redshift_conn, data, db_params, TABLE_SPECS[table_name]['columns'],
+                                           s3_client=s3, s3_bucket=s3_bucket, copy_options=event.get('copy_options'),
+                                           key_columns=load_key_columns(event, table_name))
+                del data
+                load_stats['read'] = read_stats
+            load_stats['dates'] = [batch_dates[0], batch_dates[-1]]
+            loads.append(load_stats)
+            rows_loaded += load_stats['rows_loaded']
+
+            # Record progress only after the batch is committed
+            write_json_object(s3, s3_bucket, state_key, {
+                'table': f"{db_params['schema']}.{db_params['table_name']}",
+                'start_date': start_date,
+                'end_date': end_date,
+                'last_completed_date': batch_dates[-1],
+                'rows_loaded': rows_loaded,
+            })
+            done_dates = resumed_dates + batch_start + len(batch_dates)
+            print(f"Backfill of {table_name}: {done_dates}/{len(keys_by_date)} dates loaded, up to {batch_dates[-1]} "
+                  f"({rows_loaded} rows, {time.perf_counter() - start_time:.1f}s)")
+
+    return {
+        'table': f"{db_params['schema']}.{db_params['table_name']}",
+        'dates_found': len(keys_by_date),
+        'dates_loaded': len(pending_dates),
+        'dates_resumed': resumed_dates,
+        'dates_missing': missing_dates,
+        'rows_loaded': rows_loaded,
+        'seconds': round(time.perf_counter() - start_time, 3),
+        'memory': memory_stats(peak_reset),
+        'loads': loads,
+    }
+
+
+#function to list the days between two YYYY-MM-DD dates (inclusive)
+
+def _date_range(start_date, end_date):
+    day = datetime.strptime(start_date, '%Y-%m-%d')
+    last_day = datetime.strptime(end_date, '%Y-%m-%d')
+    while day <= last_day:
+        yield day
+        day += timedelta(days=1)
+
+
+#PROCESS CUSTOMERS DATA
+@instrumented
+def main_processing_customers(event, context):
+    return process_staged_table(event, 'customers')
+
+
+#PROCESS DEPARTMENTS DATA
+@instrumented
+def main_processing_departments(event, context):
+    return process_staged_table(event, 'departments')
+
+
+#PROCESS EMPLOYEES DATA
+@instrumented
+def main_processing_employees(event, context):
+    return process_staged_table(event, 'employees')
+
+
+#PROCESS INVENTORY
+@instrumented
+def main_processing_inventory(event, context):
+    return process_staged_table(event, 'inventory')
+
+
+#PROCESS ORDERS DATA
+@instrumented
+def main_processing_orders(event, context):
+    return process_staged_table(event, 'orders')
+
+
+#PROCESS PRODUCTS DATA
+@instrumented
+def main_processing_products(event, context):
+    return process_staged_table(event, 'products')
+
+
+#PROCESS PURCHASE_ORDER DATA
+@instrumented
+def main_processing_purchase_order(event, context):
+    return process_staged_table(event, 'purchase_order')
+
+
+# PROCESS SUPPLIERS DATA
+@instrumented
+def main_processing_suppliers(event, context):
+    return process_staged_table(event, 'suppliers')
@@ -0,0 +1,526 @@
+#import library
+import io
+import json
+import posixpath
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError
+from metrics_functions import stage
+from metrics_functions import with_current_metrics
+
+
+#function to read a small JSON state object from S3, returns None when the object does not exist
+
+def read_json_object(s3_client, s3_bucket, key):
+    try:
+        s3_object = s3_client.get_object(Bucket=s3_bucket, Key=key)
+    except ClientError as ex:
+        if ex.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+            return None
+        raise
+    return json.loads(s3_object['Body'].read().decode('utf-8'))
+
+
+#function to write a small JSON state object to S3
+
+def write_json_object(s3_client, s3_bucket, key, content):
+    s3_client.put_object(
+        Body=json.dumps(content, default=str).encode('utf-8'),
+        Bucket=s3_bucket,
+        Key=key,
+        ContentType='application/json'
+    )
+
+
+#STREAMING MULTIPART UPLOAD
+
+# S3 rejects multipart parts smaller than 5 MiB (except the last one)
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+
+class S3MultipartWriter(io.RawIOBase):
+    """
+    Writable file object that streams its content to S3 through a multipart upload.
+
+    Written bytes are buffered until part_size is reached, then the part is uploaded on a
+    background thread while the caller keeps writing (e.g. pq.ParquetWriter encoding the next
+    row group). At most max_concurrency parts are in flight, so memory stays bounded by
+    (max_concurrency + 1) * part_size. Objects smaller than one part are sent with a single
+    put_object and nothing is uploaded when nothing was written.
+
+    Closing the writer completes the upload. Leaving a `with` block on an exception, or
+    calling abort(), aborts the multipart upload so no partial object or orphaned parts remain.
+    """
+
+    def __init__(self, s3_client, s3_bucket, key, part_size=8 * 1024 * 1024, max_concurrency=4):
+        super().__init__()
+        self.s3_client = s3_client
+        self.s3_bucket = s3_bucket
+        self.key = key
+        self.part_size = max(int(part_size), MIN_PART_SIZE)
+        self.upload_id = None
+        self.bytes_written = 0
+        self._buffer = bytearray()
+        self._futures = []
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency)
+
+    def writable(self):
+        return True
+
+    def tell(self):
+        return self.bytes_written
+
+    def write(self, data):
+        if self.closed:
+            raise ValueError("write to closed S3MultipartWriter")
+        self._buffer += data
+        self.bytes_written += len(data)
+        while len(self._buffer) >= self.part_size:
+            part = bytes(self._buffer[:self.part_size])
+            del self._buffer[:self.part_size]
+            self._submit_part(part)
+        return len(data)
+
+    def _submit_part(self, body):
+        # Surface failed parts early instead of encoding the rest of the file first
+        for future in self._futures:
+            if future.done() and future.exception() is not None:
+                raise future.exception()
+        if self.upload_id is None:
+            response = self.s3_client.create_multipart_upload(Bucket=self.s3_bucket, Key=self.key)
+            self.upload_id = response['UploadId']
+        part_number = len(self._futures) + 1
+        self._slots.acquire()
+        # Part uploads are recorded in the stage metrics of the writing handler
+        self._futures.append(self._executor.submit(with_current_metrics(self._upload_part), part_number, body))
+
+    def _upload_part(self, part_number, body):
+        try:
+            with stage('upload') as record:
+                response = self.s3_client.upload_part(
+                    Bucket=self.s3_bucket,
+                    Key=self.key,
+                    UploadId=self.upload_id,
+                    PartNumber=part_number,
+                    Body=body
+                )
+                record.bytes = len(body)
+            return {'PartNumber': part_number, 'ETag': response['ETag']}
+        finally:
+            self._slots.release()
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            if self.upload_id is None:
+                if self.bytes_written:
+                    with stage('upload') as record:
+                        self.s3_client.put_object(Body=bytes(self._buffer), Bucket=self.s3_bucket, Key=self.key)
+                        record.bytes = self.bytes_written
+            else:
+                if self._buffer:
+                    self._submit_part(bytes(self._buffer))
+                    self._buffer = bytearray()
+                with stage('upload_wait'):
+                    parts = [future.result() for future in self._futures]
+                with stage('upload'):
+                    self.s3_client.complete_multipart_upload(
+                        Bucket=self.s3_bucket,
+                        Key=self.key,
+                        UploadId=self.upload_id,
+                        MultipartUpload={'Parts': parts}
+                    )
+        except Exception:
+            self.abort()
+            raise
+        finally:
+            self._executor.shutdown(wait=True)
+            super().close()
+
+    def abort(self):
+        for future in self._futures:
+            future.cancel()
+        self._executor.shutdown(wait=True)
+        if self.upload_id is not None:
+            self.s3_client.abort_multipart_upload(Bucket=self.s3_bucket, Key=self.key, UploadId=self.upload_id)
+            self.upload_id = None
+        self._buffer = bytearray()
+        super().close()
+
+    def __del__(self):
+        # Never complete a half-written upload from the garbage collector
+        if not self.closed:
+            try:
+                self.abort()
+            except Exception:
+                pass
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
+        return False
+
+
+#RANGED READS
+
+class S3RangeFile(io.RawIOBase):
+    """
+    Read-only, seekable file object over an S3 object that downloads only the bytes it is asked for.
+
+    Every read is a byte-range GET, so pyarrow.parquet opening the file fetches the footer,
+    then only the column chunks and row groups selected by `columns` and `filters`. Objects
+    up to prefetch_size are downloaded with one GET instead, where a single request is
+    cheaper than several ranged ones. The last range is kept, so reading the footer again
+    (schema first, then data) costs no extra request. bytes_fetched and requests count what
+    was downloaded. Closing the file releases the downloaded bytes and calls on_close(file).
+    """
+
+    def __init__(self, s3_client, s3_bucket, key, size=None, prefetch_size=0, on_close=None):
+        super().__init__()
+        self.s3_client = s3_client
+        self.s3_bucket = s3_bucket
+        self.key = key
+        self.size = size if size is not None else s3_client.head_object(Bucket=s3_bucket, Key=key)['ContentLength']
+        self.position = 0
+        self.bytes_fetched = 0
+        self.requests = 0
+        self._data = None
+        self._last_range = (0, b'')
+        self._on_close = on_close
+        # pyarrow may read from its own I/O threads, the GETs count for the handler that opened the file
+        self._get = with_current_metrics(self._get)
+        if self.size <= prefetch_size:
+            self._data = self._get(None)
+
+    def _get(self, byte_range):
+        kwargs = {'Range': byte_range} if byte_range else {}
+        with stage('fetch') as record:
+            body = self.s3_client.get_object(Bucket=self.s3_bucket, Key=self.key, **kwargs)['Body'].read()
+            record.bytes = len(body)
+        self.bytes_fetched += len(body)
+        self.requests += 1
+        return body
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        self.position = min(max(offset, 0), self.size)
+        return self.position
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.size - self.position
+        size = min(size, self.size - self.position)
+        if size <= 0:
+            return b''
+        range_start, range_data = self._last_range
+        if self._data is not None:
+            data = self._data[self.position:self.position + size]
+        elif range_start <= self.position and self.position + size <= range_start + len(range_data):
+            data = range_data[self.position - range_start:self.position - range_start + size]
+        else:
+            data = self._get(f"bytes={self.position}-{self.position + size - 1}")
+            self._last_range = (self.position, data)
+        self.position += len(data)
+        return data
+
+    def readall(self):
+        return self.read(-1)
+
+    def close(self):
+        if self.closed:
+            return
+        self._data = None
+        self._last_range = (0, b'')
+        super().close()
+        if self._on_close is not None:
+            on_close, self._on_close = self._on_close, None
+            on_close(self)
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+#SERVER-SIDE COPY
+
+# Largest object a single CopyObject request can copy
+MAX_COPY_OBJECT_SIZE = 5 * 1024 * 1024 * 1024
+
+
+#function to copy an object inside S3 without downloading it
+
+def copy_s3_object(s3_client, s3_bucket, source_key, destination_key, size=None, part_size=512 * 1024 * 1024, source_bucket=None):
+    """
+    Copies an S3 object server-side, so no bytes pass through the Lambda.
+
+    Objects up to 5 GiB are copied with a single copy_object call, larger objects with a
+    multipart upload whose parts are copied with upload_part_copy. A failed multipart copy
+    is aborted.
+
+    Parameters:
+    - s3_client: boto3 S3 client.
+    - s3_bucket (str): Destination bucket (also the source bucket unless source_bucket is given).
+    - source_key (str): Key of the object to copy.
+    - destination_key (str): Key of the copy.
+    - size (int): Size of the source object in bytes, looked up with head_object when omitted.
+    - part_size (int): Part size used for multipart copies.
+    - source_bucket (str): Optional bucket holding the source object.
+    """
+    copy_source = {'Bucket': source_bucket or s3_bucket, 'Key': source_key}
+    if size is None:
+        size = s3_client.head_object(**copy_source)['ContentLength']
+
+    with stage('copy') as record:
+        record.bytes = size
+        if size <= MAX_COPY_OBJECT_SIZE:
+            s3_client.copy_object(Bucket=s3_bucket, Key=destination_key, CopySource=copy_source)
+            return
+        _copy_multipart(s3_client, s3_bucket, destination_key, copy_source, size, part_size)
+
+
+#function to copy an object larger than 5 GiB with a multipart upload of copied parts
+
+def _copy_multipart(s3_client, s3_bucket, destination_key, copy_source, size, part_size):
+
+    part_size = max(int(part_size), MIN_PART_SIZE)
+    upload_id = s3_client.create_multipart_upload(Bucket=s3_bucket, Key=destination_key)['UploadId']
+    try:
+        parts = []
+        for part_number, start in enumerate(range(0, size, part_size), start=1):
+            end = min(start + part_size, size) - 1
+            response = s3_client.upload_part_copy(
+                Bucket=s3_bucket,
+                Key=destination_key,
+                UploadId=upload_id,
+                PartNumber=part_number,
+                CopySource=copy_source,
+                CopySourceRange=f"bytes={start}-{end}"
+            )
+            parts.append({'PartNumber': part_number, 'ETag': response['CopyPartResult']['ETag']})
+        s3_client.complete_multipart_upload(
+            Bucket=s3_bucket,
+            Key=destination_key,
+            UploadId=upload_id,
+            MultipartUpload={'Parts': parts}
+        )
+    except Exception:
+        s3_client.abort_multipart_upload(Bucket=s3_bucket, Key=destination_key, UploadId=upload_id)
+        raise
+
+
+#KEY DISCOVERY
+
+# Date suffix of files written as {name}_{YYYY-MM-DD}.parquet
+DATE_SUFFIX_PATTERN = re.compile(r'(\d{4}-\d{2}-\d{2})\.parquet$')
+
+# Date of files written under {prefix}/dt={YYYY-MM-DD}/
+DATE_PARTITION_PATTERN = re.compile(r'/dt=(\d{4}-\d{2}-\d{2})/')
+
+# Temporary files of a run (e.g. the range parts of the parallel extract) live in directories starting with '_'
+TEMPORARY_DIRECTORY_PREFIX = '_'
+
+# Manifests already loaded by this (warm) Lambda, keyed by (bucket, prefix)
+_MANIFEST_CACHE = {}
+
+
+#function to list every object under a prefix, following continuation tokens past 1,000 keys
+
+def list_objects(s3_client, s3_bucket, prefix, start_after=None):
+    # Keys are listed in lexicographic order, start_after skips every key up to and including it
+    paginator = s3_client.get_paginator('list_objects_v2')
+    kwargs = {'StartAfter': start_after} if start_after else {}
+    pages = iter(paginator.paginate(Bucket=s3_bucket, Prefix=prefix, **kwargs))
+    while True:
+        # Pages are requested lazily, only the request is timed
+        with stage('list') as record:
+            page = next(pages, None)
+            record.rows = len(page.get('Contents', [])) if page else 0
+        if page is None:
+            return
+        for obj in page.get('Contents', []):
+            yield obj
+
+
+#function to build the prefix of a date partition, e.g. staging/Business/customers/dt=2024-10-01/
+
+def date_partition_prefix(prefix, date_suffix):
+    return f"{prefix.rstrip('/')}/dt={date_suffix}/"
+
+
+#function to check whether a key sits in a temporary directory (_parts/, ...) below prefix
+
+def is_temporary_key(key, prefix=''):
+    relative_key = key[len(prefix):] if key.startswith(prefix) else key
+    return any(directory.startswith(TEMPORARY_DIRECTORY_PREFIX) for directory in relative_key.split('/')[:-1])
+
+
+#function to check whether a file belongs to a table, e.g. staging/Business/orders_2024-10-01.parquet to orders
+
+def is_table_key(key, table_name=None):
+    # Flat files are named {table}_{date}.parquet (or {table}_delta_{date}.parquet), tables may share a prefix
+    return table_name is None or posixpath.basename(key).startswith(f"{table_name}_")
+
+
+#function to build the prefix of a table in the hive layout, e.g. staging/Business/table=orders/
+
+def hive_table_prefix(prefix, table_name):
+    prefix = prefix.rstrip('/')
+    if prefix.endswith(f"table={table_name}"):
+        return f"{prefix}/"
+    return f"{prefix}/table={table_name}/"
+
+
+#function to build the prefix of a day of a table in the hive layout
+
+def hive_day_prefix(table_prefix, date_suffix):
+    return f"{table_prefix}dt={date_suffix}/"
+
+
+#function to delete S3 objects in batches, raising when S3 refuses some of them
+
+def delete_s3_objects(s3_client, s3_bucket, keys):
+    """
+    Deletes keys with delete_objects (up to 1,000 keys per request).
+
+    delete_objects reports refused keys (e.g. AccessDenied without s3:DeleteObject) in the
+    response 'Errors' instead of raising, so they are collected and raised as an OSError once
+    every batch was sent.
+
+    Returns:
+    - list: Keys deleted.
+    """
+    deleted_keys = []
+    errors = []
+    for start in range(0, len(keys), 1000):
+        batch = keys[start:start + 1000]
+        response = s3_client.delete_objects(Bucket=s3_bucket, Delete={'Objects': [{'Key': key} for key in batch]})
+        batch_errors = response.get('Errors') or []
+        failed_keys = {error.get('Key') for error in batch_errors}
+        deleted_keys.extend(key for key in batch if key not in failed_keys)
+        errors.extend(batch_errors)
+    if errors:
+        for error in errors[:10]:
+            print(f"Could not delete '{error.get('Key')}': {error.get('Code')} {error.get('Message')}")
+        raise OSError(f"{len(errors)} of {len(keys)} object(s) could not be deleted from '{s3_bucket}' "
+                      f"({errors[0].get('Code')}), {len(deleted_keys)} deleted")
+    return deleted_keys
+
+
+#function to delete the files of a day partition that were not written by the current run
+
+def delete_stale_parts(s3_client, s3_bucket, day_prefix, keep_keys, file_prefix=None):
+    """
+    Deletes the Parquet files under day_prefix that are not in keep_keys, e.g. part-3.parquet
+    of an earlier run that wrote more parts, or a partition value that no longer has rows.
+    With file_prefix only the files named {file_prefix}-*.parquet are considered.
+
+    Raises an OSError when S3 refuses to delete some of them (see delete_s3_objects), as readers
+    of the partition would count the stale rows twice.
+
+    Returns:
+    - list: Keys deleted.
+    """
+    keep_keys = set(keep_keys)
+    stale_keys = [
+        obj['Key'] for obj in list_objects(s3_client, s3_bucket, day_prefix)
+        if obj['Key'].endswith('.parquet') and obj['Key'] not in keep_keys
+        and (file_prefix is None or posixpath.basename(obj['Key']).startswith(f"{file_prefix}-"))
+    ]
+    deleted_keys = delete_s3_objects(s3_client, s3_bucket, stale_keys)
+    if deleted_keys:
+        print(f"Deleted {len(deleted_keys)} stale file(s) under '{day_prefix}'")
+    return deleted_keys
+
+
+#function to resolve the Parquet files of a given day under a prefix
+
+def resolve_date_keys(s3_client, s3_bucket, prefix, date_suffix, partitioned=False, use_manifest=False, table_name=None):
+    """
+    Returns the keys of the Parquet files holding date_suffix under prefix.
+
+    With table_name, only the flat files of that table ({table_name}_...) are returned, so
+    tables sharing a prefix (e.g. staging/Business/) do not get each other's files.
+
+    - partitioned=True: files live under {prefix}/dt=YYYY-MM-DD/, so a single listing of that
+      exact prefix returns every part of the day.
+    - use_manifest=True: {prefix}/_manifest.json maps each date to its keys. The manifest is
+      cached in memory for warm invocations and rebuilt from a full (paginated) listing when
+      the requested date has no file of the table, so resolving a known day costs at most one
+      S3 call.
+    - otherwise the prefix is listed page by page and the first key ending with
+      '{date_suffix}.parquet' is returned.
+
+    Returns an empty list when no file is found.
+    """
+    if partitioned:
+        partition = date_partition_prefix(prefix, date_suffix)
+        return sorted(obj['Key'] for obj in list_objects(s3_client, s3_bucket, partition)
+                      if obj['Key'].endswith('.parquet') and not is_temporary_key(obj['Key'], partition))
+
+    if not use_manifest:
+        for obj in list_objects(s3_client, s3_bucket, prefix):
+            if (obj['Key'].endswith(f'{date_suffix}.parquet') and is_table_key(obj['Key'], table_name)
+                    and not is_temporary_key(obj['Key'], prefix)):
+                return [obj['Key']]
+        return []
+
+    def table_keys(manifest):
+        return [key for key in manifest.get(date_suffix, []) if is_table_key(key, table_name)]
+
+    manifest_key = f"{prefix.rstrip('/')}/_manifest.json"
+    cache_key = (s3_bucket, prefix)
+    manifest = _MANIFEST_CACHE.get(cache_key)
+    if manifest is None or not table_keys(manifest):
+        manifest = read_json_object(s3_client, s3_bucket, manifest_key) or {}
+    if not table_keys(manifest):
+        # Rebuild the manifest from a full listing of the prefix
+        manifest = {}
+        for obj in list_objects(s3_client, s3_bucket, prefix):
+            match = DATE_SUFFIX_PATTERN.search(obj['Key'])
+            if match and not is_temporary_key(obj['Key'], prefix):
+                manifest.setdefault(match.group(1), []).append(obj['Key'])
+        write_json_object(s3_client, s3_bucket, manifest_key, manifest)
+    _MANIFEST_CACHE[cache_key] = manifest
+    return table_keys(manifest)
+
+
+#function to resolve the Parquet files of every day of a date range with a single listing
+
+def resolve_date_range_keys(s3_client, s3_bucket, prefix, start_date, end_date, partitioned=False, table_name=None):
+    """
+    Returns {date: [keys]} for the dates between start_date and end_date (inclusive, YYYY-MM-DD).
+
+    The prefix is listed once (page by page) and every key is matched against its dt=
+    partition (partitioned=True) or its '{date}.parquet' suffix, instead of one listing per day.
+    Suffix matches are limited to the files of table_name, like resolve_date_keys. Dates
+    without a file are not in the result.
+    """
+    pattern = DATE_PARTITION_PATTERN if partitioned else DATE_SUFFIX_PATTERN
+    keys_by_date = {}
+    for obj in list_objects(s3_client, s3_bucket, prefix):
+        if not obj['Key'].endswith('.parquet') or is_temporary_key(obj['Key'], prefix):
+            continue
+        if not partitioned and not is_table_key(obj['Key'], table_name):
+            continue
+        match = pattern.search(obj['Key'])
+        if match and start_date <= match.group(1) <= end_date:
+            keys_by_date.setdefault(match.group(1), []).append(obj['Key'])
+    return {date: sorted(keys) for date, keys in sorted(keys_by_date.items())}
@@ -0,0 +1,161 @@
+#import library
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+from s3_functions import S3MultipartWriter
+from s3_functions import copy_s3_object
+from s3_functions import list_objects
+from s3_functions import hive_table_prefix
+from s3_functions import hive_day_prefix
+from s3_functions import delete_stale_parts
+from s3_functions import is_temporary_key
+from connection_functions import get_s3_client
+from metrics_functions import instrumented
+from metrics_functions import stage
+from metrics_functions import with_current_metrics
+
+
+#EXTRACT DATA FROM S3 RAW TO STAGING
+@instrumented
+def s3raw_to_s3staging(event, context):
+    s3_bucket = event.get('s3_bucket') 
+    s3_raw_prefix = event.get('s3_raw_prefix') 
+    s3_staging_prefix = event.get('s3_staging_prefix')
+    filename_filters = event.get('filename_filters')
+    date_suffix = event.get('date_suffix')
+    part_size = int(event.get('upload_part_size_mb', 8)) * 1024 * 1024
+    upload_concurrency = int(event.get('upload_concurrency', 4))
+    # Number of objects promoted at the same time
+    max_concurrency = int(event.get('max_concurrency', 8))
+    # Objects are only decoded and re-encoded when a schema, compression or writer profile change is requested
+    column_types = event.get('column_types')
+    compression = event.get('compression')
+    transform_requested = bool(column_types or compression or event.get('writer_profile'))
+    # Get the cached boto3 client for S3, shared by all worker threads
+    s3_client = get_s3_client(max_pool_connections=max(10, max_concurrency * 2))
+    
+    # Hive layout: only the dt= partition of the day of every table is listed, and the path below
+    # table=<name>/ (dt=, secondary partitions, part file) is kept under every staging category
+    hive_layout = event.get('layout') == 'hive'
+    if hive_layout:
+        tasks = []
+        for filter_key, categories in filename_filters.items():
+            raw_table_prefix = hive_table_prefix(s3_raw_prefix, filter_key)
+            for obj in list_objects(s3_client, s3_bucket, hive_day_prefix(raw_table_prefix, date_suffix)):
+                if not obj['Key'].endswith('.parquet'):
+                    continue
+                relative_path = obj['Key'][len(raw_table_prefix):]
+                for category in categories:
+                    destination_path = hive_table_prefix(f"{s3_staging_prefix}/{category}", filter_key) + relative_path
+                    tasks.append((obj, destination_path, filter_key))
+        if not tasks:
+            print(f"No files found in the dt={date_suffix} partitions of the raw prefix.")
+            return
+    else:
+        # Extract list of objects in the raw zone of S3 bucket with specified prefix (all pages)
+        # Temporary files of a running extract (e.g. _parts/) are not promoted
+        objects = [obj for obj in list_objects(s3_client, s3_bucket, s3_raw_prefix) if not is_temporary_key(obj['Key'], s3_raw_prefix)]
+    
+        # Print error message if content not found
+        if not objects:
+            print("No files found in the raw prefix.")
+            return
+    
+        # Every raw file of a table is promoted to the same staging file of the day, so only one of them
+        # is kept per table: the extract of date_suffix, else the newest one
+        selected_objects = {}
+        for obj in objects:
+            # Extract the full filename from the S3 object key
+            raw_filename = obj['Key'].split('/')[-1]
+        
+            # Uncomment this if you want to extract file from bucket based on specified date suffix on the file
+            # if not raw_filename.endswith(date_suffix):
+            #     print(f"filename '{raw_filename}' doesn't end with '{date_suffix}'. Skipping...")
+            #     continue
+        
+            # Check if the filename matches any of the filters
+            for filter_key in filename_filters:
+                if filter_key in raw_filename:
+                    rank = (raw_filename.rsplit('.', 1)[0].endswith(date_suffix), obj['LastModified'])
+                    selected = selected_objects.get(filter_key)
+                    if selected is None or rank > selected[0]:
+                        if selected is not None:
+                            print(f"Filename '{selected[1]['Key'].split('/')[-1]}' replaced by '{raw_filename}' for {filter_key}. Skipping...")
+                        selected_objects[filter_key] = (rank, obj)
+                    else:
+                        print(f"Filename '{raw_filename}' replaced by '{selected[1]['Key'].split('/')[-1]}' for {filter_key}. Skipping...")
+                    break
+            else:
+                print(f"Filename '{raw_filename}' does not match any filters. Skipping...")
+
+        # Build one task per (raw object, staging category)
+        tasks = []
+        for filter_key, (_, obj) in selected_objects.items():
+            for category in filename_filters[filter_key]:
+                # Prepare the destination path
+                destination_path = f"{s3_staging_prefix}/{category}/{filter_key}_{date_suffix}.parquet"
+                tasks.append((obj, destination_path, filter_key))
+
+    # Promote a single raw object to one staging destination
+    def promote_object(obj, destination_path, table_name):
+        raw_filename = obj['Key'].split('/')[-1]
+        try:
+            # Fast path: the staging file is a byte-for-byte copy, let S3 copy it server-side
+            if not transform_requested:
+                copy_s3_object(s3_client, s3_bucket, obj['Key'], destination_path, obj.get('Size'))
+                print(f"File '{raw_filename}' successfully copied to '{destination_path}'")
+                return {'source': obj['Key'], 'destination': destination_path, 'status': 'succeeded'}
+
+            # pyarrow is only imported when a file has to be decoded, the copy path does not need it
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            from parquet_functions import resolve_writer_profile
+            from parquet_functions import write_parquet
+
+            # Read the Parquet file from S3
+            with stage('fetch') as record:
+                s3_object = s3_client.get_object(Bucket=s3_bucket, Key=obj['Key'])
+                buffer = BytesIO(s3_object['Body'].read())
+                record.bytes = buffer.getbuffer().nbytes
+            with stage('decode') as record:
+                table = pq.read_table(buffer)
+                record.rows = table.num_rows
+
+            # Apply the requested column type changes
+            if column_types:
+                with stage('transform') as record:
+                    target_schema = pa.schema([
+                        field.with_type(pa.type_for_alias(column_types[field.name])) if field.name in column_types else field
+                        for field in table.schema
+                    ])
+                    table = table.cast(target_schema)
+                    record.rows = table.num_rows
+
+            # Re-encode the table to Parquet with the table's writer profile and stream it to staging
+            writer_options = resolve_writer_profile(event, table_name)
+            if compression:
+                writer_options['compression'] = compression
+            with S3MultipartWriter(s3_client, s3_bucket, destination_path, part_size, upload_concurrency) as sink:
+                write_parquet(table, sink, writer_options)
+            print(f"File '{raw_filename}' successfully moved to '{destination_path}'")
+            return {'source': obj['Key'], 'destination': destination_path, 'status': 'succeeded'}
+        except Exception as ex:
+            print(f"Error processing file '{raw_filename}': {ex}")
+            return {'source': obj['Key'], 'destination': destination_path, 'status': 'failed', 'error': str(ex)}
+
+    # Run the promotions on a bounded thread pool, so wall time follows the slowest object
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as executor:
+        results = list(executor.map(with_current_metrics(lambda task: promote_object(*task)), tasks))
+
+    if hive_layout:
+        # Remove the files an earlier run left in the staging partitions, unless a promotion to them failed
+        destinations_by_day = {}
+        for result in results:
+            day_prefix = result['destination'].split('/dt=')[0] + f"/dt={date_suffix}/"
+            destinations_by_day.setdefault(day_prefix, []).append(result)
+        for day_prefix, day_results in destinations_by_day.items():
+            if all(result['status'] == 'succeeded' for result in day_results):
+                delete_stale_parts(s3_client, s3_bucket, day_prefix, [result['destination'] for result in day_results])
+
+    succeeded = sum(1 for result in results if result['status'] == 'succeeded')
+    print(f"{succeeded} of {len(results)} staging files written.")
+    return {'succeeded': succeeded, 'failed': len(results) - succeeded, 'results': results}
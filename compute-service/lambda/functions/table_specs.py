@@ -0,0 +1,282 @@
+#import library
+from functools import lru_cache
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+from helper_functions import regex_fullmatch_mask
+
+EMAIL_PATTERN = r'^[\w\.-]+@[a-zA-Z\d\.-]+\.[a-zA-Z]{2,}$'
+GENDERS = ['Male', 'Female', 'Binary', 'Non-binary', 'Preferred to not say']
+POSITIONS = ['Inventory_manager', 'Inventory_staff', 'Admin_manager', 'Admin', 'Hr_manager', 'Hr', 'Business_manager', 'Sales_rep', 'CFO', 'Accountant']
+
+# Cleaning rules of every table loaded by the main_processing_* handlers.
+#
+# - columns: target columns, in load order
+# - key_columns: natural key the upsert load mode (event 'load_mode': 'upsert') replaces rows on
+# - optional_columns: columns loaded as NULL when the staged file does not have them
+# - dtypes: {column: dtype} casts applied before any other rule
+# - join_lists: list-valued columns flattened to a comma separated string
+# - capitalize / upper: case normalization
+# - replace: {column: {old value: new value}}
+# - allowed_values: {column: (allowed values, replacement value)}
+# - regex: {column: (pattern the whole value must match, replacement value)}
+# - writer_profile: Parquet writer profile of the table's extract and staging files (see parquet_functions)
+# - partition_by: secondary partition columns of the table in the hive layout (see lake_functions)
+# - split_column: column the parallel extract mode (event 'extract_mode': 'parallel') splits the table on
+# - extract_engine: 'cursor' (default) or 'copy', how upload_src_data_to_s3 fetches the table's rows (see extract_functions)
+TABLE_SPECS = {
+    'customers': {
+        'columns': ['customer_id', 'customer_name', 'customer_gender', 'customer_birth', 'customer_type', 'customer_location', 'customer_email'],
+        'key_columns': ['customer_id'],
+        'capitalize': ['customer_name', 'customer_gender', 'customer_type'],
+        'upper': ['customer_location'],
+        'allowed_values': {
+            'customer_gender': (GENDERS, 'Invalid'),
+            'customer_type': (['Wholesaler', 'Retailer', 'NGO'], 'Invalid'),
+        },
+        'regex': {'customer_email': (EMAIL_PATTERN, 'invalid')},
+    },
+    'departments': {
+        'columns': ['department_id', 'department_name', 'position', 'salary'],
+        'key_columns': ['department_id'],
+        'capitalize': ['department_name', 'position'],
+        'allowed_values': {
+            'department_name': (['Inventory', 'Administration', 'Human_resource', 'Business', 'Accounts'], 'Invalid'),
+            'position': (POSITIONS, 'Invalid'),
+        },
+    },
+    'employees': {
+        'columns': ['employee_id', 'employee_department_id', 'employee_name', 'employee_gender', 'employee_birth', 'employee_position',
+                    'employee_location', 'employee_email', 'employee_hire_date', 'status', 'resignation_date'],
+        'key_columns': ['employee_id'],
+        'capitalize': ['employee_name', 'employee_gender', 'employee_position', 'employee_location', 'status'],
+        'allowed_values': {
+            'employee_gender': (GENDERS, 'Invalid'),
+            'employee_position': (POSITIONS, 'Invalid'),
+            'status': (['Active', 'Not Active'], 'Invalid'),
+        },
+    },
+    'inventory': {
+        'columns': ['product_id', 'product_name', 'category', 'batch', 'expiration_date', 'depot_1', 'depot_2', 'depot_3', 're_order_level'],
+        'key_columns': ['product_id', 'batch'],
+        'capitalize': ['product_name', 'category'],
+    },
+    'orders': {
+        'columns': ['order_date', 'order_id', 'customer_id', 'product_id', 'quantity', 'selling_price', 'employee_id', 'payment_methods'],
+        'key_columns': ['order_id', 'product_id'],
+        'capitalize': ['payment_methods'],
+        'allowed_values': {'payment_methods': (['Transfer', 'Cash', 'Card'], 'Invalid')},
+        'writer_profile': {'profile': 'scan', 'sort_by': ['order_date', 'order_id']},
+        'partition_by': ['payment_methods'],
+        'split_column': 'order_id',
+    },
+    'products': {
+        'columns': ['product_id', 'product_name', 'category', 'cost_price', 'selling_price', 'batch', 'expiring_date'],
+        'key_columns': ['product_id'],
+        'optional_columns': ['expiring_date'],
+    },
+    'purchase_order': {
+        'columns': ['purchase_order_date', 'purchase_order_id', 'supplier_id', 'product_id', 'quantity', 'cost_price', 'total_price', 'delivery_date', 'status'],
+        'key_columns': ['purchase_order_id'],
+        'capitalize': ['status'],
+        'allowed_values': {'status': (['Delivered', 'Not delivered'], 'Invalid')},
+        'writer_profile': {'profile': 'scan', 'sort_by': ['purchase_order_date', 'purchase_order_id']},
+        'split_column': 'purchase_order_id',
+    },
+    'suppliers': {
+        'columns': ['supplier_id', 'supplier_name', 'supplier_email', 'supplier_location', 'product_class', 'product_name'],
+        'key_columns': ['supplier_id'],
+        'join_lists': ['product_name'],
+        'upper': ['supplier_location'],
+        'capitalize': ['product_class'],
+        'replace': {'product_class': {'Raw_materials': 'Raw materials'}},
+        'allowed_values': {'product_class': (['Raw materials', 'Finished products'], 'Invalid')},
+        'regex': {'supplier_email': (EMAIL_PATTERN, 'invalid')},
+    },
+}
+
+
+#functions building the pandas column operations of a spec
+
+def _cast(dtype):
+    return lambda values: values.astype(dtype)
+
+
+def _join_list(value):
+    return ', '.join(map(str, value.tolist())) if isinstance(value, np.ndarray) else str(value)
+
+
+def _join_lists(values):
+    return values.apply(_join_list)
+
+
+def _capitalize(values):
+    return values.str.capitalize()
+
+
+def _upper(values):
+    return values.str.upper()
+
+
+def _replace(mapping):
+    return lambda values: values.replace(mapping)
+
+
+def _allowed_values(allowed_values, replacement_value):
+    allowed = set(allowed_values)
+    return lambda values: values.where(values.isin(allowed), replacement_value)
+
+
+def _regex(regex_pattern, replacement_value):
+    return lambda values: values.where(regex_fullmatch_mask(values, regex_pattern), replacement_value)
+
+
+#functions building the Arrow (pyarrow.compute) column operations of a spec
+
+def _as_strings(values):
+    # Columns holding only NULLs are read as the Arrow null type
+    return pc.cast(values, pa.string()) if pa.types.is_null(values.type) else values
+
+
+def _arrow_cast(dtype):
+    return lambda values: pc.cast(values, pa.type_for_alias(dtype))
+
+
+def _arrow_join_lists(values):
+    if pa.types.is_list(values.type) or pa.types.is_large_list(values.type):
+        joined = pc.binary_join(pc.cast(values, pa.list_(pa.string())), ', ')
+    else:
+        joined = pc.cast(values, pa.string())
+    # str(None) of the pandas path
+    return joined.fill_null('None')
+
+
+def _arrow_capitalize(values):
+    return pc.utf8_capitalize(_as_strings(values))
+
+
+def _arrow_upper(values):
+    return pc.utf8_upper(_as_strings(values))
+
+
+def _arrow_replace(mapping):
+    def replace(values):
+        values = _as_strings(values)
+        for old_value, new_value in mapping.items():
+            values = pc.if_else(pc.equal(values, old_value), new_value, values)
+        return values
+    return replace
+
+
+def _arrow_allowed_values(allowed_values, replacement_value):
+    def check(values):
+        values = _as_strings(values)
+        allowed = pc.is_in(values, value_set=pa.array(list(allowed_values), type=values.type))
+        return pc.if_else(allowed, values, pa.scalar(replacement_value, values.type))
+    return check
+
+
+def _arrow_regex(regex_pattern, replacement_value):
+    def check(values):
+        matches = pa.array(regex_fullmatch_mask(values, regex_pattern))
+        return pc.if_else(matches, _as_strings(values), replacement_value)
+    return check
+
+
+# Operation builders of each cleaning engine
+OPERATION_BUILDERS = {
+    'pandas': {
+        'dtypes': _cast, 'join_lists': _join_lists, 'capitalize': _capitalize, 'upper': _upper,
+        'replace': _replace, 'allowed_values': _allowed_values, 'regex': _regex,
+    },
+    'arrow': {
+        'dtypes': _arrow_cast, 'join_lists': _arrow_join_lists, 'capitalize': _arrow_capitalize, 'upper': _arrow_upper,
+        'replace': _arrow_replace, 'allowed_values': _arrow_allowed_values, 'regex': _arrow_regex,
+    },
+}
+
+
+#function to compile a table spec into an ordered list of operations per column
+
+@lru_cache(maxsize=None)
+def compile_table_spec(table_name, engine='pandas'):
+    """
+    Compiles TABLE_SPECS[table_name] once per process into {column: [operations]}.
+
+    engine selects whole-column pandas operations ('pandas') or pyarrow.compute kernels
+    ('arrow'). Operations of a column run in a fixed order: dtype cast, list flattening, case
+    normalization, value replacement, allowed-value check and regex validation.
+    """
+    spec = TABLE_SPECS[table_name]
+    builders = OPERATION_BUILDERS[engine]
+    operations = {}
+
+    def add(column, operation):
+        operations.setdefault(column, []).append(operation)
+
+    for column, dtype in spec.get('dtypes', {}).items():
+        add(column, builders['dtypes'](dtype))
+    for column in spec.get('join_lists', []):
+        add(column, builders['join_lists'])
+    for column in spec.get('capitalize', []):
+        add(column, builders['capitalize'])
+    for column in spec.get('upper', []):
+        add(column, builders['upper'])
+    for column, mapping in spec.get('replace', {}).items():
+        add(column, builders['replace'](mapping))
+    for column, (allowed_values, replacement_value) in spec.get('allowed_values', {}).items():
+        add(column, builders['allowed_values'](allowed_values, replacement_value))
+    for column, (regex_pattern, replacement_value) in spec.get('regex', {}).items():
+        add(column, builders['regex'](regex_pattern, replacement_value))
+    return operations
+
+
+#function to clean a DataFrame according to its table spec
+
+def clean_dataframe(df, table_name):
+    """
+    Applies every cleaning rule of the table to the DataFrame, one whole-column operation at a time.
+
+    Parameters:
+    - df (pd.DataFrame): Data read from the staged Parquet file.
+    - table_name (str): Key of the table in TABLE_SPECS.
+
+    Returns:
+    - pd.DataFrame: The cleaned DataFrame, with missing optional columns added as NULL.
+    """
+    spec = TABLE_SPECS[table_name]
+    for column in spec.get('optional_columns', []):
+        if column not in df.columns:
+            df[column] = None
+    for column, operations in compile_table_spec(table_name).items():
+        values = df[column]
+        for operation in operations:
+            values = operation(values)
+        df[column] = values
+    return df
+
+
+#function to clean an Arrow table according to its table spec, without converting it to pandas
+
+def clean_table(table, table_name):
+    """
+    Arrow-native counterpart of clean_dataframe: every rule runs as a pyarrow.compute kernel on
+    the pa.Table read from Parquet, so string columns never become python objects.
+
+    Parameters:
+    - table (pa.Table): Data read from the staged Parquet file.
+    - table_name (str): Key of the table in TABLE_SPECS.
+
+    Returns:
+    - pa.Table: The cleaned table, with missing optional columns added as NULL.
+    """
+    spec = TABLE_SPECS[table_name]
+    for column in spec.get('optional_columns', []):
+        if column not in table.column_names:
+            table = table.append_column(column, pa.nulls(table.num_rows, pa.string()))
+    for column, operations in compile_table_spec(table_name, 'arrow').items():
+        values = table.column(column)
+        for operation in operations:
+            values = operation(values)
+        table = table.set_column(table.schema.get_field_index(column), column, values)
+    return table
@@ -0,0 +1,453 @@
+#import library
+import posixpath
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pyarrow as pa
+import pyarrow.compute as pc
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+from extract_functions import stream_query_to_parquet
+from extract_functions import query_to_table
+from extract_functions import key_range_bounds
+from extract_functions import key_range_predicates
+from extract_functions import where_clause
+from extract_functions import resolve_extract_engine
+from extract_functions import watermark_state_key
+from extract_functions import read_watermark
+from extract_functions import write_watermark
+from s3_functions import S3MultipartWriter
+from s3_functions import hive_table_prefix
+from s3_functions import hive_day_prefix
+from s3_functions import delete_stale_parts
+from lake_functions import resolve_partition_by
+from lake_functions import write_partitioned
+from lake_functions import merge_parquet_parts
+from parquet_functions import resolve_writer_profile
+from metrics_functions import instrumented
+from metrics_functions import stage
+from metrics_functions import with_current_metrics
+from parquet_functions import write_parquet
+from table_specs import TABLE_SPECS
+from connection_functions import get_s3_client
+from connection_functions import db_transaction
+from connection_functions import get_connection_pool
+from connection_functions import close_connection_pool
+from connection_functions import pooled_transaction
+
+
+#EXTRACT AND LOAD DATA FROM RDS TO S3 BUCKET
+@instrumented
+def upload_src_data_to_s3(event, context):
+    db_name = event.get('db_name') 
+    db_user = event.get('db_user')
+    db_password = event.get('db_password')
+    db_host = event.get('db_host')
+    db_port = event.get('db_port') 
+    tablename = event.get('tablename') 
+    #uncomment this if you plan to follow the uncomment instruction
+    #try: 
+        ##convert user input to date formart
+        #date_object = datetime.strptime(date_suffix, '%Y-%m-%d')
+    #except ValueError:
+        #print(f"Error encountered. Provided date, '{date_suffix}' is not in format (YYYY-mm-dd) !!")
+        
+            
+    # Connect to PostgreSQL
+    database_params = {
+        "dbname": db_name,
+        "user": db_user,
+        "password": db_password,
+        "host": db_host,
+        "port": db_port
+    }
+
+    # Batch mode: extract every table of 'tablenames' in this invocation instead of one Lambda per table
+    tablenames = event.get('tablenames')
+    if tablenames:
+        return extract_tables_to_s3(event, database_params, tablenames)
+
+    try:
+        # Reuse the connection of a previous warm invocation, the read transaction ends on exit
+        with db_transaction(database_params) as cnxn:
+            result = extract_table_to_s3(cnxn, get_s3_client(), event, tablename, database_params)
+    except Exception as ex:
+        print(f"Error: {ex}")
+        return
+
+    if not result['rows']:
+        return
+    return result
+
+
+#EXTRACT ONE TABLE FROM RDS TO THE S3 BUCKET
+def extract_table_to_s3(cnxn, s3_client, event, tablename, database_params=None):
+    """
+    Extracts {schema}.{tablename} over an open connection and writes it to S3 as Parquet.
+
+    Shared by the single table and the batch ('tablenames') modes of upload_src_data_to_s3.
+    Errors are raised to the caller, which owns the connection and its transaction.
+
+    With 'layout': 'hive' the file(s) are written to {s3_prefix}/table={tablename}/dt={date_suffix}/
+    (see lake_functions), split by the table's 'partition_by' columns outside the stream mode.
+
+    'extract_mode': 'parallel' extracts the key ranges of the table's split column (TABLE_SPECS
+    'split_column' or the event's) over several connections of database_params (see
+    extract_key_ranges). Tables without a split column use the default mode.
+
+    'extract_engine': 'copy' (or the table's TABLE_SPECS 'extract_engine') fetches the rows with
+    COPY ... TO STDOUT parsed straight into Arrow instead of cursor row tuples, in every mode
+    (see extract_functions.copy_query_batches).
+
+    Returns:
+    - dict: Table name, rows extracted and S3 key (None when nothing was extracted), in the hive
+      layout the prefix of the day partition and the keys of its files, in the parallel mode the
+      rows and seconds of every key range.
+    """
+    db_name = event.get('db_name')
+    schema = event.get('schema')
+    s3_bucket = event.get('s3_bucket') 
+    s3_prefix = event.get('s3_prefix') 
+    date_suffix = event.get('date_suffix')
+    
+    # Extract data from specific product ids in the database
+    sql_query = f"SELECT * FROM {schema}.{tablename} ;"
+    query_params = None
+    # Filters of the query, shared by the key ranges of the parallel mode
+    conditions = []
+
+    #uncomment this to replace sql query if you want to filter record by specified date_suffix
+    #sql_query = f"SELECT*FROM {schema}.{tablename} WHERE date_column = %s" #prevents sql injection cause value is user input.
+
+    destination_filename = f"{s3_prefix}/{tablename}_{date_suffix}.parquet"
+
+    # Incremental mode: only extract rows after the last high-water mark stored in S3
+    watermark_column = event.get('watermark_column')
+    if watermark_column:
+        state_key = watermark_state_key(event.get('s3_state_prefix', 'state/watermarks'), schema, tablename)
+        last_watermark = read_watermark(s3_client, s3_bucket, state_key)
+        if last_watermark is not None:
+            sql_query = f"SELECT * FROM {schema}.{tablename} WHERE {watermark_column} > %s ;"
+            query_params = (last_watermark,)
+            conditions = [f"{watermark_column} > %s"]
+            print(f"Extracting rows of {schema}.{tablename} with {watermark_column} after {last_watermark}")
+        destination_filename = f"{s3_prefix}/{tablename}_delta_{date_suffix}.parquet"
+
+    # Hive layout: part-N.parquet (delta-N.parquet for incremental extracts) under the dt= partition of the table
+    hive_layout = event.get('layout') == 'hive'
+    if hive_layout:
+        file_prefix = 'delta' if watermark_column else 'part'
+        table_prefix = hive_table_prefix(s3_prefix, tablename)
+        day_prefix = hive_day_prefix(table_prefix, date_suffix)
+        destination_filename = f"{day_prefix}{file_prefix}-0.parquet"
+        partition_by = resolve_partition_by(event, tablename)
+
+    # Multipart upload settings for the streaming S3 sink
+    part_size = int(event.get('upload_part_size_mb', 8)) * 1024 * 1024
+    upload_concurrency = int(event.get('upload_concurrency', 4))
+    high_water_mark = None
+    # Row group size, codec, dictionary, sort keys and statistics of the Parquet file
+    writer_options = resolve_writer_profile(event, tablename)
+    extract_engine = resolve_extract_engine(event, tablename)
+
+    range_stats = None
+    split_column = event.get('split_column') or TABLE_SPECS.get(tablename, {}).get('split_column')
+    # Extract key ranges of the split column concurrently, each over its own connection
+    if event.get('extract_mode') == 'parallel' and split_column:
+        rows_extracted, high_water_mark, destination_keys, range_stats = extract_key_ranges(
+            cnxn, s3_client, event, database_params, tablename, split_column, conditions, query_params,
+            writer_options, destination_filename, file_prefix if hive_layout else None
+        )
+        print(f"Data successfully extracted from {schema}.{tablename} in {db_name} database!")
+        if not rows_extracted:
+            print("No data extracted. Exiting...")
+            return {'table': f"{schema}.{tablename}", 'rows': 0, 'key': None}
+    # Stream the table through a server-side cursor in batches, so memory stays bounded by batch_size.
+    # Row groups are uploaded as multipart parts while the next batches are still being fetched.
+    elif event.get('extract_mode') == 'stream':
+        batch_size = int(event.get('batch_size', 10000))
+        if hive_layout and partition_by:
+            print(f"Stream mode writes one file per day, partition_by {partition_by} is not applied to {tablename}")
+        with S3MultipartWriter(s3_client, s3_bucket, destination_filename, part_size, upload_concurrency) as sink:
+            rows_extracted, high_water_mark = stream_query_to_parquet(
+                cnxn, sql_query, query_params, sink, batch_size, watermark_column, writer_options, extract_engine
+            )
+        print(f"Data successfully extracted from {schema}.{tablename} in {db_name} database!")
+        if not rows_extracted:
+            print("No data extracted. Exiting...")
+            return {'table': f"{schema}.{tablename}", 'rows': 0, 'key': None}
+        destination_keys = [destination_filename]
+        if hive_layout:
+            delete_stale_parts(s3_client, s3_bucket, day_prefix, destination_keys, file_prefix)
+    # Parse COPY ... TO STDOUT straight into a typed Arrow table, without row tuples or a DataFrame
+    elif extract_engine == 'copy':
+        table = query_to_table(cnxn, sql_query, query_params, engine='copy')
+        print(f"Data successfully extracted from {schema}.{tablename} in {db_name} database!")
+        if table is None or not table.num_rows:
+            print("No data extracted. Exiting...")
+            return {'table': f"{schema}.{tablename}", 'rows': 0, 'key': None}
+        destination_keys = write_extracted_table(s3_client, s3_bucket, table, event, tablename, writer_options,
+                                                 destination_filename, file_prefix if hive_layout else None)
+        rows_extracted = table.num_rows
+        if watermark_column:
+            high_water_mark = pc.max(table[watermark_column]).as_py()
+    else:
+        with stage('query') as record, cnxn.cursor() as cursor:
+            cursor.execute(sql_query, query_params)
+            #uncomment this for query execution if you are uncommenting the others to replace line of code
+            #cursor.execute(sql_query, (date_suffix,))
+
+            data = cursor.fetchall()
+            record.rows = len(data)
+            # Get column names
+            column_names = [desc[0] for desc in cursor.description]
+        # Print status message 
+        print(f"Data successfully extracted from {schema}.{tablename} in {db_name} database!")
+
+        if not data:
+            print("No data extracted. Exiting...")
+            return {'table': f"{schema}.{tablename}", 'rows': 0, 'key': None}
+    
+        # Write extracted data and columns to CSV
+        #csv_content = ','.join(column_names) + "\n" + "\n".join([','.join(map(str, row)) for row in data])
+    
+        # Convert data to Pandas DataFrame (pandas is only imported by this mode, not by the streaming one)
+        import pandas as pd
+        with stage('transform') as record:
+            df = pd.DataFrame(data, columns=column_names)
+            table = pa.Table.from_pandas(df)
+            record.rows = table.num_rows
+
+        destination_keys = write_extracted_table(s3_client, s3_bucket, table, event, tablename, writer_options,
+                                                 destination_filename, file_prefix if hive_layout else None)
+        rows_extracted = len(data)
+        if watermark_column:
+            watermark_values = df[watermark_column].dropna()
+            high_water_mark = watermark_values.max() if not watermark_values.empty else None
+
+    if watermark_column:
+        if high_water_mark is None:
+            high_water_mark = last_watermark
+        write_watermark(s3_client, s3_bucket, state_key, watermark_column, high_water_mark, rows_extracted)
+    if hive_layout:
+        print(f"Data successfully uploaded to S3 bucket '{s3_bucket}' in {len(destination_keys)} file(s) under '{day_prefix}'")
+        result = {'table': f"{schema}.{tablename}", 'rows': rows_extracted, 'key': day_prefix, 'keys': destination_keys}
+    else:
+        print(f"Data successfully uploaded to S3 bucket '{s3_bucket}' with filename '{destination_filename}'")
+        result = {'table': f"{schema}.{tablename}", 'rows': rows_extracted, 'key': destination_filename}
+    if range_stats is not None:
+        result['ranges'] = range_stats
+    return result
+
+
+#WRITE AN EXTRACTED TABLE TO S3
+def write_extracted_table(s3_client, s3_bucket, table, event, tablename, writer_options, destination_filename, file_prefix=None):
+    """
+    Writes the Arrow table of a full extract: in the hive layout (file_prefix given) one file per
+    value of the table's partition columns, removing stale parts of an earlier run, otherwise
+    destination_filename. Returns the keys written.
+    """
+    part_size = int(event.get('upload_part_size_mb', 8)) * 1024 * 1024
+    upload_concurrency = int(event.get('upload_concurrency', 4))
+    if file_prefix is not None:
+        table_prefix = hive_table_prefix(event.get('s3_prefix'), tablename)
+        return write_partitioned(s3_client, s3_bucket, table, table_prefix, event.get('date_suffix'),
+                                 resolve_partition_by(event, tablename), writer_options, file_prefix=file_prefix,
+                                 part_size=part_size, upload_concurrency=upload_concurrency)
+    # Stream the Parquet file to the raw S3 bucket
+    with S3MultipartWriter(s3_client, s3_bucket, destination_filename, part_size, upload_concurrency) as sink:
+        write_parquet(table, sink, writer_options)
+    return [destination_filename]
+
+
+#EXTRACT THE KEY RANGES OF A TABLE IN PARALLEL
+def extract_key_ranges(cnxn, s3_client, event, database_params, tablename, split_column, conditions, query_params,
+                       writer_options, destination_filename, file_prefix=None):
+    """
+    Parallel mode of extract_table_to_s3 ('extract_mode': 'parallel').
+
+    The rows of the table (after the watermark filter in conditions) are split into
+    'parallel_ranges' key ranges of split_column (default: 'parallel_workers', itself 4 by
+    default), of equal widths between the min and max ('split_method': 'minmax', the default)
+    or of equal row counts ('ntile', see key_range_bounds). Each range is read on its own
+    connection of a pool of 'parallel_workers' connections, converted to Arrow batch by batch
+    and written as its own Parquet part:
+    - hive layout (file_prefix given): {file_prefix}-<range>.parquet in the day partition, split
+      by partition_by, and with 'merge_parts': True merged into {file_prefix}-0.parquet per directory;
+    - otherwise: parts under {s3_prefix}/_parts/, always merged into destination_filename, as
+      staging and processing expect one file per table and day.
+
+    With 'consistent_snapshot' (default True) cnxn's transaction exports its snapshot and every
+    range reads it, so the parts hold the table as of one point in time like a single query.
+    Throughput grows with parallel_workers until the database runs out of CPU or I/O, keep
+    it below the max_connections headroom of the instance.
+
+    Returns:
+    - tuple: (rows extracted, maximum of the watermark column or None, keys written, stats of every range).
+    """
+    if database_params is None:
+        raise ValueError("The parallel extract mode needs the database parameters to open its connections")
+    table = f"{event.get('schema')}.{tablename}"
+    s3_bucket = event.get('s3_bucket')
+    date_suffix = event.get('date_suffix')
+    watermark_column = event.get('watermark_column')
+    workers = max(1, int(event.get('parallel_workers', 4)))
+    ranges = max(1, int(event.get('parallel_ranges', workers)))
+    batch_size = int(event.get('batch_size', 10000))
+    part_size = int(event.get('upload_part_size_mb', 8)) * 1024 * 1024
+    upload_concurrency = int(event.get('upload_concurrency', 4))
+    query_params = tuple(query_params or ())
+    hive_layout = file_prefix is not None
+    extract_engine = resolve_extract_engine(event, tablename)
+
+    # Export the snapshot of this transaction, it has to be the first statement of the transaction
+    snapshot_id = None
+    if event.get('consistent_snapshot', True):
+        if cnxn.get_transaction_status() == TRANSACTION_STATUS_IDLE:
+            with cnxn.cursor() as cursor:
+                cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ ;")
+                cursor.execute("SELECT pg_export_snapshot() ;")
+                snapshot_id = cursor.fetchone()[0]
+        else:
+            print(f"The transaction of {table} already started, its key ranges are read without a shared snapshot")
+
+    # Every part gets the schema of a sample of the rows, so the parts can be read as one table
+    sample = query_to_table(cnxn, f"SELECT * FROM {table}{where_clause(conditions)} LIMIT 1000 ;", query_params or None,
+                            engine=extract_engine)
+    if sample is None:
+        return 0, None, [], []
+    bounds = key_range_bounds(cnxn, table, split_column, ranges, event.get('split_method', 'minmax'), conditions, query_params)
+    predicates = key_range_predicates(split_column, bounds)
+
+    if hive_layout:
+        table_prefix = hive_table_prefix(event.get('s3_prefix'), tablename)
+        day_prefix = hive_day_prefix(table_prefix, date_suffix)
+        partition_by = resolve_partition_by(event, tablename)
+    else:
+        parts_prefix = f"{event.get('s3_prefix')}/_parts/{posixpath.splitext(posixpath.basename(destination_filename))[0]}/"
+    # A pool per table, so the ranges of two tables of a batch extraction do not compete for
+    # connections. It is closed once the ranges are read, a batch would keep one per table open
+    pool_size = min(workers, len(predicates))
+    pool_name = f"ranges/{table}"
+    pool = get_connection_pool(database_params, pool_size, name=pool_name)
+
+    def extract_range(position, predicate):
+        range_start = time.perf_counter()
+        condition, range_params = predicate
+        with pooled_transaction(pool) as range_cnxn:
+            if snapshot_id:
+                with range_cnxn.cursor() as cursor:
+                    cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ ;")
+                    cursor.execute("SET TRANSACTION SNAPSHOT %s ;", (snapshot_id,))
+            part = query_to_table(range_cnxn, f"SELECT * FROM {table}{where_clause(conditions + [condition])} ;",
+                                  query_params + range_params, sample.schema, batch_size, extract_engine)
+        keys = []
+        if part.num_rows and hive_layout:
+            keys = write_partitioned(s3_client, s3_bucket, part, table_prefix, date_suffix, partition_by, writer_options,
+                                     part_number=position, file_prefix=file_prefix, replace=False, part_size=part_size,
+                                     upload_concurrency=upload_concurrency)
+        elif part.num_rows:
+            keys = [f"{parts_prefix}part-{position}.parquet"]
+            with S3MultipartWriter(s3_client, s3_bucket, keys[0], part_size, upload_concurrency) as sink:
+                write_parquet(part, sink, writer_options)
+        return {
+            'range': position,
+            'bounds': [str(value) for value in range_params],
+            'rows': part.num_rows,
+            'files': len(keys),
+            'seconds': round(time.perf_counter() - range_start, 3),
+            'keys': keys,
+            'high_water_mark': pc.max(part[watermark_column]).as_py() if watermark_column and part.num_rows else None,
+        }
+
+    try:
+        try:
+            with ThreadPoolExecutor(max_workers=pool_size) as executor:
+                results = list(executor.map(with_current_metrics(lambda item: extract_range(*item)), enumerate(predicates)))
+        finally:
+            close_connection_pool(database_params, pool_name)
+        keys = [key for result in results for key in result['keys']]
+        if not hive_layout and keys:
+            merge_parquet_parts(s3_client, s3_bucket, keys, destination_filename, writer_options, part_size, upload_concurrency)
+            keys = [destination_filename]
+    except BaseException:
+        if not hive_layout:
+            # The parts are removed when a range failed too, without hiding the error of the range
+            try:
+                delete_stale_parts(s3_client, s3_bucket, parts_prefix, [])
+            except OSError as error:
+                print(f"Could not delete the parts under '{parts_prefix}': {error}")
+        raise
+    if not hive_layout:
+        # The parts only exist to be merged, a refused delete raises (see delete_s3_objects)
+        delete_stale_parts(s3_client, s3_bucket, parts_prefix, [])
+
+    if hive_layout and event.get('merge_parts'):
+        keys_by_directory = {}
+        for key in keys:
+            keys_by_directory.setdefault(posixpath.dirname(key), []).append(key)
+        keys = []
+        for directory, part_keys in sorted(keys_by_directory.items()):
+            if len(part_keys) == 1:
+                keys.extend(part_keys)
+                continue
+            merged_key = f"{directory}/{file_prefix}-0.parquet"
+            merge_parquet_parts(s3_client, s3_bucket, part_keys, merged_key, writer_options, part_size, upload_concurrency)
+            keys.append(merged_key)
+    if hive_layout:
+        # Parts merged away and parts of an earlier run with more ranges
+        delete_stale_parts(s3_client, s3_bucket, day_prefix, keys, file_prefix)
+
+    rows_extracted = sum(result['rows'] for result in results)
+    high_water_marks = [result.pop('high_water_mark') for result in results]
+    high_water_marks = [value for value in high_water_marks if value is not None]
+    for result in results:
+        del result['keys']
+    print(f"Extracted {rows_extracted} rows of {table} in {len(predicates)} key ranges of {split_column} over {pool_size} connections")
+    return rows_extracted, max(high_water_marks) if high_water_marks else None, keys, results
+
+
+#EXTRACT A LIST OF TABLES FROM RDS TO S3 IN ONE INVOCATION
+def extract_tables_to_s3(event, database_params, tablenames):
+    """
+    Batch mode of upload_src_data_to_s3.
+
+    Extracts every table of tablenames on a bounded thread pool ('max_concurrency', default 4).
+    Each worker borrows its own connection from a small cached connection pool, so the
+    pandas/pyarrow cold start and the connection handshakes are paid once for all tables.
+    A failing table is reported in the result and does not stop the others.
+
+    Returns:
+    - dict: Number of succeeded and failed tables, total rows, elapsed seconds and the
+      rows, key and seconds of every table.
+    """
+    max_workers = max(1, min(len(tablenames), int(event.get('max_concurrency', 4))))
+    upload_concurrency = int(event.get('upload_concurrency', 4))
+    # Every worker can have upload_concurrency multipart uploads in flight
+    s3_client = get_s3_client(max_pool_connections=max(10, max_workers * upload_concurrency))
+    connection_pool = get_connection_pool(database_params, max_workers)
+    start_time = time.perf_counter()
+
+    def extract(tablename):
+        table_start = time.perf_counter()
+        try:
+            with pooled_transaction(connection_pool) as cnxn:
+                result = extract_table_to_s3(cnxn, s3_client, event, tablename, database_params)
+            result['status'] = 'succeeded'
+        except Exception as ex:
+            print(f"Error extracting {tablename}: {ex}")
+            result = {'table': f"{event.get('schema')}.{tablename}", 'rows': 0, 'key': None, 'status': 'failed', 'error': str(ex)}
+        result['seconds'] = round(time.perf_counter() - table_start, 3)
+        return result
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(with_current_metrics(extract), tablenames))
+
+    elapsed = time.perf_counter() - start_time
+    succeeded = sum(1 for result in results if result['status'] == 'succeeded')
+    print(f"{succeeded} of {len(results)} tables extracted in {elapsed:.2f}s.")
+    return {
+        'succeeded': succeeded,
+        'failed': len(results) - succeeded,
+        'rows': sum(result['rows'] for result in results),
+        'seconds': round(elapsed, 3),
+        'tables': results,
+    }
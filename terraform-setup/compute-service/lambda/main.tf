@@ -33,7 +33,7 @@ data "aws_iam_policy_document" "lambda_s3_access_policy" {
   }
   
   statement {
-    actions   = ["s3:GetObject", "s3:PutObject"]
+    actions   = ["s3:GetObject", "s3:PutObject", "s3:AbortMultipartUpload", "s3:DeleteObject"]
     resources = ["arn:aws:s3:::greeny-pharma-datalake/*"]  # Permission for objects in the bucket
     effect    = "Allow"
   }